@@ -414,3 +414,102 @@ VALUES ('R01','Standard',1),('R02','Standard',1),('R03','Standard',1),('R04','St
 INSERT INTO employee (user_id, hourly_rate)
 VALUES (3, 12.00)
 ON DUPLICATE KEY UPDATE hourly_rate=12.00;
+
+-- =========================================================
+-- Offline POS sync: idempotent client reference per sale
+-- =========================================================
+ALTER TABLE sale
+  ADD COLUMN client_ref CHAR(32) NULL,
+  ADD UNIQUE KEY uq_sale_client_ref (client_ref);
+
+-- =========================================================
+-- Versioned product catalog for POS terminals
+-- =========================================================
+CREATE TABLE catalog_version (
+  id TINYINT PRIMARY KEY,
+  version BIGINT NOT NULL DEFAULT 0
+);
+INSERT INTO catalog_version (id, version) VALUES (1, 0);
+
+ALTER TABLE product
+  ADD COLUMN catalog_version BIGINT NOT NULL DEFAULT 0;
+CREATE INDEX idx_product_catalog_version ON product (catalog_version);
+
+-- Hard-deleted products, so the delta feed can tell terminals to drop them
+CREATE TABLE catalog_tombstone (
+  product_id INT PRIMARY KEY,
+  catalog_version BIGINT NOT NULL
+);
+CREATE INDEX idx_catalog_tombstone_version ON catalog_tombstone (catalog_version);
+
+-- =========================================================
+-- Customer lookup for the sale form (name / email / phone prefix)
+-- =========================================================
+ALTER TABLE users
+  ADD COLUMN phone VARCHAR(30) NULL;
+CREATE INDEX idx_users_role_name ON users (role, is_active, full_name);
+CREATE INDEX idx_users_phone ON users (phone);
+
+-- =========================================================
+-- Multi-line transfer orders (replenishment planner)
+-- =========================================================
+CREATE TABLE transfer_order (
+  transfer_order_id INT AUTO_INCREMENT PRIMARY KEY,
+  warehouse_id INT NOT NULL,
+  branch_id INT NOT NULL,
+  created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  performed_by INT NOT NULL,
+  notes VARCHAR(255) NULL,
+  CONSTRAINT fk_transfer_order_warehouse
+    FOREIGN KEY (warehouse_id) REFERENCES warehouse(warehouse_id),
+  CONSTRAINT fk_transfer_order_branch
+    FOREIGN KEY (branch_id) REFERENCES branch(branch_id),
+  CONSTRAINT fk_transfer_order_user
+    FOREIGN KEY (performed_by) REFERENCES users(user_id)
+);
+
+-- Each line of an order is a stock_transfer row; single transfers keep NULL
+ALTER TABLE stock_transfer
+  ADD COLUMN transfer_order_id INT NULL,
+  ADD KEY idx_stock_transfer_order (transfer_order_id),
+  ADD CONSTRAINT fk_stock_transfer_order
+    FOREIGN KEY (transfer_order_id) REFERENCES transfer_order(transfer_order_id);
+
+-- =========================================================
+-- Bulk catalog import: the supplier's SKU identifies a product
+-- =========================================================
+ALTER TABLE product
+  ADD COLUMN sku VARCHAR(64) NULL,
+  ADD UNIQUE KEY uq_product_sku (sku);
+
+-- =========================================================
+-- Supplier invoice import: one line per product per purchase
+-- =========================================================
+-- Add Item used to check for an existing line and then insert without a lock, so
+-- existing databases can have duplicates. Merge them into the oldest line first:
+-- quantities added up, unit cost averaged by quantity (the purchase total stays the same).
+CREATE TABLE purchase_line_merge AS
+SELECT MIN(purchase_line_id) AS keep_id,
+       SUM(quantity) AS quantity,
+       ROUND(SUM(quantity * unit_cost) / SUM(quantity), 2) AS unit_cost
+FROM purchase_line
+GROUP BY purchase_id, product_id
+HAVING COUNT(*) > 1;
+
+UPDATE purchase_line
+SET quantity = (SELECT m.quantity FROM purchase_line_merge m WHERE m.keep_id = purchase_line.purchase_line_id),
+    unit_cost = (SELECT m.unit_cost FROM purchase_line_merge m WHERE m.keep_id = purchase_line.purchase_line_id)
+WHERE purchase_line_id IN (SELECT keep_id FROM purchase_line_merge);
+
+-- The derived table lets MySQL delete from the table it reads
+DELETE FROM purchase_line
+WHERE purchase_line_id NOT IN (
+  SELECT keep_id FROM (
+    SELECT MIN(purchase_line_id) AS keep_id FROM purchase_line GROUP BY purchase_id, product_id
+  ) AS kept
+);
+
+DROP TABLE purchase_line_merge;
+
+ALTER TABLE purchase_line
+  ADD UNIQUE KEY uq_purchase_line_product (purchase_id, product_id);
@@ -1,33 +1,108 @@
 from mysql.connector import Error
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import (Flask, current_app, render_template, request, redirect, url_for, session, flash, jsonify,
+                   send_from_directory)
 from werkzeug.security import check_password_hash, generate_password_hash
 from functools import wraps
 from dotenv import load_dotenv
+import io
 import os
 import re
+import logging
+import mimetypes
 from db import get_user_by_email, create_user, email_exists
-from werkzeug.utils import secure_filename
 import time
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from flask import redirect, url_for, flash
 from db import get_connection
+import db
+import cart_store
+import pos_journal
+import catalog
+import page_cache
+import queries
+import image_pipeline
+import assets
+import streaming
+import compression
+import report_governor
+import metrics
+import profiling
+import applog
+import traffic_capture
+import forecast
+import replenishment
+import catalog_import
+import purchase_invoice
 from decimal import Decimal
 
 
-# Load environment variables
-load_dotenv()
+class Routes:
+    """
+    Collects the routes and hooks declared below with the usual Flask decorators.
+    Nothing is registered at import time: create_app() builds a new Flask app and
+    applies them with init_app(), so several apps with different config can coexist.
+    """
 
-app = Flask(__name__)
-UPLOAD_FOLDER = os.path.join(app.root_path, "static", "uploads", "products")
+    def __init__(self):
+        self._setup = []
+
+    def route(self, rule, **options):
+        def decorator(f):
+            endpoint = options.pop("endpoint", f.__name__)
+            self._setup.append(lambda app: app.add_url_rule(rule, endpoint, f, **options))
+            return f
+        return decorator
+
+    def _hook(name):
+        def register(self, f):
+            self._setup.append(lambda app: getattr(app, name)(f))
+            return f
+        return register
+
+    before_request = _hook("before_request")
+    after_request = _hook("after_request")
+    context_processor = _hook("context_processor")
+    del _hook
+
+    def errorhandler(self, code):
+        def decorator(f):
+            self._setup.append(lambda app: app.register_error_handler(code, f))
+            return f
+        return decorator
+
+    def init_app(self, app):
+        # In declaration order, so after_request hooks keep their relative order
+        for setup in self._setup:
+            setup(app)
+
+
+routes = Routes()
+log = logging.getLogger(__name__)
+UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "uploads", "products")
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "webp"}
 
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# gzip/brotli for HTML and JSON; registered first so it runs after every other after_request hook
+routes.after_request(compression.compress_response)
+
+# JSON log lines written by a background thread; every record carries the request id
+routes.before_request(applog.start_request)
+routes.after_request(applog.finish_request)
+
+# Request latency, status and SQL statement metrics (GET /metrics)
+routes.before_request(metrics.start_request)
+routes.after_request(metrics.finish_request)
+
+# Admins can profile a single request with ?_profile=1 or "X-Profile: 1" (see /admin/profiles)
+routes.before_request(profiling.start)
+routes.after_request(profiling.finish)
+
+# Sanitized request log for traffic_replay.py (only with TRAFFIC_CAPTURE_DIR set)
+routes.before_request(traffic_capture.start_request)
+routes.after_request(traffic_capture.finish_request)
 
 def allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
-app.secret_key = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
-
 # ==================== DECORATORS ====================
 from decimal import Decimal
 
@@ -47,7 +122,7 @@ def to_int(value):
         return int(value)
     return int(value)
 
-@app.context_processor
+@routes.context_processor
 def inject_dashboard_metrics():
     data = {"nav_low_stock_count": None, "today_sales": None}
 
@@ -57,6 +132,75 @@ def inject_dashboard_metrics():
 
     return data
 
+@routes.context_processor
+def inject_image_sources():
+    # image_sources(path, "thumb"|"medium") -> {"webp", "fallback"} static paths
+    return {"image_sources": image_pipeline.image_sources}
+
+@routes.context_processor
+def inject_asset_url():
+    # asset_url('css/style.css') -> fingerprinted build output when available
+    return {"asset_url": assets.asset_url}
+
+@routes.route("/static/dist/<path:filename>")
+def dist_asset(filename):
+    """
+    Built assets: serve the pre-compressed copy when the browser accepts it.
+    The names carry a content hash, so they can be cached forever.
+    """
+    send_name, encoding = assets.compressed_variant(filename, request.headers.get("Accept-Encoding"))
+    response = send_from_directory(assets.DIST_DIR, send_name, mimetype=mimetypes.guess_type(filename)[0],
+                                   conditional=True)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+@routes.after_request
+def cache_hashed_uploads(response):
+    """
+    Product images are stored under their content hash, so they never change:
+    let browsers keep them for a year without revalidating.
+    """
+    prefix = "/static/" + image_pipeline.PRODUCT_IMAGE_URL_PREFIX + "/"
+    if (response.status_code == 200 and request.path.startswith(prefix)
+            and image_pipeline.is_immutable(request.path[len(prefix):])):
+        response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+# ==================== READ REPLICA ====================
+
+def read_connector():
+    """
+    Connection factory for report/listing queries: the read replica unless the current
+    user wrote something moments ago (read-your-writes), with the report governor's
+    time limit applied. Resolved now, so the returned function can also be called
+    from worker threads without a request context.
+    """
+    last_write_at = session.get("last_write_at")
+    max_execution_ms = report_governor.current_limit()
+
+    def connect():
+        conn = db.get_read_connection(last_write_at)
+        if conn and max_execution_ms:
+            # Governed report: cap each statement so it cannot hog the server
+            report_governor.apply_limit(conn, max_execution_ms)
+        return conn
+    return connect
+
+
+def get_read_connection():
+    return read_connector()()
+
+
+@routes.after_request
+def remember_writes(response):
+    # Any successful POST by a logged-in user may have written: read from the primary for a while
+    if request.method == "POST" and "user_id" in session and response.status_code < 400:
+        session["last_write_at"] = time.time()
+    return response
+
 def login_required(f):
     """
     Decorator to protect routes that require authentication.
@@ -94,10 +238,16 @@ def role_required(*allowed_roles):
 from flask import render_template
 
 # ==================== Section 1 Products ====================
-@app.route('/products')
+# Query parameters that change the public product pages (used as the page-cache key)
+PRODUCT_FILTERS = {"category_id": int, "min_price": float, "max_price": float, "search": str}
+
+
+@routes.route('/products')
+@page_cache.cached_page(PRODUCT_FILTERS)
 def products():
     conn = get_connection()
     if not conn:
+        page_cache.skip()
         return render_template(
             'products.html',
             products=[],
@@ -189,10 +339,12 @@ def products():
 
 
 
-@app.route('/products/active')
+@routes.route('/products/active')
+@page_cache.cached_page(PRODUCT_FILTERS)
 def active_products():
     conn = get_connection()
     if not conn:
+        page_cache.skip()
         return render_template(
             'products.html',
             products=[],
@@ -274,7 +426,7 @@ def active_products():
         cursor.close()
         conn.close()
 
-@app.route("/products/add", methods=["GET", "POST"])
+@routes.route("/products/add", methods=["GET", "POST"])
 @role_required("admin", "employee")
 def add_product():
     conn = get_connection()
@@ -286,8 +438,7 @@ def add_product():
 
     try:
         # Get categories for dropdown
-        cur.execute("SELECT category_id, category_name FROM category ORDER BY category_name")
-        categories = cur.fetchall()
+        categories = queries.CATEGORIES.run(conn)
 
         if request.method == "POST":
             name = (request.form.get("product_name") or "").strip()
@@ -308,13 +459,9 @@ def add_product():
                                            categories=categories,
                                            product=None)
 
-                filename = secure_filename(image_file.filename)
-                filename = f"{int(time.time())}_{filename}"
-                save_path = os.path.join(UPLOAD_FOLDER, filename)
-                image_file.save(save_path)
-
-                # store relative path for url_for('static', filename=...)
-                image_path = f"uploads/products/{filename}"
+                # content-addressed file; relative path for url_for('static', filename=...)
+                ext = image_file.filename.rsplit(".", 1)[1].lower()
+                image_path = image_pipeline.save_upload(image_file, ext)
 
             if not name or not category_id or unit_price is None:
                 flash("Please fill name, category, and price.", "warning")
@@ -325,10 +472,12 @@ def add_product():
 
             try:
                 #  Start transaction 
+                version = catalog.bump_version(cur)
                 cur.execute("""
-                    INSERT INTO product (product_name, category_id, unit_price, description, is_active, product_image)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                """, (name, category_id, unit_price, description, is_active, image_path))
+                    INSERT INTO product (product_name, category_id, unit_price, description, is_active, product_image,
+                                         catalog_version)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                """, (name, category_id, unit_price, description, is_active, image_path, version))
 
                 product_id = cur.lastrowid
 
@@ -349,19 +498,20 @@ def add_product():
                 branch_rows = cur.rowcount
 
                 conn.commit()
+                page_cache.catalog_pages.invalidate()
 
                 flash(f"Product added with stock initialized in {warehouse_rows} warehouse(s) and {branch_rows} branch(es).", "success")
                 return redirect(url_for("products"))
 
             except Exception as e:
                 conn.rollback()
-                print(f"Transaction error: {e}")
+                log.error("Transaction error: %s", e)
 
-                # If DB failed after saving image, you can optionally delete file
+                # If DB failed after saving image, delete it unless another product shares it
                 if image_path:
                     try:
-                        os.remove(os.path.join("static", image_path))
-                    except:
+                        image_pipeline.release_image(cur, image_path)
+                    except Exception:
                         pass
 
                 flash("Failed to add product. Please try again.", "danger")
@@ -380,7 +530,49 @@ def add_product():
         conn.close()
 
 
-@app.route("/products/<int:product_id>/edit", methods=["GET", "POST"])
+@routes.route("/products/import", methods=["GET", "POST"])
+@role_required("admin", "employee")
+def product_import():
+    if request.method != "POST":
+        return render_template("product_import.html", result=None,
+                               image_dir=catalog_import.CATALOG_IMPORT_IMAGE_DIR)
+
+    upload = request.files.get("catalog_file")
+    if not upload or not upload.filename:
+        flash("Please choose a CSV or JSONL file.", "warning")
+        return redirect(url_for("product_import"))
+
+    conn = get_connection()
+    if not conn:
+        flash("DB connection failed.", "danger")
+        return redirect(url_for("product_import"))
+
+    try:
+        stream = io.TextIOWrapper(upload.stream, encoding="utf-8-sig", newline="")
+        stats, errors, warnings, _ = catalog_import.run(
+            stream, catalog_import.detect_format(upload.filename), conn,
+            catalog_import.CATALOG_IMPORT_IMAGE_DIR or None,
+            dry_run=request.form.get("dry_run") == "1", progress=log.debug
+        )
+    except UnicodeDecodeError:
+        flash("The file is not UTF-8 text.", "danger")
+        return redirect(url_for("product_import"))
+    except Error as e:
+        log.error("product_import error: %s", e)
+        flash("Import failed. Batches completed before the error were kept.", "danger")
+        return redirect(url_for("product_import"))
+    finally:
+        conn.close()
+
+    if stats:
+        page_cache.catalog_pages.invalidate()
+    return render_template("product_import.html",
+                           result={"stats": stats, "errors": errors[:200], "error_count": len(errors),
+                                   "warnings": warnings[:50], "warning_count": len(warnings)},
+                           image_dir=catalog_import.CATALOG_IMPORT_IMAGE_DIR)
+
+
+@routes.route("/products/<int:product_id>/edit", methods=["GET", "POST"])
 @role_required("admin", "employee")
 def edit_product(product_id):
     conn = get_connection()
@@ -399,8 +591,7 @@ def edit_product(product_id):
             return redirect(url_for("products"))
 
         # categories
-        cur.execute("SELECT category_id, category_name FROM category ORDER BY category_name")
-        categories = cur.fetchall()
+        categories = queries.CATEGORIES.run(conn)
 
         if request.method == "POST":
             name = (request.form.get("product_name") or "").strip()
@@ -421,20 +612,8 @@ def edit_product(product_id):
                                            categories=categories,
                                            product=product)
 
-                filename = secure_filename(image_file.filename)
-                filename = f"{int(time.time())}_{filename}"
-                save_path = os.path.join(UPLOAD_FOLDER, filename)
-                image_file.save(save_path)
-
-                new_image_path = f"uploads/products/{filename}"
-
-                # delete old image file if it exists
-                old_path = product.get("product_image")
-                if old_path:
-                    try:
-                        os.remove(os.path.join("static", old_path))
-                    except:
-                        pass
+                ext = image_file.filename.rsplit(".", 1)[1].lower()
+                new_image_path = image_pipeline.save_upload(image_file, ext)
 
             if not name or not category_id or unit_price is None:
                 flash("Please fill name, category, and price.", "warning")
@@ -444,6 +623,7 @@ def edit_product(product_id):
                                        product=product)
 
             try:
+                version = catalog.bump_version(cur)
                 cur.execute("""
                     UPDATE product
                     SET product_name = %s,
@@ -451,23 +631,33 @@ def edit_product(product_id):
                         unit_price = %s,
                         description = %s,
                         is_active = %s,
-                        product_image = %s
+                        product_image = %s,
+                        catalog_version = %s
                     WHERE product_id = %s
-                """, (name, category_id, unit_price, description, is_active, new_image_path, product_id))
+                """, (name, category_id, unit_price, description, is_active, new_image_path, version, product_id))
                 conn.commit()
+                page_cache.catalog_pages.invalidate()
+
+                # delete the old image once nothing points at it any more
+                old_path = product.get("product_image")
+                if old_path and old_path != new_image_path:
+                    try:
+                        image_pipeline.release_image(cur, old_path)
+                    except Exception:
+                        pass
 
                 flash("Product updated successfully.", "success")
                 return redirect(url_for("products"))
 
             except Exception as e:
                 conn.rollback()
-                print("edit_product error:", e)
+                log.error("edit_product error: %s", e)
 
                 # If update failed after uploading a new image, remove the new file
-                if image_file and image_file.filename and new_image_path:
+                if image_file and image_file.filename and new_image_path != product.get("product_image"):
                     try:
-                        os.remove(os.path.join("static", new_image_path))
-                    except:
+                        image_pipeline.release_image(cur, new_image_path)
+                    except Exception:
                         pass
 
                 flash("Failed to update product. Please try again.", "danger")
@@ -486,7 +676,7 @@ def edit_product(product_id):
         conn.close()
         
 
-@app.route("/products/<int:product_id>/delete", methods=["POST"])
+@routes.route("/products/<int:product_id>/delete", methods=["POST"])
 @role_required("admin", "employee")
 def delete_product(product_id):
     conn = get_connection()
@@ -513,42 +703,164 @@ def delete_product(product_id):
             usage['warehouse_count'] > 0 or usage['branch_count'] > 0):
             
             # Instead of deleting, mark as inactive
+            version = catalog.bump_version(cur)
             cur.execute("""
                 UPDATE product 
-                SET is_active = 0 
+                SET is_active = 0,
+                    catalog_version = %s
                 WHERE product_id = %s
-            """, (product_id,))
+            """, (version, product_id))
             conn.commit()
+            page_cache.catalog_pages.invalidate()
             
             flash("Product has transaction history and cannot be deleted. It has been deactivated instead.", "warning")
             return redirect(url_for("products"))
         
         # If product has no dependencies, safe to delete
+        # (leave a tombstone so POS terminals drop it on their next delta sync)
+        version = catalog.bump_version(cur)
         cur.execute("DELETE FROM product WHERE product_id = %s", (product_id,))
+        cur.execute("""
+            INSERT INTO catalog_tombstone (product_id, catalog_version)
+            VALUES (%s, %s)
+        """, (product_id, version))
         conn.commit()
+        page_cache.catalog_pages.invalidate()
 
         flash("Product deleted successfully.", "success")
         return redirect(url_for("products"))
 
     except Exception as e:
         conn.rollback()
-        print(f"Delete product error: {e}")
+        log.error("Delete product error: %s", e)
         flash("Error deleting product.", "danger")
         return redirect(url_for("products"))
     finally:
         cur.close()
         conn.close()
 
+@routes.route("/api/catalog/snapshot")
+@role_required("admin", "employee")
+def catalog_snapshot():
+    """
+    Full active catalog for POS terminals. Supports If-None-Match on the catalog version.
+    """
+    conn = get_connection()
+    if not conn:
+        return jsonify({"error": "Unable to connect to database"}), 503
+
+    try:
+        cur = conn.cursor(dictionary=True)
+        etag = f'"catalog-{catalog.current_version(cur)}"'
+        if etag in request.headers.get("If-None-Match", ""):
+            return "", 304, {"ETag": etag}
+
+        data = catalog.snapshot(cur)
+        response = jsonify(data)
+        response.headers["ETag"] = f'"catalog-{data["version"]}"'
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
+    finally:
+        cur.close()
+        conn.close()
+
+
+@routes.route("/api/catalog/changes")
+@role_required("admin", "employee")
+def catalog_changes():
+    """
+    Delta feed: products added, changed or removed after version `since`.
+    """
+    since = request.args.get("since", type=int)
+    if since is None or since < 0:
+        return jsonify({"error": "since must be a catalog version"}), 400
+
+    conn = get_connection()
+    if not conn:
+        return jsonify({"error": "Unable to connect to database"}), 503
+
+    try:
+        cur = conn.cursor(dictionary=True)
+        return jsonify(catalog.changes_since(cur, since))
+    finally:
+        cur.close()
+        conn.close()
+
+def normalize_phone(raw):
+    """
+    Phone numbers are stored as digits (with an optional leading +), so
+    "059-123 4567" and "0591234567" are the same number for the prefix search.
+    """
+    raw = (raw or "").strip()
+    digits = re.sub(r"\D", "", raw)
+    return ("+" + digits if raw.startswith("+") else digits) or None
+
+
+@routes.route("/api/customers/search")
+@role_required("admin", "employee")
+def customer_search():
+    """
+    Typeahead lookup for the sale form: active customers whose name, email or phone
+    starts with q. Exact name matches rank first, then name, email and phone prefixes.
+    """
+    q = (request.args.get("q") or "").strip()
+    limit = min(max(request.args.get("limit", default=10, type=int), 1), 25)
+
+    if len(q) < 2:
+        return jsonify({"results": []})
+
+    conn = get_connection()
+    if not conn:
+        return jsonify({"error": "Unable to connect to database"}), 503
+
+    # Escape LIKE wildcards so "50%" is searched literally; prefix LIKE can use the indexes
+    prefix = q.replace("!", "!!").replace("%", "!%").replace("_", "!_") + "%"
+    active_customer = "role = 'customer' AND is_active = 1"
+    # Typed phone numbers are matched in their stored digits-only form
+    phone = normalize_phone(q)
+    phone_prefix = phone + "%" if phone and len(phone) >= 2 else prefix
+
+    try:
+        cur = conn.cursor(dictionary=True)
+        cur.execute(f"""
+            SELECT user_id, full_name, email, phone, MIN(match_rank) AS match_rank
+            FROM (
+                SELECT user_id, full_name, email, phone, 0 AS match_rank
+                FROM users WHERE {active_customer} AND full_name = %s
+                UNION ALL
+                SELECT user_id, full_name, email, phone, 1 AS match_rank
+                FROM users WHERE {active_customer} AND full_name LIKE %s ESCAPE '!'
+                UNION ALL
+                SELECT user_id, full_name, email, phone, 2 AS match_rank
+                FROM users WHERE {active_customer} AND email LIKE %s ESCAPE '!'
+                UNION ALL
+                SELECT user_id, full_name, email, phone, 3 AS match_rank
+                FROM users WHERE {active_customer} AND phone LIKE %s ESCAPE '!'
+            ) matches
+            GROUP BY user_id, full_name, email, phone
+            ORDER BY match_rank, full_name
+            LIMIT %s
+        """, (q, prefix, prefix, phone_prefix, limit))
+
+        results = [
+            {"user_id": r["user_id"], "full_name": r["full_name"], "email": r["email"], "phone": r["phone"]}
+            for r in cur.fetchall()
+        ]
+        return jsonify({"results": results})
+    finally:
+        cur.close()
+        conn.close()
+
 # ==================== Section 2 inventory ====================
 
-@app.route('/inventory')
+@routes.route('/inventory')
 @role_required('admin', 'employee')
 def inventory():
     """
     Unified inventory page supporting both warehouse and branch views.
     Query param 'view' determines which: view=warehouse or view=branch (default)
     """
-    conn = get_connection()
+    conn = get_read_connection()
     if not conn:
         return render_template(
             'inventory.html',
@@ -560,6 +872,7 @@ def inventory():
             error="Unable to connect to database"
         )
 
+    rows = None
     try:
         cur = conn.cursor(dictionary=True)
 
@@ -584,16 +897,6 @@ def inventory():
         per_page = 15
         offset = (page - 1) * per_page
 
-        # Get locations for dropdown
-        cur.execute("SELECT branch_id, branch_name FROM branch ORDER BY branch_name")
-        branches = cur.fetchall()
-        
-        cur.execute("SELECT warehouse_id, warehouse_name FROM warehouse ORDER BY warehouse_name")
-        warehouses = cur.fetchall()
-
-        cur.execute("SELECT category_id, category_name FROM category ORDER BY category_name")
-        categories = cur.fetchall()
-
         # Build query based on view
         conditions = []
         params = []
@@ -655,10 +958,34 @@ def inventory():
         }
         sort_sql = sort_map.get(sort, "p.product_name")
 
-        # Count total records
-        count_query = f"SELECT COUNT(*) AS total {base_from} {where_clause}"
-        cur.execute(count_query, params)
-        total_records = cur.fetchone()["total"]
+        # Dropdowns and the summary (which also gives the row count) are independent:
+        # run them side by side, then stream the page of rows on this connection
+        results = db.run_concurrently({
+            "branches": (queries.BRANCHES, ()),
+            "warehouses": (queries.WAREHOUSES, ()),
+            "categories": (queries.CATEGORIES, ()),
+
+            # Summary
+            "summary": (f"""
+                SELECT
+                    COUNT(*) AS total_rows,
+                    SUM(CASE WHEN s.on_hand_qty <= s.min_qty THEN 1 ELSE 0 END) AS low_count,
+                    SUM(CASE WHEN s.on_hand_qty > s.min_qty THEN 1 ELSE 0 END) AS ok_count,
+                    SUM(CASE WHEN s.on_hand_qty = 0 THEN 1 ELSE 0 END) AS out_of_stock,
+                    COUNT(DISTINCT s.product_id) AS unique_products
+                {base_from}
+                {where_clause}
+            """, params, "one"),
+        }, connect=read_connector())
+        branches = results["branches"]
+        warehouses = results["warehouses"]
+        categories = results["categories"]
+        summary = results["summary"] or {}
+
+        for k in ["low_count", "ok_count", "out_of_stock"]:
+            summary[k] = summary.get(k) or 0
+
+        total_records = summary.get("total_rows") or 0
         total_pages = max(1, (total_records + per_page - 1) // per_page)
 
         if page > total_pages:
@@ -691,27 +1018,11 @@ def inventory():
             LIMIT %s OFFSET %s
         """
         cur.execute(main_query, params + [per_page, offset])
-        rows = cur.fetchall()
+        rows = streaming.RowStream(cur, conn)
 
-        # Summary
-        summary_query = f"""
-            SELECT
-                COUNT(*) AS total_rows,
-                SUM(CASE WHEN s.on_hand_qty <= s.min_qty THEN 1 ELSE 0 END) AS low_count,
-                SUM(CASE WHEN s.on_hand_qty > s.min_qty THEN 1 ELSE 0 END) AS ok_count,
-                SUM(CASE WHEN s.on_hand_qty = 0 THEN 1 ELSE 0 END) AS out_of_stock,
-                COUNT(DISTINCT s.product_id) AS unique_products
-            {base_from}
-            {where_clause}
-        """
-        cur.execute(summary_query, params)
-        summary = cur.fetchone() or {}
-        
-        for k in ["low_count", "ok_count", "out_of_stock"]:
-            summary[k] = summary.get(k) or 0
-
-        return render_template(
+        return streaming.stream_page(
             'inventory.html',
+            rows,
             inventory=rows,
             branches=branches,
             warehouses=warehouses,
@@ -730,7 +1041,7 @@ def inventory():
         )
 
     except Exception as e:
-        print(f"Inventory query error: {e}")
+        log.error("Inventory query error: %s", e)
         return render_template(
             'inventory.html',
             inventory=[],
@@ -741,11 +1052,12 @@ def inventory():
             error="Error loading inventory"
         )
     finally:
-        if conn and conn.is_connected():
+        # once handed to the RowStream, the stream closes the connection
+        if rows is None and conn.is_connected():
             cur.close()
             conn.close()
 
-@app.route('/inventory/restock', methods=['POST'])
+@routes.route('/inventory/restock', methods=['POST'])
 @role_required('admin', 'employee')
 def restock_inventory():
     branch_id = request.form.get('branch_id', type=int)
@@ -795,7 +1107,7 @@ def restock_inventory():
 
     except Error as e:
         conn.rollback()
-        print(f"Restock error: {e}")
+        log.error("Restock error: %s", e)
         flash("Error updating stock.", "danger")
         return redirect(url_for('inventory'))
 
@@ -807,7 +1119,7 @@ def restock_inventory():
 
 
 
-@app.context_processor
+@routes.context_processor
 def inject_low_stock_badge():
     """
     Makes low_stock_count available in ALL templates.
@@ -828,7 +1140,7 @@ def inject_low_stock_badge():
         low_stock_count = cur.fetchone()["cnt"]
         return {"low_stock_count": low_stock_count}
     except Error as e:
-        print(f"Low stock badge error: {e}")
+        log.error("Low stock badge error: %s", e)
         return {"low_stock_count": None}
     finally:
         if conn.is_connected():
@@ -851,7 +1163,7 @@ def get_low_stock_count():
         result = cur.fetchone()
         return result["cnt"] if result else 0
     except Exception as e:
-        print(f"get_low_stock_count error: {e}")
+        log.error("get_low_stock_count error: %s", e)
         return 0
     finally:
         if conn.is_connected():
@@ -873,7 +1185,7 @@ def get_low_stock_count():
         result = cur.fetchone()
         return result["cnt"] if result else 0
     except Exception as e:
-        print(f"get_low_stock_count error: {e}")
+        log.error("get_low_stock_count error: %s", e)
         return 0
     finally:
         if conn.is_connected():
@@ -901,7 +1213,7 @@ def get_today_sales_summary():
         result = cur.fetchone()
         return result if result else {"total_sales": 0, "total_revenue": 0}
     except Exception as e:
-        print(f"get_today_sales_summary error: {e}")
+        log.error("get_today_sales_summary error: %s", e)
         return None
     finally:
         if conn.is_connected():
@@ -909,7 +1221,7 @@ def get_today_sales_summary():
             conn.close()
 
 
-@app.route('/inventory/transfer', methods=['POST'])
+@routes.route('/inventory/transfer', methods=['POST'])
 @role_required('admin', 'employee')
 def transfer_stock():
     """
@@ -1000,7 +1312,7 @@ def transfer_stock():
 
     except Exception as e:
         conn.rollback()
-        print(f"Transfer error: {e}")
+        log.error("Transfer error: %s", e)
         flash("Error during transfer.", "danger")
         return redirect(url_for('inventory'))
     finally:
@@ -1008,10 +1320,75 @@ def transfer_stock():
             cur.close()
         if conn and conn.is_connected():
             conn.close()
-            
-            
+
+
+@routes.route('/inventory/replenish', methods=['GET', 'POST'])
+@role_required('admin', 'employee')
+def inventory_replenish():
+    """
+    Plan warehouse -> branch transfers for every branch at once and run them as
+    one multi-line transfer order per branch.
+    """
+    if not replenishment.available():
+        flash("The replenishment planner needs NumPy (pip install numpy).", "warning")
+        return redirect(url_for('inventory'))
+
+    values = request.form if request.method == 'POST' else request.args
+    warehouse_id = values.get('warehouse_id', type=int)
+    target = values.get('target', 'min')
+    if target not in replenishment.TARGETS:
+        target = 'min'
+
+    if request.method == 'POST':
+        branch_ids = set(request.form.getlist('branch_id', type=int))
+        if not warehouse_id or not branch_ids:
+            flash("Please select a warehouse and at least one branch.", "warning")
+            return redirect(url_for('inventory_replenish', warehouse_id=warehouse_id, target=target))
+
+        conn = get_connection()
+        if not conn:
+            flash("DB connection failed.", "danger")
+            return redirect(url_for('inventory_replenish'))
+        try:
+            # Planned again on the primary: quantities are never taken from the form
+            orders = replenishment.plan(conn, warehouse_id, target, branch_ids=branch_ids)
+            done = replenishment.execute_plan(conn, warehouse_id, orders, session.get('user_id'))
+        except Error as e:
+            log.error("inventory_replenish error: %s", e)
+            flash("Error during transfer. Orders completed before the error were kept.", "danger")
+            return redirect(url_for('inventory_replenish', warehouse_id=warehouse_id, target=target))
+        finally:
+            conn.close()
+
+        if done:
+            units = sum(d[2] for d in done)
+            flash(f"Transferred {units} units to {len(done)} branch(es).", "success")
+        else:
+            flash("Nothing to transfer: the branches are stocked or the warehouse is empty.", "info")
+        return redirect(url_for('inventory_replenish', warehouse_id=warehouse_id, target=target))
+
+    conn = get_read_connection()
+    if not conn:
+        flash("DB connection failed.", "danger")
+        return redirect(url_for('inventory'))
+    try:
+        warehouses = queries.WAREHOUSES.run(conn)
+        if not warehouse_id and warehouses:
+            warehouse_id = warehouses[0]['warehouse_id']
+        orders = replenishment.plan(conn, warehouse_id, target) if warehouse_id else []
+    finally:
+        conn.close()
+
+    return render_template('inventory_replenish.html',
+                           orders=orders,
+                           warehouses=warehouses,
+                           selected_warehouse_id=warehouse_id,
+                           target=target,
+                           target_factor=replenishment.REPLENISH_TARGET_FACTOR)
+
+
 # ==================== Section 3 purchase ====================
-@app.route('/purchases/new', methods=['GET', 'POST'])
+@routes.route('/purchases/new', methods=['GET', 'POST'])
 @role_required('admin', 'employee')
 def purchase_new():
     conn = get_connection()
@@ -1022,14 +1399,11 @@ def purchase_new():
     cur = conn.cursor(dictionary=True)
 
     try:
-        cur.execute("SELECT warehouse_id, warehouse_name FROM warehouse ORDER BY warehouse_name")
-        warehouses = cur.fetchall()
+        warehouses = queries.WAREHOUSES.run(conn)
 
-        cur.execute("SELECT supplier_id, name FROM supplier ORDER BY name")
-        suppliers = cur.fetchall()
+        suppliers = queries.SUPPLIERS.run(conn)
 
-        cur.execute("SELECT product_id, product_name, unit_price FROM product WHERE is_active = 1 ORDER BY product_name")
-        products = cur.fetchall()
+        products = queries.ACTIVE_PRODUCTS.run(conn)
 
         if request.method == 'POST':
             warehouse_id = request.form.get('warehouse_id', type=int)
@@ -1060,7 +1434,7 @@ def purchase_new():
 
             except Exception as e:
                 conn.rollback()
-                print("purchase_new insert error:", e)
+                log.error("purchase_new insert error: %s", e)
                 flash("Failed to create purchase. Please try again.", "danger")
                 return render_template('purchase_form.html',
                                        warehouses=warehouses,
@@ -1081,7 +1455,7 @@ def purchase_new():
         conn.close()
 
 
-@app.route('/purchases/<int:purchase_id>')
+@routes.route('/purchases/<int:purchase_id>')
 @role_required('admin', 'employee')
 def purchase_detail(purchase_id):
     conn = get_connection()
@@ -1116,14 +1490,6 @@ def purchase_detail(purchase_id):
             flash("Purchase not found.", "warning")
             return redirect(url_for('purchases_list'))
 
-        cur.execute("""
-            SELECT product_id, product_name, unit_price
-            FROM product
-            WHERE is_active = 1
-            ORDER BY product_name
-        """)
-        products = cur.fetchall()
-
         cur.execute("""
             SELECT
                 pl.purchase_line_id,
@@ -1144,7 +1510,7 @@ def purchase_detail(purchase_id):
         return render_template(
             'purchase_detail.html',
             purchase=purchase,
-            products=products,
+            products=[],
             lines=lines,
             computed_total=total,
             error=None
@@ -1155,7 +1521,7 @@ def purchase_detail(purchase_id):
         conn.close()
 
 
-@app.route('/purchases/<int:purchase_id>/add-item', methods=['POST'])
+@routes.route('/purchases/<int:purchase_id>/add-item', methods=['POST'])
 @role_required('admin', 'employee')
 def purchase_add_item(purchase_id):
     product_id = request.form.get('product_id', type=int)
@@ -1202,7 +1568,7 @@ def purchase_add_item(purchase_id):
 
     except Exception as e:
         conn.rollback()
-        print("purchase_add_item error:", e)
+        log.error("purchase_add_item error: %s", e)
         flash("Failed to add item.", "danger")
         return redirect(url_for('purchase_detail', purchase_id=purchase_id))
     finally:
@@ -1210,7 +1576,47 @@ def purchase_add_item(purchase_id):
         conn.close()
 
 
-@app.route('/purchases/<int:purchase_id>/complete', methods=['POST'])
+@routes.route('/purchases/<int:purchase_id>/import-invoice', methods=['POST'])
+@role_required('admin', 'employee')
+def purchase_import_invoice(purchase_id):
+    upload = request.files.get('invoice_file')
+    complete = request.form.get('complete') == '1'
+    if not upload or not upload.filename:
+        flash("Please choose an invoice CSV file.", "warning")
+        return redirect(url_for('purchase_detail', purchase_id=purchase_id))
+
+    conn = get_connection()
+    if not conn:
+        flash("Database connection failed.", "danger")
+        return redirect(url_for('purchase_detail', purchase_id=purchase_id))
+
+    try:
+        stream = io.TextIOWrapper(upload.stream, encoding='utf-8-sig', newline='')
+        rows, lines = purchase_invoice.import_invoice(conn, purchase_id, stream, session.get('user_id'), complete)
+    except purchase_invoice.InvoiceError as e:
+        shown = "; ".join(f"line {line}: {message}" if line else message for line, message in e.problems[:5])
+        more = f" (and {len(e.problems) - 5} more)" if len(e.problems) > 5 else ""
+        flash(f"Invoice not imported. {shown}{more}", "warning")
+        return redirect(url_for('purchase_detail', purchase_id=purchase_id))
+    except UnicodeDecodeError:
+        flash("The invoice is not UTF-8 text.", "danger")
+        return redirect(url_for('purchase_detail', purchase_id=purchase_id))
+    except Error as e:
+        log.error("purchase_import_invoice error: %s", e)
+        flash("Failed to import the invoice.", "danger")
+        return redirect(url_for('purchase_detail', purchase_id=purchase_id))
+    finally:
+        conn.close()
+
+    if complete:
+        flash(f"Invoice imported ({rows} rows, {lines} products) and purchase completed. Warehouse stock updated.",
+              "success")
+        return redirect(url_for('purchases_list'))
+    flash(f"Invoice imported: {rows} rows merged into {lines} product line(s).", "success")
+    return redirect(url_for('purchase_detail', purchase_id=purchase_id))
+
+
+@routes.route('/purchases/<int:purchase_id>/complete', methods=['POST'])
 @role_required('admin', 'employee')
 def purchase_complete(purchase_id):
     conn = get_connection()
@@ -1231,35 +1637,13 @@ def purchase_complete(purchase_id):
 
         warehouse_id = purchase['warehouse_id']
 
-        cur.execute("""
-            SELECT product_id, quantity
-            FROM purchase_line
-            WHERE purchase_id = %s
-        """, (purchase_id,))
-        lines = cur.fetchall()
-
-        if not lines:
+        cur.execute("SELECT 1 FROM purchase_line WHERE purchase_id = %s LIMIT 1", (purchase_id,))
+        if not cur.fetchone():
             conn.rollback()
             flash("Add at least one item before completing.", "warning")
             return redirect(url_for('purchase_detail', purchase_id=purchase_id))
 
-        for line in lines:
-            product_id = line['product_id']
-            qty = line['quantity']
-
-            cur.execute("""
-                UPDATE warehouse_stock
-                SET on_hand_qty = on_hand_qty + %s,
-                    last_purchase_date = NOW()
-                WHERE warehouse_id = %s AND product_id = %s
-            """, (qty, warehouse_id, product_id))
-
-            cur.execute("""
-                INSERT INTO stock_movement
-                    (warehouse_id, product_id, change_qty, movement_type,
-                     reference_purchase_id, performed_by)
-                VALUES (%s, %s, %s, 'PURCHASE', %s, %s)
-            """, (warehouse_id, product_id, qty, purchase_id, performed_by))
+        purchase_invoice.complete(cur, purchase_id, warehouse_id, performed_by)
 
         conn.commit()
         flash("Purchase completed. Warehouse stock updated.", "success")
@@ -1267,7 +1651,7 @@ def purchase_complete(purchase_id):
 
     except Exception as e:
         conn.rollback()
-        print("purchase_complete error:", e)
+        log.error("purchase_complete error: %s", e)
         flash("Failed to complete purchase.", "danger")
         return redirect(url_for('purchase_detail', purchase_id=purchase_id))
     finally:
@@ -1277,10 +1661,10 @@ def purchase_complete(purchase_id):
             conn.close()
 
 
-@app.route('/purchases')
+@routes.route('/purchases')
 @role_required('admin', 'employee')
 def purchases_list():
-    conn = get_connection()
+    conn = get_read_connection()
     if not conn:
         return render_template('purchases.html', purchases=[], warehouses=[], error="DB connection failed")
 
@@ -1291,8 +1675,7 @@ def purchases_list():
         date_from = (request.args.get('date_from') or '').strip()
         date_to = (request.args.get('date_to') or '').strip()
 
-        cur.execute("SELECT warehouse_id, warehouse_name FROM warehouse ORDER BY warehouse_name")
-        warehouses = cur.fetchall()
+        warehouses = queries.WAREHOUSES.run(conn)
 
         conditions = []
         params = []
@@ -1350,9 +1733,70 @@ def purchases_list():
         conn.close()
 
 
+@routes.route('/purchases/suggestions')
+@role_required('admin', 'employee')
+def purchase_suggestions():
+    if not forecast.available():
+        flash("Reorder suggestions need NumPy (pip install numpy).", "warning")
+        return redirect(url_for('purchases_list'))
+
+    conn = get_read_connection()
+    if not conn:
+        flash("Database connection failed.", "danger")
+        return redirect(url_for('purchases_list'))
+
+    try:
+        warehouses = queries.WAREHOUSES.run(conn)
+        result = forecast.Forecast(forecast.load(conn))
+    finally:
+        conn.close()
+
+    return render_template('purchase_suggestions.html',
+                           orders=result.purchase_orders(),
+                           summary=result.summary(),
+                           warehouses=warehouses,
+                           lead_days=result.lead_days,
+                           review_days=result.review_days,
+                           service_level=result.service_level)
+
+
+@routes.route('/purchases/suggestions/drafts', methods=['POST'])
+@role_required('admin', 'employee')
+def purchase_suggestions_drafts():
+    warehouse_id = request.form.get('warehouse_id', type=int)
+    supplier_ids = set(request.form.getlist('supplier_id', type=int))
+    if not warehouse_id or not supplier_ids:
+        flash("Please select a warehouse and at least one supplier.", "warning")
+        return redirect(url_for('purchase_suggestions'))
+    if not forecast.available():
+        return redirect(url_for('purchase_suggestions'))
+
+    conn = get_connection()
+    if not conn:
+        flash("Database connection failed.", "danger")
+        return redirect(url_for('purchase_suggestions'))
+
+    try:
+        # Recomputed on the primary: quantities are never taken from the form
+        orders = forecast.Forecast(forecast.load(conn)).purchase_orders()
+        created = forecast.create_drafts(conn, orders, warehouse_id, session.get('user_id'), supplier_ids)
+    except Error as e:
+        log.error("purchase_suggestions_drafts error: %s", e)
+        flash("Failed to create draft purchases. Please try again.", "danger")
+        return redirect(url_for('purchase_suggestions'))
+    finally:
+        conn.close()
+
+    if not created:
+        flash("Nothing to order for the selected suppliers.", "info")
+        return redirect(url_for('purchase_suggestions'))
+    flash(f"{len(created)} draft purchase(s) created. Review and complete them below.", "success")
+    return redirect(url_for('purchases_list'))
+
+
 # ==================== Section 4 Suppliers ====================
 
-@app.route("/suppliers")
+@routes.route("/suppliers")
 @role_required("admin", "employee")
 def suppliers_list():
     conn = get_connection()
@@ -1373,7 +1817,7 @@ def suppliers_list():
         conn.close()
 
 
-@app.route("/suppliers/add", methods=["GET", "POST"])
+@routes.route("/suppliers/add", methods=["GET", "POST"])
 @role_required("admin", "employee")
 def supplier_add():
     if request.method == "POST":
@@ -1410,61 +1854,64 @@ def supplier_add():
 
 # ==================== Section 5 Sales ====================
 
-@app.route("/sales/new", methods=["GET", "POST"])
+@routes.route("/sales/new", methods=["GET", "POST"])
 @role_required("admin", "employee")
 def sales_new():
     conn = get_connection()
     if not conn:
+        if pos_journal.POS_OFFLINE_MODE:
+            return sales_new_offline()
         flash("Database connection failed.", "danger")
         return redirect(url_for("dashboard"))
 
+    cur = None
     try:
         cur = conn.cursor(dictionary=True)
 
-        cur.execute("SELECT branch_id, branch_name FROM branch ORDER BY branch_name")
-        branches = cur.fetchall()
-
-        cur.execute("""
-            SELECT user_id, full_name
-            FROM users
-            WHERE role = 'customer' AND is_active = 1
-            ORDER BY full_name
-        """)
-        customers = cur.fetchall()
+        branches = queries.BRANCHES.run(conn)
 
         if request.method == "POST":
             branch_id = request.form.get("branch_id", type=int)
-            customer_id_raw = request.form.get("customer_id", "").strip()
-            customer_id = int(customer_id_raw) if customer_id_raw else None
+            customer_id = request.form.get("customer_id", type=int)
 
             employee_id = session.get("user_id")
 
-            if not branch_id:
-                flash("Please select a branch.", "warning")
+            # Customers are picked through /api/customers/search; only the chosen one is looked up
+            customer = None
+            if customer_id:
+                cur.execute("""
+                    SELECT user_id, full_name, email
+                    FROM users
+                    WHERE user_id = %s AND role = 'customer' AND is_active = 1
+                """, (customer_id,))
+                customer = cur.fetchone()
+
+            if not branch_id or (customer_id and not customer):
+                flash("Please select a branch and a valid customer.", "warning")
                 return render_template("sales_new.html",
                                        branches=branches,
-                                       customers=customers,
                                        selected_branch_id=branch_id,
-                                       selected_customer_id=customer_id)
+                                       selected_customer=customer)
 
-            cur2 = conn.cursor()
-            cur2.execute("""
-                INSERT INTO sale (branch_id, employee_id, customer_id)
-                VALUES (%s, %s, %s)
-            """, (branch_id, employee_id, customer_id))
-            conn.commit()
+            # The sale is only a draft cart until it is completed - nothing is written to MySQL yet
+            branch_name = next((b["branch_name"] for b in branches if b["branch_id"] == branch_id), None)
+            customer_name = customer["full_name"] if customer else None
 
-            sale_id = cur2.lastrowid
-            cur2.close()
+            old_cart_id = session.get("sale_cart_id")
+            if old_cart_id:
+                cart_store.discard_cart(old_cart_id)
 
-            flash("Sale created. Add items now.", "success")
-            return redirect(url_for("sale_detail", sale_id=sale_id))
+            cart_id = cart_store.create_cart(employee_id, branch_id, branch_name,
+                                             customer_id, customer_name)
+            session["sale_cart_id"] = cart_id
+
+            flash("Sale started. Add items now.", "success")
+            return redirect(url_for("sale_cart", cart_id=cart_id))
 
         return render_template("sales_new.html",
                                branches=branches,
-                               customers=customers,
                                selected_branch_id=None,
-                               selected_customer_id=None)
+                               selected_customer=None)
 
     finally:
         if cur:
@@ -1473,7 +1920,33 @@ def sales_new():
             conn.close()
 
 
-@app.route("/sales/<int:sale_id>")
+def sales_new_offline():
+    """
+    Start a sale from the local catalog copy while MySQL is unreachable.
+    Customers are not available offline, so every offline sale is a walk-in.
+    """
+    branches = pos_journal.cached_branches()
+
+    if request.method == "POST":
+        branch_id = request.form.get("branch_id", type=int)
+        branch_name = next((b["branch_name"] for b in branches if b["branch_id"] == branch_id), None)
+        if not branch_name:
+            flash("Please select a branch.", "warning")
+            return render_template("sales_new.html", branches=branches, offline=True,
+                                   selected_branch_id=branch_id, selected_customer=None,
+                                   error="Offline mode: sales are saved locally and synced later.")
+
+        employee_id = session.get("user_id")
+        cart_id = cart_store.create_cart(employee_id, branch_id, branch_name)
+        session["sale_cart_id"] = cart_id
+        return redirect(url_for("sale_cart", cart_id=cart_id))
+
+    return render_template("sales_new.html", branches=branches, offline=True,
+                           selected_branch_id=None, selected_customer=None,
+                           error="Offline mode: sales are saved locally and synced later.")
+
+
+@routes.route("/sales/<int:sale_id>")
 @role_required("admin", "employee")
 def sale_detail(sale_id):
     conn = get_connection()
@@ -1482,56 +1955,13 @@ def sale_detail(sale_id):
         return redirect(url_for("dashboard"))
 
     try:
-        cur = conn.cursor(dictionary=True)
-
-        cur.execute("""
-            SELECT
-                s.sale_id,
-                s.branch_id,
-                b.branch_name,
-                s.sale_date,
-                s.employee_id,
-                e.full_name AS employee_name,
-                s.customer_id,
-                cu.full_name AS customer_name,
-                COALESCE(SUM(sl.quantity * sl.unit_price), 0) AS total_amount
-            FROM sale s
-            JOIN branch b ON s.branch_id = b.branch_id
-            JOIN users e ON s.employee_id = e.user_id
-            LEFT JOIN users cu ON s.customer_id = cu.user_id
-            LEFT JOIN sale_line sl ON s.sale_id = sl.sale_id
-            WHERE s.sale_id = %s
-            GROUP BY s.sale_id, s.branch_id, b.branch_name, s.sale_date, 
-                     s.employee_id, e.full_name, s.customer_id, cu.full_name
-        """, (sale_id,))
-        sale = cur.fetchone()
+        sale = queries.SALE_HEADER.run(conn, (sale_id,))
 
         if not sale:
             flash("Sale not found.", "warning")
-            return redirect(url_for("sales_new"))
+            return redirect(url_for("sales_list"))
 
-        cur.execute("""
-            SELECT product_id, product_name, unit_price
-            FROM product
-            WHERE is_active = 1
-            ORDER BY product_name
-        """)
-        products = cur.fetchall()
-
-        cur.execute("""
-            SELECT
-                sl.sale_line_id,
-                sl.product_id,
-                p.product_name,
-                sl.quantity,
-                sl.unit_price,
-                (sl.quantity * sl.unit_price) AS line_total
-            FROM sale_line sl
-            JOIN product p ON sl.product_id = p.product_id
-            WHERE sl.sale_id = %s
-            ORDER BY sl.sale_line_id
-        """, (sale_id,))
-        lines = cur.fetchall()
+        lines = queries.SALE_LINES.run(conn, (sale_id,))
 
         from decimal import Decimal
         total = sum(float(l["line_total"]) if isinstance(l["line_total"], Decimal) else l["line_total"] 
@@ -1540,18 +1970,62 @@ def sale_detail(sale_id):
         return render_template(
             "sale_detail.html",
             sale=sale,
-            products=products,
+            products=[],
             lines=lines,
             computed_total=total,
+            is_draft=False,
             error=None
         )
 
     finally:
-        cur.close()
         conn.close()
 
 
-@app.route("/sales/<int:sale_id>/receipt")
+@routes.route("/sales/cart/<cart_id>")
+@role_required("admin", "employee")
+def sale_cart(cart_id):
+    """
+    Draft sale page. Lines come from the cart store; MySQL is only read for the product list.
+    """
+    cart = cart_store.get_cart(cart_id, session.get("user_id"))
+    if not cart:
+        flash("This sale is no longer open. Start a new one.", "warning")
+        return redirect(url_for("sales_new"))
+
+    lines, total = cart_store.cart_lines(cart)
+    sale = {
+        "sale_id": None,
+        "cart_id": cart_id,
+        "branch_id": cart["branch_id"],
+        "branch_name": cart["branch_name"],
+        "customer_id": cart["customer_id"],
+        "customer_name": cart["customer_name"]
+    }
+
+    # The product dropdown is filled in the browser from the versioned catalog feed
+    # (/api/catalog/...), so no product list is queried per page view.
+    products = []
+    error = None
+    if pos_journal.POS_OFFLINE_MODE:
+        conn = get_connection()
+        if conn:
+            conn.close()
+        else:
+            products = pos_journal.cached_products()
+            error = "Offline mode: this sale will be saved locally and synced later."
+
+    return render_template(
+        "sale_detail.html",
+        sale=sale,
+        products=products,
+        lines=lines,
+        computed_total=total,
+        is_draft=True,
+        error=error
+    )
+
+
+@routes.route("/sales/<int:sale_id>/receipt")
 @role_required("admin", "employee")
 def sale_receipt(sale_id):
     conn = get_connection()
@@ -1560,41 +2034,13 @@ def sale_receipt(sale_id):
         return redirect(url_for("sales_list"))
 
     try:
-        cur = conn.cursor(dictionary=True)
-
-        cur.execute("""
-            SELECT
-                s.sale_id,
-                s.sale_date,
-                COALESCE(SUM(sl.quantity * sl.unit_price), 0) AS total_amount,
-                b.branch_name,
-                e.full_name AS employee_name,
-                cu.full_name AS customer_name
-            FROM sale s
-            JOIN branch b ON s.branch_id = b.branch_id
-            JOIN users e ON s.employee_id = e.user_id
-            LEFT JOIN users cu ON s.customer_id = cu.user_id
-            LEFT JOIN sale_line sl ON s.sale_id = sl.sale_id
-            WHERE s.sale_id = %s
-            GROUP BY s.sale_id, s.sale_date, b.branch_name, e.full_name, cu.full_name
-        """, (sale_id,))
-        sale = cur.fetchone()
+        sale = queries.SALE_HEADER.run(conn, (sale_id,))
 
         if not sale:
             flash("Sale not found.", "warning")
             return redirect(url_for("sales_list"))
 
-        cur.execute("""
-            SELECT
-                p.product_name,
-                sl.quantity,
-                sl.unit_price,
-                (sl.quantity * sl.unit_price) AS line_total
-            FROM sale_line sl
-            JOIN product p ON sl.product_id = p.product_id
-            WHERE sl.sale_id = %s
-        """, (sale_id,))
-        items = cur.fetchall()
+        items = queries.SALE_LINES.run(conn, (sale_id,))
 
         return render_template(
             "sale_receipt.html",
@@ -1603,164 +2049,214 @@ def sale_receipt(sale_id):
         )
 
     finally:
-        cur.close()
         conn.close()
 
 
-@app.route("/sales/<int:sale_id>/add-item", methods=["POST"])
+@routes.route("/sales/cart/<cart_id>/add-item", methods=["POST"])
 @role_required("admin", "employee")
-def sale_add_item(sale_id):
+def sale_add_item(cart_id):
     product_id = request.form.get("product_id", type=int)
     qty = request.form.get("quantity", type=int)
 
     if not product_id or not qty or qty <= 0:
         flash("Please select a product and valid quantity.", "warning")
-        return redirect(url_for("sale_detail", sale_id=sale_id))
+        return redirect(url_for("sale_cart", cart_id=cart_id))
 
     conn = get_connection()
     if not conn:
-        flash("Database connection failed.", "danger")
-        return redirect(url_for("sale_detail", sale_id=sale_id))
+        if not pos_journal.POS_OFFLINE_MODE:
+            flash("Database connection failed.", "danger")
+            return redirect(url_for("sale_cart", cart_id=cart_id))
+        p = pos_journal.cached_product(product_id)
+    else:
+        try:
+            cur = conn.cursor(dictionary=True)
 
-    try:
-        cur = conn.cursor(dictionary=True)
+            # Read-only lookup; the line itself is kept in the cart store
+            cur.execute("SELECT product_name, unit_price FROM product WHERE product_id = %s", (product_id,))
+            p = cur.fetchone()
+        finally:
+            cur.close()
+            conn.close()
 
-        cur.execute("SELECT unit_price FROM product WHERE product_id = %s", (product_id,))
-        p = cur.fetchone()
-        if not p:
-            flash("Product not found.", "warning")
-            return redirect(url_for("sale_detail", sale_id=sale_id))
+    if not p:
+        flash("Product not found.", "warning")
+        return redirect(url_for("sale_cart", cart_id=cart_id))
 
-        unit_price = float(p["unit_price"])
+    cart = cart_store.add_item(cart_id, session.get("user_id"), product_id,
+                               p["product_name"], float(p["unit_price"]), qty)
+    if not cart:
+        flash("This sale is no longer open. Start a new one.", "warning")
+        return redirect(url_for("sales_new"))
 
-        cur.execute("""
-            SELECT sale_line_id, quantity
-            FROM sale_line
-            WHERE sale_id = %s AND product_id = %s
-        """, (sale_id, product_id))
-        existing = cur.fetchone()
+    flash("Item added.", "success")
+    return redirect(url_for("sale_cart", cart_id=cart_id))
 
-        if existing:
-            new_qty = int(existing["quantity"]) + qty
 
-            cur.execute("""
-                UPDATE sale_line
-                SET quantity = %s,
-                    unit_price = %s
-                WHERE sale_line_id = %s
-            """, (new_qty, unit_price, existing["sale_line_id"]))
-        else:
-            cur.execute("""
-                INSERT INTO sale_line (sale_id, product_id, quantity, unit_price)
-                VALUES (%s, %s, %s, %s)
-            """, (sale_id, product_id, qty, unit_price))
+@routes.route("/sales/cart/<cart_id>/update-qty", methods=["POST"])
+@role_required("admin", "employee")
+def sale_update_quantity(cart_id):
+    product_id = request.form.get("product_id", type=int)
+    qty = request.form.get("quantity", type=int)
 
-        conn.commit()
-        flash("Item added.", "success")
-        return redirect(url_for("sale_detail", sale_id=sale_id))
+    if not product_id or qty is None or qty < 0:
+        flash("Invalid quantity.", "warning")
+        return redirect(url_for("sale_cart", cart_id=cart_id))
 
-    except Exception as e:
-        conn.rollback()
-        print("sale_add_item error:", e)
-        flash("Failed to add item.", "danger")
-        return redirect(url_for("sale_detail", sale_id=sale_id))
+    cart = cart_store.set_quantity(cart_id, session.get("user_id"), product_id, qty)
+    if not cart:
+        flash("This sale is no longer open. Start a new one.", "warning")
+        return redirect(url_for("sales_new"))
 
-    finally:
-        cur.close()
-        conn.close()
+    flash("Quantity updated.", "success")
+    return redirect(url_for("sale_cart", cart_id=cart_id))
+
+
+@routes.route("/sales/cart/<cart_id>/remove-line", methods=["POST"])
+@role_required("admin", "employee")
+def sale_remove_line(cart_id):
+    product_id = request.form.get("product_id", type=int)
+
+    if not product_id:
+        flash("Invalid line item.", "warning")
+        return redirect(url_for("sale_cart", cart_id=cart_id))
+
+    cart = cart_store.remove_item(cart_id, session.get("user_id"), product_id)
+    if not cart:
+        flash("This sale is no longer open. Start a new one.", "warning")
+        return redirect(url_for("sales_new"))
+
+    flash("Item removed from sale.", "success")
+    return redirect(url_for("sale_cart", cart_id=cart_id))
+
+
+@routes.route("/sales/cart/<cart_id>/discard", methods=["POST"])
+@role_required("admin", "employee")
+def sale_discard(cart_id):
+    if cart_store.get_cart(cart_id, session.get("user_id")):
+        cart_store.discard_cart(cart_id)
+    if session.get("sale_cart_id") == cart_id:
+        session.pop("sale_cart_id", None)
+
+    flash("Sale discarded.", "info")
+    return redirect(url_for("sales_new"))
+
+
+@routes.route("/sales/cart/<cart_id>/complete", methods=["POST"])
+@role_required("admin", "employee")
+def sale_complete(cart_id):
+    """
+    Write the draft cart to MySQL in one transaction:
+    sale header, sale lines, branch stock decrements and SALE movements.
+    """
+    performed_by = session.get("user_id")
+    cart = cart_store.get_cart(cart_id, performed_by)
+    if not cart:
+        flash("This sale is no longer open. Start a new one.", "warning")
+        return redirect(url_for("sales_new"))
 
+    if not cart["lines"]:
+        flash("Add at least one item before completing the sale.", "warning")
+        return redirect(url_for("sale_cart", cart_id=cart_id))
 
-@app.route("/sales/<int:sale_id>/complete", methods=["POST"])
-@role_required("admin", "employee")
-def sale_complete(sale_id):
     conn = get_connection()
     if not conn:
-        flash("Database connection failed.", "danger")
-        return redirect(url_for("sale_detail", sale_id=sale_id))
-
-    try:
-        performed_by = session.get("user_id")
-        cur = conn.cursor(dictionary=True)
+        if not pos_journal.POS_OFFLINE_MODE:
+            flash("Database connection failed.", "danger")
+            return redirect(url_for("sale_cart", cart_id=cart_id))
 
-        cur.execute("SELECT sale_id, branch_id FROM sale WHERE sale_id = %s", (sale_id,))
-        sale = cur.fetchone()
-        if not sale:
-            conn.rollback()
-            flash("Sale not found.", "warning")
-            return redirect(url_for("sales_new"))
+        # Central database unreachable: journal the sale, stock is deducted when it syncs
+        pos_journal.record_sale(cart_id, cart["branch_id"], performed_by,
+                                cart["customer_id"], cart["lines"])
+        cart_store.discard_cart(cart_id)
+        if session.get("sale_cart_id") == cart_id:
+            session.pop("sale_cart_id", None)
 
-        branch_id = sale["branch_id"]
+        flash("Database offline: sale saved locally and will sync automatically.", "warning")
+        return redirect(url_for("sales_new"))
 
-        cur.execute("""
-            SELECT product_id, quantity
-            FROM sale_line
-            WHERE sale_id = %s
-        """, (sale_id,))
-        lines = cur.fetchall()
+    cur = None
+    try:
+        cur = conn.cursor(dictionary=True)
+        branch_id = cart["branch_id"]
 
-        if not lines:
-            conn.rollback()
-            flash("Add at least one item before completing the sale.", "warning")
-            return redirect(url_for("sale_detail", sale_id=sale_id))
+        # Lock all stock rows of this sale at once, in product order to avoid deadlocks
+        lines = sorted(cart["lines"], key=lambda l: l["product_id"])
+        product_ids = [l["product_id"] for l in lines]
+        placeholders = ", ".join(["%s"] * len(product_ids))
+        cur.execute(f"""
+            SELECT product_id, on_hand_qty
+            FROM branch_stock
+            WHERE branch_id = %s AND product_id IN ({placeholders})
+            ORDER BY product_id
+            FOR UPDATE
+        """, [branch_id] + product_ids)
+        on_hand = {r["product_id"]: int(r["on_hand_qty"]) for r in cur.fetchall()}
 
         for line in lines:
             pid = line["product_id"]
-            qty = int(line["quantity"])
-
-            cur.execute("""
-                SELECT on_hand_qty
-                FROM branch_stock
-                WHERE branch_id = %s AND product_id = %s
-                FOR UPDATE
-            """, (branch_id, pid))
-            st = cur.fetchone()
-
-            if not st:
+            if pid not in on_hand:
                 conn.rollback()
-                flash(f"Stock row missing for product #{pid} in this branch.", "danger")
-                return redirect(url_for("sale_detail", sale_id=sale_id))
-
-            on_hand = int(st["on_hand_qty"])
-            if qty > on_hand:
+                flash(f"Stock row missing for {line['product_name']} in this branch.", "danger")
+                return redirect(url_for("sale_cart", cart_id=cart_id))
+            if line["quantity"] > on_hand[pid]:
                 conn.rollback()
-                flash(f"Not enough stock for product #{pid}. Available: {on_hand}.", "warning")
-                return redirect(url_for("sale_detail", sale_id=sale_id))
+                flash(f"Not enough stock for {line['product_name']}. Available: {on_hand[pid]}.", "warning")
+                return redirect(url_for("sale_cart", cart_id=cart_id))
 
-            cur.execute("""
-                UPDATE branch_stock
-                SET on_hand_qty = on_hand_qty - %s
-                WHERE branch_id = %s AND product_id = %s
-            """, (qty, branch_id, pid))
+        # The cart id doubles as the idempotent client reference of the sale
+        cur.execute("""
+            INSERT INTO sale (branch_id, employee_id, customer_id, client_ref)
+            VALUES (%s, %s, %s, %s)
+        """, (branch_id, performed_by, cart["customer_id"], cart_id))
+        sale_id = cur.lastrowid
 
-            cur.execute("""
-                INSERT INTO stock_movement
-                    (branch_id, product_id, change_qty, movement_type, reference_sale_id, performed_by)
-                VALUES (%s, %s, %s, 'SALE', %s, %s)
-            """, (branch_id, pid, -qty, sale_id, performed_by))
+        cur.executemany("""
+            INSERT INTO sale_line (sale_id, product_id, quantity, unit_price)
+            VALUES (%s, %s, %s, %s)
+        """, [(sale_id, l["product_id"], l["quantity"], l["unit_price"]) for l in lines])
+
+        cur.executemany("""
+            UPDATE branch_stock
+            SET on_hand_qty = on_hand_qty - %s
+            WHERE branch_id = %s AND product_id = %s
+        """, [(l["quantity"], branch_id, l["product_id"]) for l in lines])
+
+        cur.executemany("""
+            INSERT INTO stock_movement
+                (branch_id, product_id, change_qty, movement_type, reference_sale_id, performed_by)
+            VALUES (%s, %s, %s, 'SALE', %s, %s)
+        """, [(branch_id, l["product_id"], -l["quantity"], sale_id, performed_by) for l in lines])
 
         conn.commit()
-        flash("Sale completed successfully. Stock updated.", "success")
-        return redirect(url_for("sales_list"))
 
     except Exception as e:
         conn.rollback()
-        print("sale_complete error:", e)
+        log.error("sale_complete error: %s", e)
         flash("Failed to complete sale.", "danger")
-        return redirect(url_for("sale_detail", sale_id=sale_id))
+        return redirect(url_for("sale_cart", cart_id=cart_id))
     finally:
         if cur:
             cur.close()
         if conn and conn.is_connected():
             conn.close()
 
+    cart_store.discard_cart(cart_id)
+    if session.get("sale_cart_id") == cart_id:
+        session.pop("sale_cart_id", None)
+
+    flash(f"Sale #{sale_id} completed successfully. Stock updated.", "success")
+    return redirect(url_for("sales_list"))
 
-@app.route("/sales")
+
+@routes.route("/sales")
 @role_required("admin", "employee")
 def sales_list():
-    conn = get_connection()
+    conn = get_read_connection()
     if not conn:
         return render_template("sales.html", sales=[], branches=[], error="Unable to connect to database")
 
+    sales = None
     try:
         cur = conn.cursor(dictionary=True)
 
@@ -1768,8 +2264,7 @@ def sales_list():
         date_from = (request.args.get("date_from") or "").strip()
         date_to = (request.args.get("date_to") or "").strip()
 
-        cur.execute("SELECT branch_id, branch_name FROM branch ORDER BY branch_name")
-        branches = cur.fetchall()
+        branches = queries.BRANCHES.run(conn)
 
         conditions = []
         params = []
@@ -1790,6 +2285,17 @@ def sales_list():
         if conditions:
             where_clause = "WHERE " + " AND ".join(conditions)
 
+        # Totals for the header/summary, so the list itself can be streamed
+        cur.execute(f"""
+            SELECT
+                COUNT(DISTINCT s.sale_id) AS sale_count,
+                COALESCE(SUM(sl.quantity * sl.unit_price), 0) AS total_amount
+            FROM sale s
+            LEFT JOIN sale_line sl ON s.sale_id = sl.sale_id
+            {where_clause}
+        """, params)
+        summary = cur.fetchone()
+
         cur.execute(f"""
             SELECT
                 s.sale_id,
@@ -1808,71 +2314,52 @@ def sales_list():
             ORDER BY s.sale_date DESC
         """, params)
 
-        sales = cur.fetchall()
+        sales = streaming.RowStream(cur, conn)
 
-        return render_template(
+        return streaming.stream_page(
             "sales.html",
+            sales,
             sales=sales,
+            summary=summary,
             branches=branches,
             selected_branch_id=branch_id,
             date_from=date_from,
             date_to=date_to,
+            offline_pending=pos_journal.pending_count() if pos_journal.POS_OFFLINE_MODE else 0,
             error=None
         )
 
     finally:
-        cur.close()
-        conn.close()
+        if sales is None:
+            cur.close()
+            conn.close()
 
-@app.route("/sales/<int:sale_id>/remove-line", methods=["POST"])
+@routes.route("/pos/sync", methods=["POST"])
 @role_required("admin", "employee")
-def sale_remove_line(sale_id):
-    sale_line_id = request.form.get("sale_line_id", type=int)
-
-    if not sale_line_id:
-        flash("Invalid line item.", "warning")
-        return redirect(url_for("sale_detail", sale_id=sale_id))
-
-    conn = get_connection()
-    if not conn:
-        flash("Database connection failed.", "danger")
-        return redirect(url_for("sale_detail", sale_id=sale_id))
-
-    try:
-        cur = conn.cursor()
-
-        # Make sure the line belongs to this sale (prevents deleting other sales lines)
-        cur.execute("""
-            DELETE FROM sale_line
-            WHERE sale_line_id = %s AND sale_id = %s
-        """, (sale_line_id, sale_id))
-
-        conn.commit()
-
-        if cur.rowcount == 0:
-            flash("Line not found (or already removed).", "warning")
-        else:
-            flash("Item removed from sale.", "success")
-
-    except Exception as e:
-        conn.rollback()
-        print("sale_remove_line error:", e)
-        flash("Failed to remove item.", "danger")
-
-    finally:
-        cur.close()
-        conn.close()
-
-    return redirect(url_for("sale_detail", sale_id=sale_id))
+def pos_sync():
+    """
+    Replay offline sales to MySQL now instead of waiting for the sync worker.
+    """
+    synced = pos_journal.sync_pending(get_connection)
+    if synced is None:
+        flash("Database is still unreachable. Offline sales are kept locally.", "warning")
+    else:
+        flash(f"Synced {synced} offline sale(s). Pending: {pos_journal.pending_count()}.", "success")
+        failed = pos_journal.failed_count()
+        if failed:
+            flash(f"{failed} offline sale(s) could not be synced and were set aside. "
+                  f"Run 'python pos_journal.py failed' to see why.", "warning")
+    return redirect(request.referrer or url_for("sales_list"))
 
 # ============================================================
 # SECTION 7: REPORTS WITH COMPUTED TOTALS
 # ============================================================
 
-@app.route("/reports/top-products")
+@routes.route("/reports/top-products")
 @role_required("admin", "employee")
+@report_governor.governed
 def report_top_products():
-    conn = get_connection()
+    conn = get_read_connection()
     if not conn:
         return render_template("report_top_products.html",
                                rows=[],
@@ -1893,8 +2380,7 @@ def report_top_products():
         if top_n not in (5, 10, 20, 50):
             top_n = 10
 
-        cur.execute("SELECT branch_id, branch_name FROM branch ORDER BY branch_name")
-        branches = cur.fetchall()
+        branches = queries.BRANCHES.run(conn)
 
         conditions = []
         params = []
@@ -1951,7 +2437,9 @@ def report_top_products():
         )
 
     except Exception as e:
-        print("Top products report error:", e)
+        log.error("Top products report error: %s", e)
+        if report_governor.is_timeout(e):
+            return report_governor.queued_response("timeout")
         return render_template("report_top_products.html",
                                rows=[],
                                branches=[],
@@ -1961,129 +2449,124 @@ def report_top_products():
         conn.close()
 
 
-@app.route("/reports/sales-analytics")
+@routes.route("/reports/sales-analytics")
 @role_required("admin", "employee")
+@report_governor.governed
 def sales_analytics():
-    conn = get_connection()
-    if not conn:
-        return render_template("sales_analytics.html",
-                               branches=[], error="DB connection failed")
-
-    try:
-        cur = conn.cursor(dictionary=True)
-
-        branch_id = request.args.get("branch_id", type=int)
-        date_from = (request.args.get("date_from") or "").strip()
-        date_to = (request.args.get("date_to") or "").strip()
-        group_by = (request.args.get("group_by") or "day").strip().lower()
-        group_by = group_by if group_by in ("day", "month") else "day"
-
-        if not date_to:
-            cur.execute("SELECT CURDATE() AS d")
-            date_to = str(cur.fetchone()["d"])
-        if not date_from:
-            cur.execute("SELECT DATE_SUB(%s, INTERVAL 30 DAY) AS d", (date_to,))
-            date_from = str(cur.fetchone()["d"])
-
-        cur.execute("SELECT branch_id, branch_name FROM branch ORDER BY branch_name")
-        branches = cur.fetchall()
-
-        conditions = ["DATE(s.sale_date) >= %s", "DATE(s.sale_date) <= %s"]
-        params = [date_from, date_to]
-
-        if branch_id:
-            conditions.append("s.branch_id = %s")
-            params.append(branch_id)
-
-        where_clause = "WHERE " + " AND ".join(conditions)
-
-        #  KPI summary with computed revenue
-        cur.execute(f"""
-            SELECT
-                COUNT(DISTINCT s.sale_id) AS sale_count,
-                COALESCE(SUM(sl.quantity * sl.unit_price), 0) AS total_revenue,
-                COALESCE(AVG(sale_totals.sale_total), 0) AS avg_sale
-            FROM sale s
-            LEFT JOIN sale_line sl ON s.sale_id = sl.sale_id
-            LEFT JOIN (
-                SELECT sale_id, SUM(quantity * unit_price) AS sale_total
-                FROM sale_line
-                GROUP BY sale_id
-            ) sale_totals ON s.sale_id = sale_totals.sale_id
-            {where_clause}
-        """, params)
-        summary = cur.fetchone()
+    branch_id = request.args.get("branch_id", type=int)
+    date_from = (request.args.get("date_from") or "").strip()
+    date_to = (request.args.get("date_to") or "").strip()
+    group_by = (request.args.get("group_by") or "day").strip().lower()
+    group_by = group_by if group_by in ("day", "month") else "day"
 
-        # Trend with computed revenue
-        if group_by == "month":
-            label_sql = "DATE_FORMAT(s.sale_date, '%Y-%m')"
-        else:
-            label_sql = "DATE(s.sale_date)"
+    # Default range: the last 30 days (computed here, no round trip needed)
+    if not date_to:
+        date_to = date.today().isoformat()
+    if not date_from:
+        try:
+            end = datetime.strptime(date_to, "%Y-%m-%d").date()
+        except ValueError:
+            end = date.today()
+        date_from = (end - timedelta(days=30)).isoformat()
 
-        cur.execute(f"""
-            SELECT
-                {label_sql} AS label,
-                COALESCE(SUM(sl.quantity * sl.unit_price), 0) AS revenue
-            FROM sale s
-            LEFT JOIN sale_line sl ON s.sale_id = sl.sale_id
-            {where_clause}
-            GROUP BY label
-            ORDER BY label ASC
-        """, params)
-        trend_rows = cur.fetchall()
+    conditions = ["DATE(s.sale_date) >= %s", "DATE(s.sale_date) <= %s"]
+    params = [date_from, date_to]
 
-        chart_labels = [str(r["label"]) for r in trend_rows]
-        chart_values = [float(r["revenue"]) for r in trend_rows]
+    if branch_id:
+        conditions.append("s.branch_id = %s")
+        params.append(branch_id)
 
-        #  Top categories with computed revenue
-        cur.execute(f"""
-            SELECT
-                c.category_name,
-                COALESCE(SUM(sl.quantity), 0) AS total_qty,
-                COALESCE(SUM(sl.quantity * sl.unit_price), 0) AS total_revenue
-            FROM sale_line sl
-            JOIN sale s      ON sl.sale_id = s.sale_id
-            JOIN product p   ON sl.product_id = p.product_id
-            JOIN category c  ON p.category_id = c.category_id
-            {where_clause}
-            GROUP BY c.category_name
-            ORDER BY total_revenue DESC
-            LIMIT 10
-        """, params)
-        top_categories = cur.fetchall()
+    where_clause = "WHERE " + " AND ".join(conditions)
 
-        return render_template(
-            "sales_analytics.html",
-            branches=branches,
-            selected_branch_id=branch_id,
-            date_from=date_from,
-            date_to=date_to,
-            group_by=group_by,
-            summary=summary,
-            chart_labels=chart_labels,
-            chart_values=chart_values,
-            top_categories=top_categories,
-            error=None
-        )
+    # Trend with computed revenue
+    if group_by == "month":
+        label_sql = "DATE_FORMAT(s.sale_date, '%Y-%m')"
+    else:
+        label_sql = "DATE(s.sale_date)"
 
+    try:
+        # The four queries are independent: run them side by side
+        results = db.run_concurrently({
+            "branches": (queries.BRANCHES, ()),
+
+            #  KPI summary with computed revenue
+            "summary": (f"""
+                SELECT
+                    COUNT(DISTINCT s.sale_id) AS sale_count,
+                    COALESCE(SUM(sl.quantity * sl.unit_price), 0) AS total_revenue,
+                    COALESCE(AVG(sale_totals.sale_total), 0) AS avg_sale
+                FROM sale s
+                LEFT JOIN sale_line sl ON s.sale_id = sl.sale_id
+                LEFT JOIN (
+                    SELECT sale_id, SUM(quantity * unit_price) AS sale_total
+                    FROM sale_line
+                    GROUP BY sale_id
+                ) sale_totals ON s.sale_id = sale_totals.sale_id
+                {where_clause}
+            """, params, "one"),
+
+            "trend": (f"""
+                SELECT
+                    {label_sql} AS label,
+                    COALESCE(SUM(sl.quantity * sl.unit_price), 0) AS revenue
+                FROM sale s
+                LEFT JOIN sale_line sl ON s.sale_id = sl.sale_id
+                {where_clause}
+                GROUP BY label
+                ORDER BY label ASC
+            """, params),
+
+            #  Top categories with computed revenue
+            "top_categories": (f"""
+                SELECT
+                    c.category_name,
+                    COALESCE(SUM(sl.quantity), 0) AS total_qty,
+                    COALESCE(SUM(sl.quantity * sl.unit_price), 0) AS total_revenue
+                FROM sale_line sl
+                JOIN sale s      ON sl.sale_id = s.sale_id
+                JOIN product p   ON sl.product_id = p.product_id
+                JOIN category c  ON p.category_id = c.category_id
+                {where_clause}
+                GROUP BY c.category_name
+                ORDER BY total_revenue DESC
+                LIMIT 10
+            """, params),
+        }, connect=read_connector())
     except Exception as e:
-        print("sales_analytics error:", e)
+        log.error("sales_analytics error: %s", e)
+        if report_governor.is_timeout(e):
+            return report_governor.queued_response("timeout")
         return render_template("sales_analytics.html",
                                branches=[], error="Error loading analytics")
 
-    finally:
-        cur.close()
-        conn.close()
+    trend_rows = results["trend"]
+    chart_labels = [str(r["label"]) for r in trend_rows]
+    chart_values = [float(r["revenue"]) for r in trend_rows]
 
-@app.route("/reports/employee-attendance")
+    return render_template(
+        "sales_analytics.html",
+        branches=results["branches"],
+        selected_branch_id=branch_id,
+        date_from=date_from,
+        date_to=date_to,
+        group_by=group_by,
+        summary=results["summary"],
+        chart_labels=chart_labels,
+        chart_values=chart_values,
+        top_categories=results["top_categories"],
+        error=None
+    )
+
+@routes.route("/reports/employee-attendance")
 @login_required
 @role_required("admin")
+@report_governor.governed
 def employee_attendance_report():
     day = request.args.get("date")
     if not day:
         day = date.today().strftime("%Y-%m-%d")
 
-    conn = get_connection()
+    conn = get_read_connection()
     cur = conn.cursor(dictionary=True)
 
     #  Compute hours_worked and daily_salary in SELECT
@@ -2124,10 +2607,11 @@ def employee_attendance_report():
 # SECTION 7: Stock Movement History
 # ============================================================
 
-@app.route("/stock-movements")
+@routes.route("/stock-movements")
 @role_required("admin", "employee")
+@report_governor.governed
 def stock_movements():
-    conn = get_connection()
+    conn = get_read_connection()
     if not conn:
         return render_template(
             "stock_movements.html",
@@ -2138,6 +2622,7 @@ def stock_movements():
             error="Unable to connect to database"
         )
 
+    rows = None
     try:
         cur = conn.cursor(dictionary=True)
 
@@ -2149,16 +2634,6 @@ def stock_movements():
         date_from = (request.args.get('date_from') or '').strip()
         date_to = (request.args.get('date_to') or '').strip()
 
-        # Dropdowns
-        cur.execute("SELECT branch_id, branch_name FROM branch ORDER BY branch_name")
-        branches = cur.fetchall()
-
-        cur.execute("SELECT warehouse_id, warehouse_name FROM warehouse ORDER BY warehouse_name")
-        warehouses = cur.fetchall()
-
-        cur.execute("SELECT product_id, product_name FROM product ORDER BY product_name")
-        products = cur.fetchall()
-
         # Build WHERE
         conditions = []
         params = []
@@ -2213,10 +2688,21 @@ def stock_movements():
             LIMIT 200
         """
         cur.execute(query, params)
-        rows = cur.fetchall()
-
-        return render_template(
+        rows = streaming.RowStream(cur, conn)
+
+        # Dropdowns, on other connections while the movement query is running
+        results = db.run_concurrently({
+            "branches": (queries.BRANCHES, ()),
+            "warehouses": (queries.WAREHOUSES, ()),
+            "products": (queries.ALL_PRODUCTS, ()),
+        }, connect=read_connector())
+        branches = results["branches"]
+        warehouses = results["warehouses"]
+        products = results["products"]
+
+        return streaming.stream_page(
             "stock_movements.html",
+            rows,
             rows=rows,
             branches=branches,
             warehouses=warehouses,
@@ -2231,17 +2717,33 @@ def stock_movements():
         )
 
     except Exception as e:
-        print("stock_movements error:", e)
+        log.error("stock_movements error: %s", e)
+        if rows is not None:
+            rows.close()
+        if report_governor.is_timeout(e):
+            return report_governor.queued_response("timeout")
+        return render_template(
+            "stock_movements.html",
+            rows=[],
+            branches=[],
+            warehouses=[],
+            products=[],
+            error="Error loading stock movements"
+        )
+    finally:
+        if rows is None:
+            cur.close()
+            conn.close()
 
 # =========================================================
 #  Inventory transfer history
 # =========================================================
 
-@app.route('/transfers')
+@routes.route('/transfers')
 @role_required('admin', 'employee')
 def transfers_list():
     """View all stock transfers."""
-    conn = get_connection()
+    conn = get_read_connection()
     if not conn:
         return render_template('transfers.html', transfers=[], error="DB connection failed")
 
@@ -2301,11 +2803,9 @@ def transfers_list():
         transfers = cur.fetchall()
         
         # Get dropdowns
-        cur.execute("SELECT warehouse_id, warehouse_name FROM warehouse ORDER BY warehouse_name")
-        warehouses = cur.fetchall()
+        warehouses = queries.WAREHOUSES.run(conn)
         
-        cur.execute("SELECT branch_id, branch_name FROM branch ORDER BY branch_name")
-        branches = cur.fetchall()
+        branches = queries.BRANCHES.run(conn)
         
         return render_template(
             'transfers.html',
@@ -2325,7 +2825,7 @@ def transfers_list():
 # ============================================================
 # SECTION 9: Bookings Management
 # ============================================================
-@app.route("/booking/search")
+@routes.route("/booking/search")
 @role_required("customer", "admin", "employee")  # allow employees to use it too
 def booking_search():
     date_from = (request.args.get("date_from") or "").strip()
@@ -2355,7 +2855,7 @@ def booking_search():
             """, (date_to, date_from))
             rooms = cur.fetchall()
         except Exception as e:
-            print("booking_search error:", e)
+            log.error("booking_search error: %s", e)
             error = "Error loading rooms"
         finally:
             cur.close()
@@ -2368,7 +2868,7 @@ def booking_search():
                            error=error)
 
 
-@app.route("/bookings")
+@routes.route("/bookings")
 @login_required
 def bookings_home():
     role = session.get("role")
@@ -2376,18 +2876,19 @@ def bookings_home():
         return redirect(url_for("admin_bookings"))
     return redirect(url_for("booking_search"))
 
-@app.route("/admin/bookings")
+@routes.route("/admin/bookings")
 @role_required("admin", "employee")
 def admin_bookings():
     status = (request.args.get("status") or "").strip().upper()
     date_from = (request.args.get("date_from") or "").strip()
     date_to = (request.args.get("date_to") or "").strip()
 
-    conn = get_connection()
+    conn = get_read_connection()
     if not conn:
         return render_template("admin_bookings.html", rows=[], error="DB connection failed",
                                status=status, date_from=date_from, date_to=date_to)
 
+    rows = None
     try:
         cur = conn.cursor(dictionary=True)
 
@@ -2408,43 +2909,52 @@ def admin_bookings():
 
         where_clause = ("WHERE " + " AND ".join(conditions)) if conditions else ""
 
-        #  Compute total_amount in SELECT
+        # One row per booking room (bookings without rooms come back once with NULLs),
+        # folded into one item per booking while streaming
         cur.execute(f"""
             SELECT
-              b.booking_id, b.date_from, b.date_to, b.status, b.created_at,
-              u.full_name AS customer_name,
-              COALESCE(SUM(br.nights * br.price_per_night * (1 - br.discount_percent/100)), 0) AS total_amount
-            FROM booking b
-            JOIN users u ON b.customer_id = u.user_id
+              b.booking_id, b.date_from, b.date_to, b.status, b.created_at, b.customer_name,
+              r2.room_number, c.cat_name,
+              br.nights * br.price_per_night * (1 - br.discount_percent/100) AS line_amount
+            FROM (
+              SELECT b.booking_id, b.date_from, b.date_to, b.status, b.created_at,
+                     u.full_name AS customer_name
+              FROM booking b
+              JOIN users u ON b.customer_id = u.user_id
+              {where_clause}
+              ORDER BY b.created_at DESC
+              LIMIT 200
+            ) b
             LEFT JOIN booking_room br ON b.booking_id = br.booking_id
-            {where_clause}
-            GROUP BY b.booking_id, b.date_from, b.date_to, b.status, b.created_at, u.full_name
-            ORDER BY b.created_at DESC
-            LIMIT 200
+            LEFT JOIN room r2 ON br.room_id = r2.room_id
+            LEFT JOIN cat c ON br.cat_id = c.cat_id
+            ORDER BY b.created_at DESC, b.booking_id, r2.room_number
         """, params)
 
-        rows = cur.fetchall()
-
-        for r in rows:
-            cur.execute("""
-                SELECT r2.room_number, c.cat_name
-                FROM booking_room br
-                JOIN room r2 ON br.room_id = r2.room_id
-                JOIN cat c ON br.cat_id = c.cat_id
-                WHERE br.booking_id = %s
-                ORDER BY r2.room_number
-            """, (r["booking_id"],))
-            r["lines"] = cur.fetchall()
+        rows = streaming.GroupedRows(streaming.RowStream(cur, conn),
+                                     key=lambda r: r["booking_id"], fold=_fold_booking_rows)
 
-        return render_template("admin_bookings.html", rows=rows, error=None,
-                               status=status, date_from=date_from, date_to=date_to)
+        return streaming.stream_page("admin_bookings.html", rows, rows=rows, error=None,
+                                     status=status, date_from=date_from, date_to=date_to)
 
     finally:
-        cur.close()
-        conn.close()
+        if rows is None:
+            cur.close()
+            conn.close()
+
 
+def _fold_booking_rows(group):
+    booking = {k: group[0][k] for k in
+               ("booking_id", "date_from", "date_to", "status", "created_at", "customer_name")}
+    booking["lines"] = [
+        {"room_number": r["room_number"], "cat_name": r["cat_name"]}
+        for r in group if r["room_number"] is not None
+    ]
+    booking["total_amount"] = sum(r["line_amount"] for r in group if r["line_amount"] is not None)
+    return booking
 
-@app.route("/my-cats", methods=["GET", "POST"])
+
+@routes.route("/my-cats", methods=["GET", "POST"])
 @role_required("customer")
 def my_cats():
     user_id = session.get("user_id")
@@ -2489,7 +2999,7 @@ def my_cats():
         cur.close()
         conn.close()
 
-@app.route("/my-bookings")
+@routes.route("/my-bookings")
 @role_required("customer")
 def my_bookings():
     user_id = session.get("user_id")
@@ -2536,7 +3046,7 @@ def my_bookings():
         conn.close()
 
 
-@app.route("/booking/new", methods=["GET", "POST"])
+@routes.route("/booking/new", methods=["GET", "POST"])
 @role_required("customer", "admin", "employee")
 def booking_new():
     user_id = session.get("user_id")
@@ -2700,7 +3210,7 @@ def booking_new():
         conn.close()
 
 
-@app.route("/admin/bookings/<int:booking_id>/confirm", methods=["POST"])
+@routes.route("/admin/bookings/<int:booking_id>/confirm", methods=["POST"])
 @role_required("admin", "employee")
 def booking_confirm(booking_id):
     conn = get_connection()
@@ -2728,7 +3238,7 @@ def booking_confirm(booking_id):
         conn.close()
 
 
-@app.route("/admin/bookings/<int:booking_id>/cancel", methods=["POST"])
+@routes.route("/admin/bookings/<int:booking_id>/cancel", methods=["POST"])
 @role_required("admin", "employee")
 def booking_cancel(booking_id):
     conn = get_connection()
@@ -2756,7 +3266,7 @@ def booking_cancel(booking_id):
         conn.close()
 
 
-@app.route("/admin/bookings/<int:booking_id>/complete", methods=["POST"])
+@routes.route("/admin/bookings/<int:booking_id>/complete", methods=["POST"])
 @role_required("admin", "employee")
 def booking_complete(booking_id):
     conn = get_connection()
@@ -2783,7 +3293,7 @@ def booking_complete(booking_id):
         cur.close()
         conn.close()
 
-@app.route("/admin/bookings/today")
+@routes.route("/admin/bookings/today")
 @role_required("admin", "employee")
 def bookings_today():
     conn = get_connection()
@@ -2859,7 +3369,7 @@ def bookings_today():
                                error=None)
 
     except Exception as e:
-        print("bookings_today error:", e)
+        log.error("bookings_today error: %s", e)
         return render_template("bookings_today.html",
                                checkins=[],
                                checkouts=[],
@@ -2871,7 +3381,7 @@ def bookings_today():
         except:
             pass
 
-@app.route("/admin/rooms/occupancy")
+@routes.route("/admin/rooms/occupancy")
 @role_required("admin", "employee")
 def rooms_occupancy():
     date_from = (request.args.get("date_from") or "").strip()
@@ -2951,7 +3461,7 @@ def rooms_occupancy():
                                error=error)
 
     except Exception as e:
-        print("rooms_occupancy error:", e)
+        log.error("rooms_occupancy error: %s", e)
         error = "Error loading occupancy."
         return render_template("rooms_occupancy.html",
                                rows=[],
@@ -2965,8 +3475,9 @@ def rooms_occupancy():
         except:
             pass
 
-@app.route("/admin/occupancy-analytics")
+@routes.route("/admin/occupancy-analytics")
 @role_required("admin", "employee")
+@report_governor.governed
 def occupancy_analytics():
     date_from = (request.args.get("date_from") or "").strip()
     date_to = (request.args.get("date_to") or "").strip()
@@ -2982,7 +3493,7 @@ def occupancy_analytics():
     error = None
     data = {"total_rooms": 0, "occupied_rooms": 0, "available_rooms": 0, "occupancy_rate": 0.0}
 
-    conn = get_connection()
+    conn = get_read_connection()
     if not conn:
         return render_template("occupancy_analytics.html",
                                date_from=date_from, date_to=date_to,
@@ -3023,7 +3534,9 @@ def occupancy_analytics():
                                data=data, error=None)
 
     except Exception as e:
-        print("occupancy_analytics error:", e)
+        log.error("occupancy_analytics error: %s", e)
+        if report_governor.is_timeout(e):
+            return report_governor.queued_response("timeout")
         return render_template("occupancy_analytics.html",
                                date_from=date_from, date_to=date_to,
                                data=data, error="Error loading occupancy analytics")
@@ -3039,7 +3552,7 @@ def occupancy_analytics():
 # SECTION 10: EMPLOYEE ATTENDANCE ROUTES
 # ============================================================
 
-@app.route("/employee/check-in", methods=["POST"])
+@routes.route("/employee/check-in", methods=["POST"])
 @role_required("employee")
 def employee_check_in():
     user_id = session.get("user_id")
@@ -3063,7 +3576,7 @@ def employee_check_in():
     return redirect(url_for("dashboard"))
 
 
-@app.route("/employee/check-out", methods=["POST"])
+@routes.route("/employee/check-out", methods=["POST"])
 @role_required("employee")
 def employee_check_out():
     user_id = session.get("user_id")
@@ -3126,7 +3639,7 @@ def employee_check_out():
 # SECTION 11: Login, Signup, Logout Routes
 # ============================================================
 
-@app.route('/login', methods=['GET', 'POST'])
+@routes.route('/login', methods=['GET', 'POST'])
 def login():
     """
     Handle user login.
@@ -3174,7 +3687,7 @@ def login():
     
     return render_template('login.html')
 
-@app.route('/signup', methods=['POST'])
+@routes.route('/signup', methods=['POST'])
 def signup():
     """
     Handle user signup (registration).
@@ -3189,6 +3702,7 @@ def signup():
     email = request.form.get('email', '').strip()
     password = request.form.get('password', '').strip()
     confirm_password = request.form.get('confirm_password', '').strip()
+    phone = normalize_phone(request.form.get('phone'))
     
     # Validation
     if not full_name or not email or not password or not confirm_password:
@@ -3206,6 +3720,11 @@ def signup():
         flash('Password must be at least 8 characters long.', 'danger')
         return render_template('login.html')
     
+    # Phone is optional, but must look like a phone number when given
+    if phone and not 7 <= len(phone.lstrip('+')) <= 15:
+        flash('Please enter a valid phone number.', 'danger')
+        return render_template('login.html')
+    
     # Check if passwords match
     if password != confirm_password:
         flash('Passwords do not match.', 'danger')
@@ -3220,7 +3739,7 @@ def signup():
     password_hash = generate_password_hash(password)
     
     # Create user with customer role
-    success = create_user(full_name, email, password_hash, role='customer')
+    success = create_user(full_name, email, password_hash, role='customer', phone=phone)
     
     if success:
         flash('Account created successfully! Please log in with your credentials.', 'success')
@@ -3229,7 +3748,7 @@ def signup():
         flash('An error occurred while creating your account. Please try again.', 'danger')
         return render_template('login.html')
 
-@app.route('/logout')
+@routes.route('/logout')
 def logout():
     """
     Clear session and log out user.
@@ -3242,7 +3761,7 @@ def logout():
 # SECTION 12: DASHBOARD - EMPLOYEE ATTENDANCE DISPLAY
 # ============================================================
 
-@app.route('/')
+@routes.route('/')
 @login_required
 def dashboard():
     """
@@ -3252,8 +3771,6 @@ def dashboard():
     full_name = session.get('full_name')
     user_id = session.get('user_id')
 
-    conn = get_connection()
-
     # Initialize metrics
     products_count = 0
     low_stock_count = 0
@@ -3263,86 +3780,89 @@ def dashboard():
     today_attendance = None
     employee_status = []
 
-    if conn:
-        try:
-            cur = conn.cursor(dictionary=True)
+    # The metric queries are independent: run them side by side
+    metric_queries = {
+        # Products count
+        "products_count": ("SELECT COUNT(*) AS cnt FROM product WHERE is_active = 1", (), "one")
+    }
 
-            # Products count
-            cur.execute("SELECT COUNT(*) AS cnt FROM product WHERE is_active = 1")
-            products_count = cur.fetchone()["cnt"]
+    # Low stock (branch only)
+    if role in ['admin', 'employee']:
+        metric_queries["low_stock_count"] = (
+            "SELECT COUNT(*) AS cnt FROM branch_stock WHERE on_hand_qty <= min_qty", (), "one"
+        )
 
-            # Low stock (branch only)
-            if role in ['admin', 'employee']:
-                cur.execute("SELECT COUNT(*) AS cnt FROM branch_stock WHERE on_hand_qty <= min_qty")
-                low_stock_count = cur.fetchone()["cnt"]
+    #  Today's sales with computed total_revenue
+    if role in ['admin', 'employee']:
+        metric_queries["today_sales"] = ("""
+            SELECT 
+                COUNT(*) AS total_sales,
+                COALESCE(SUM(sl.quantity * sl.unit_price), 0) AS total_revenue
+            FROM sale s
+            LEFT JOIN sale_line sl ON s.sale_id = sl.sale_id
+            WHERE DATE(s.sale_date) = CURDATE()
+        """, (), "one")
 
-            #  Today's sales with computed total_revenue
-            if role in ['admin', 'employee']:
-                cur.execute("""
-                    SELECT 
-                        COUNT(*) AS total_sales,
-                        COALESCE(SUM(sl.quantity * sl.unit_price), 0) AS total_revenue
-                    FROM sale s
-                    LEFT JOIN sale_line sl ON s.sale_id = sl.sale_id
-                    WHERE DATE(s.sale_date) = CURDATE()
-                """)
-                today_sales = cur.fetchone() or today_sales
-
-            #  Employee attendance with computed hours_worked and daily_salary
-            if role == 'employee':
-                cur.execute("""
-                    SELECT 
-                        DATE_FORMAT(ea.check_in, '%H:%i') AS check_in,
-                        DATE_FORMAT(ea.check_out, '%H:%i') AS check_out,
-                        CASE 
-                            WHEN ea.check_in IS NULL OR ea.check_out IS NULL THEN 0
-                            ELSE ROUND(TIMESTAMPDIFF(MINUTE, ea.check_in, ea.check_out)/60, 2)
-                        END AS hours_worked,
-                        CASE 
-                            WHEN ea.check_in IS NULL OR ea.check_out IS NULL THEN 0
-                            ELSE ROUND(TIMESTAMPDIFF(MINUTE, ea.check_in, ea.check_out)/60 * e.hourly_rate, 2)
-                        END AS daily_salary
-                    FROM employee_attendance ea
-                    JOIN employee e ON e.user_id = ea.user_id
-                    WHERE ea.user_id=%s AND ea.work_date=%s
-                """, (user_id, date.today()))
-                today_attendance = cur.fetchone()
-
-            #  Admin employee status with computed columns
-            if role == 'admin':
-                cur.execute("""
-                    SELECT
-                        u.full_name,
-                        u.email,
-                        DATE_FORMAT(a.check_in, '%H:%i') AS check_in,
-                        DATE_FORMAT(a.check_out, '%H:%i') AS check_out,
-                        CASE 
-                            WHEN a.check_in IS NULL OR a.check_out IS NULL THEN 0
-                            ELSE ROUND(TIMESTAMPDIFF(MINUTE, a.check_in, a.check_out)/60, 2)
-                        END AS hours_worked,
-                        CASE 
-                            WHEN a.check_in IS NULL OR a.check_out IS NULL THEN 0
-                            ELSE ROUND(TIMESTAMPDIFF(MINUTE, a.check_in, a.check_out)/60 * e.hourly_rate, 2)
-                        END AS daily_salary,
-                        CASE
-                            WHEN a.check_in IS NULL THEN 'Not checked in'
-                            WHEN a.check_out IS NULL THEN 'Working'
-                            ELSE 'Checked out'
-                        END AS status
-                    FROM users u
-                    LEFT JOIN employee_attendance a
-                        ON a.user_id = u.user_id AND a.work_date = CURDATE()
-                    LEFT JOIN employee e ON e.user_id = u.user_id
-                    WHERE u.role = 'employee'
-                    ORDER BY u.full_name
-                """)
-                employee_status = cur.fetchall()
+    #  Employee attendance with computed hours_worked and daily_salary
+    if role == 'employee':
+        metric_queries["today_attendance"] = ("""
+            SELECT 
+                DATE_FORMAT(ea.check_in, '%H:%i') AS check_in,
+                DATE_FORMAT(ea.check_out, '%H:%i') AS check_out,
+                CASE 
+                    WHEN ea.check_in IS NULL OR ea.check_out IS NULL THEN 0
+                    ELSE ROUND(TIMESTAMPDIFF(MINUTE, ea.check_in, ea.check_out)/60, 2)
+                END AS hours_worked,
+                CASE 
+                    WHEN ea.check_in IS NULL OR ea.check_out IS NULL THEN 0
+                    ELSE ROUND(TIMESTAMPDIFF(MINUTE, ea.check_in, ea.check_out)/60 * e.hourly_rate, 2)
+                END AS daily_salary
+            FROM employee_attendance ea
+            JOIN employee e ON e.user_id = ea.user_id
+            WHERE ea.user_id=%s AND ea.work_date=%s
+        """, (user_id, date.today()), "one")
+
+    #  Admin employee status with computed columns
+    if role == 'admin':
+        metric_queries["employee_status"] = ("""
+            SELECT
+                u.full_name,
+                u.email,
+                DATE_FORMAT(a.check_in, '%H:%i') AS check_in,
+                DATE_FORMAT(a.check_out, '%H:%i') AS check_out,
+                CASE 
+                    WHEN a.check_in IS NULL OR a.check_out IS NULL THEN 0
+                    ELSE ROUND(TIMESTAMPDIFF(MINUTE, a.check_in, a.check_out)/60, 2)
+                END AS hours_worked,
+                CASE 
+                    WHEN a.check_in IS NULL OR a.check_out IS NULL THEN 0
+                    ELSE ROUND(TIMESTAMPDIFF(MINUTE, a.check_in, a.check_out)/60 * e.hourly_rate, 2)
+                END AS daily_salary,
+                CASE
+                    WHEN a.check_in IS NULL THEN 'Not checked in'
+                    WHEN a.check_out IS NULL THEN 'Working'
+                    ELSE 'Checked out'
+                END AS status
+            FROM users u
+            LEFT JOIN employee_attendance a
+                ON a.user_id = u.user_id AND a.work_date = CURDATE()
+            LEFT JOIN employee e ON e.user_id = u.user_id
+            WHERE u.role = 'employee'
+            ORDER BY u.full_name
+        """, ())
 
-        except Exception as e:
-            print(f"Dashboard metrics error: {e}")
-        finally:
-            cur.close()
-            conn.close()
+    try:
+        results = db.run_concurrently(metric_queries, connect=read_connector())
+
+        products_count = results["products_count"]["cnt"]
+        if "low_stock_count" in results:
+            low_stock_count = results["low_stock_count"]["cnt"]
+        today_sales = results.get("today_sales") or today_sales
+        today_attendance = results.get("today_attendance")
+        employee_status = results.get("employee_status", [])
+
+    except Exception as e:
+        log.error("Dashboard metrics error: %s", e)
 
     content = {
         'admin': {
@@ -3419,7 +3939,7 @@ def check_warehouse_stock(warehouse_id, product_id):
         result = cur.fetchone()
         return result['on_hand_qty'] if result else 0
     except Exception as e:
-        print(f"check_warehouse_stock error: {e}")
+        log.error("check_warehouse_stock error: %s", e)
         return 0
     finally:
         if conn.is_connected():
@@ -3447,7 +3967,7 @@ def check_branch_stock(branch_id, product_id):
         result = cur.fetchone()
         return result['on_hand_qty'] if result else 0
     except Exception as e:
-        print(f"check_branch_stock error: {e}")
+        log.error("check_branch_stock error: %s", e)
         return 0
     finally:
         if conn.is_connected():
@@ -3478,20 +3998,97 @@ def get_warehouse_summary():
         
         return cur.fetchone()
     except Exception as e:
-        print(f"get_warehouse_summary error: {e}")
+        log.error("get_warehouse_summary error: %s", e)
         return None
     finally:
         if conn.is_connected():
             cur.close()
             conn.close()
 
+# ==================== REPORT GOVERNOR ====================
+
+@routes.route("/admin/report-governor")
+@role_required("admin")
+def report_governor_stats():
+    """
+    Governor counters for this worker: admitted reports, rejections (busy / timeout).
+    """
+    return jsonify(report_governor.stats())
+
+@routes.route("/admin/query-stats")
+@role_required("admin")
+def query_stats():
+    """
+    Timing of the named queries in this worker (calls, total/avg/max ms).
+    """
+    return jsonify(queries.stats())
+
+# ==================== METRICS ====================
+
+@routes.route("/metrics")
+def metrics_endpoint():
+    """
+    Prometheus scrape target. Needs METRICS_TOKEN as a bearer token, or an admin session.
+    """
+    if not metrics.authorized() and session.get("role") != "admin":
+        return "Forbidden", 403
+    return current_app.response_class(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+# ==================== PROFILING ====================
+
+@routes.route("/admin/profiles")
+@role_required("admin")
+def profiles_list():
+    """
+    Recently profiled requests (newest first), with their SQL statement count and time.
+    """
+    return jsonify(profiling.recent())
+
+@routes.route("/admin/profiles/<profile_id>/<kind>")
+@role_required("admin")
+def profile_download(profile_id, kind):
+    """
+    Download one profile: kind is "prof" (pstats), "collapsed" (flame graph input) or "sql".
+    """
+    path = profiling.path_for(profile_id, kind)
+    if path is None:
+        return "Profile not found", 404
+    return send_from_directory(profiling.PROFILE_DIR, os.path.basename(path), as_attachment=True)
+
+# ==================== DATABASE HEALTH ====================
+
+@routes.after_request
+def retry_after_outage(response):
+    # During a known outage tell clients (and POS terminals) when to try again
+    if response.status_code == 503 and not db.database_available():
+        response.headers.setdefault("Retry-After", str(int(db.DB_BREAKER_PROBE_INTERVAL) or 1))
+    return response
+
+@routes.route("/health")
+def health():
+    """
+    Load balancer / monitoring probe. Never opens a connection: reports the breaker state.
+    """
+    available = db.database_available()
+    body = {"status": "ok" if available else "degraded",
+            "database": "up" if available else "down"}
+    return jsonify(body), 200 if available else 503
+
+@routes.route("/admin/db-breaker")
+@role_required("admin")
+def db_breaker_stats():
+    """
+    Circuit breaker state per database (primary / replica) in this worker.
+    """
+    return jsonify(db.breaker_stats())
+
 # ==================== ERROR HANDLERS ====================
 
-@app.errorhandler(404)
+@routes.errorhandler(404)
 def page_not_found(e):
     return render_template('base.html', error='Page not found'), 404
 
-@app.errorhandler(500)
+@routes.errorhandler(500)
 def internal_error(e):
     return render_template('base.html', error='Internal server error'), 500
 
@@ -3505,5 +4102,55 @@ def calc_nights_and_discount(date_from, date_to):
     discount = 10.0 if nights > 10 else 0.0
     return nights, discount
 
+# ==================== APPLICATION FACTORY ====================
+
+_worker_pid = None
+
+
+def create_app(config=None, start_workers=True):
+    """
+    Build a new Flask app with every route and hook of this module. Importing the
+    module only defines them; loading .env, logging setup, the upload folder and
+    threads all happen here. `config` overrides Flask settings (SECRET_KEY, TESTING,
+    MAX_CONTENT_LENGTH, ...). Database settings stay process-wide (see db.py).
+    With start_workers=False the per-process resources are left to init_worker()
+    (gunicorn calls it in every worker after fork, see gunicorn.conf.py).
+    """
+    load_dotenv()
+    # JSON log lines written by a background thread (once per process)
+    applog.configure()
+
+    app = Flask(__name__)
+    app.secret_key = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
+    # Reject oversized uploads before they are read (default 16 MB)
+    app.config["MAX_CONTENT_LENGTH"] = int(os.getenv("MAX_UPLOAD_MB", 16)) * 1024 * 1024
+    app.config.update(config or {})
+    routes.init_app(app)
+
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    if start_workers:
+        init_worker()
+    return app
+
+
+def init_worker():
+    """
+    Per-process resources: a fresh DB pool and, on branch machines, the POS sync thread.
+    Threads and sockets do not survive fork(), so this must run in each worker.
+    Calling it twice in the same process is a no-op.
+    """
+    global _worker_pid
+    if _worker_pid == os.getpid():
+        return
+    _worker_pid = os.getpid()
+
+    db.reset_pool()
+
+    # Branch POS: replay sales journaled while MySQL was unreachable
+    if pos_journal.POS_OFFLINE_MODE:
+        pos_journal.start_sync_worker(get_connection)
+
+
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    # Development server only; production runs under gunicorn (see gunicorn.conf.py)
+    create_app().run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
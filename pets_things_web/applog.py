@@ -0,0 +1,198 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import re
+import secrets
+import sys
+import threading
+import time
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, has_request_context, request, session
+
+# Structured, non-blocking logging.
+# Modules log through logging.getLogger(__name__). configure() puts a QueueHandler on
+# the root logger: the calling thread only fills in the request context and drops the
+# record on an in-memory queue; a background thread formats it (one JSON object per
+# line) and writes it to stderr. If the queue is full the record is dropped and
+# counted, so a slow pipe never stalls a request. Repeated messages from the same
+# call site are sampled: at most LOG_SAMPLE_BURST per LOG_SAMPLE_WINDOW seconds, and
+# the next record that gets through says how many were suppressed.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json | text
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+LOG_SAMPLE_BURST = int(os.getenv("LOG_SAMPLE_BURST", 20))
+LOG_SAMPLE_WINDOW = float(os.getenv("LOG_SAMPLE_WINDOW", 10))
+
+REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+# Attributes every LogRecord has; anything else was passed with extra={...}
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_counts = {"dropped": 0, "suppressed": 0}
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    Runs in the thread that logs: copies the request context onto the record.
+    """
+
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = g.get("request_id")
+            record.route = request.endpoint
+            record.method = request.method
+            record.path = request.path
+            record.role = session.get("role")
+            record.user_id = session.get("user_id")
+            started = g.get("log_started")
+            if started is not None:
+                record.elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Lets through LOG_SAMPLE_BURST records per call site and window; errors with a
+    traceback are never sampled.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.exc_info:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= LOG_SAMPLE_WINDOW:
+                suppressed = window[2] if window else 0
+                self._windows[key] = [now, 1, 0]
+            elif window[1] < LOG_SAMPLE_BURST:
+                window[1] += 1
+                suppressed, window[2] = window[2], 0
+            else:
+                window[2] += 1
+                _counts["suppressed"] += 1
+                return False
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class _Handler(QueueHandler):
+    """
+    QueueHandler that never blocks and restarts its writer thread after a fork.
+    """
+
+    def __init__(self):
+        super().__init__(queue.Queue(LOG_QUEUE_SIZE))
+        self.listener = None
+        self.pid = None
+
+    def start(self):
+        if self.pid == os.getpid():
+            return
+        # The queue (and its lock) may have been mid-use in the parent: start fresh
+        self.queue = queue.Queue(LOG_QUEUE_SIZE)
+        writer = logging.StreamHandler(sys.stderr)
+        writer.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else
+                            logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        self.listener = QueueListener(self.queue, writer, respect_handler_level=False)
+        self.listener.start()
+        self.pid = os.getpid()
+
+    def stop(self):
+        if self.listener is not None and self.pid == os.getpid():
+            self.listener.stop()
+        self.pid = None
+
+    def prepare(self, record):
+        # Only resolve the message here; formatting and tracebacks happen in the writer
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        return record
+
+    def enqueue(self, record):
+        if self.pid != os.getpid():
+            self.start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _counts["dropped"] += 1
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+_handler = None
+
+
+def configure():
+    """
+    Route all logging through the queue. Safe to call more than once.
+    """
+    global _handler
+    if _handler is not None:
+        return _handler
+    _handler = _Handler()
+    _handler.addFilter(SamplingFilter())
+    _handler.addFilter(RequestContextFilter())
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(_handler)
+    _handler.start()
+    atexit.register(shutdown)
+    return _handler
+
+
+def shutdown():
+    """
+    Flush queued records (the writer thread drains the queue before it stops).
+    """
+    if _handler is not None:
+        _handler.stop()
+
+
+def start_request():
+    """
+    before_request hook: a request id (the caller's X-Request-Id if it sends a sane one).
+    """
+    incoming = request.headers.get("X-Request-Id", "")
+    g.request_id = incoming if REQUEST_ID.match(incoming) else secrets.token_hex(8)
+    g.log_started = time.perf_counter()
+
+
+def finish_request(response):
+    request_id = g.get("request_id")
+    if request_id:
+        response.headers["X-Request-Id"] = request_id
+    return response
+
+
+def stats():
+    return {
+        "queued": _handler.queue.qsize() if _handler else 0,
+        "dropped": _counts["dropped"],
+        "suppressed": _counts["suppressed"],
+    }
@@ -0,0 +1,212 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import urllib.request
+
+from flask import url_for
+
+try:
+    import brotli
+except ImportError:  # brotli is optional: without it only .gz copies are written
+    brotli = None
+
+# Static asset build.
+# `python assets.py build` minifies the CSS/JS below, writes them to static/dist/
+# under content-hashed names (style.3f2a9c1e.css), pre-compresses them (.gz, .br)
+# and records the mapping in static/dist/manifest.json. asset_url() reads that
+# manifest; without a build it falls back to the plain file names.
+STATIC_DIR = os.path.join(os.path.dirname(__file__), "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST_PATH = os.path.join(DIST_DIR, "manifest.json")
+
+ASSETS = [
+    "css/style.css",
+    "js/catalog.js",
+    "js/customer_search.js",
+    "vendor/chart.umd.min.js",
+]
+
+# Third-party scripts committed under static/vendor so branches work without internet.
+# `python assets.py vendor` downloads the pinned version; until it has been committed
+# pages load that same version from the CDN and a warning is logged.
+CHART_JS_VERSION = "4.4.1"
+VENDOR = {
+    "vendor/chart.umd.min.js": (
+        f"https://cdn.jsdelivr.net/npm/chart.js@{CHART_JS_VERSION}/dist/chart.umd.min.js",
+        f"Chart.js v{CHART_JS_VERSION}",
+    ),
+}
+
+log = logging.getLogger(__name__)
+
+_manifest = None
+_manifest_mtime = None
+_missing_reported = set()
+
+
+class MissingVendorFile(Exception):
+    pass
+
+
+# ==================== Minify ====================
+
+def minify_css(text):
+    text = re.sub(r"/\*.*?\*/", "", text, flags=re.S)
+    text = re.sub(r"\s+", " ", text)
+    text = re.sub(r"\s*([{};,])\s*", r"\1", text)
+    return text.replace(";}", "}").strip()
+
+
+def minify_js(text):
+    """
+    Conservative: drop whole-line // comments, indentation and blank lines.
+    Anything cleverer needs a real JS parser.
+    """
+    if "`" in text:
+        # template literals may contain significant whitespace
+        return text
+    lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith("//"):
+            lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+def _minify(name, data):
+    if name.endswith(".min.js") or name.endswith(".min.css"):
+        return data
+    if name.endswith(".css"):
+        return minify_css(data.decode("utf-8")).encode("utf-8")
+    if name.endswith(".js"):
+        return minify_js(data.decode("utf-8")).encode("utf-8")
+    return data
+
+
+# ==================== Build ====================
+
+def build():
+    """
+    Write fingerprinted, minified and pre-compressed copies of ASSETS into static/dist.
+    Returns the new manifest.
+    """
+    # Older builds are kept: pages rendered (or cached) before the deploy still reference them
+    os.makedirs(DIST_DIR, exist_ok=True)
+
+    manifest = {}
+    for name in ASSETS:
+        source = os.path.join(STATIC_DIR, name)
+        if not os.path.exists(source):
+            if name in VENDOR:
+                print(f"skipped {name} (not vendored yet, pages use the CDN; run `python assets.py vendor`)")
+            else:
+                print(f"skipped {name} (missing)")
+            continue
+
+        with open(source, "rb") as f:
+            data = _minify(name, f.read())
+
+        base, ext = os.path.splitext(name)
+        if base.endswith(".min"):
+            base, ext = base[:-4], ".min" + ext
+        hashed = f"{base}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+
+        target = os.path.join(DIST_DIR, hashed)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "wb") as f:
+            f.write(data)
+        with open(target + ".gz", "wb") as f:
+            # mtime=0 keeps the .gz byte-identical across builds
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(target + ".br", "wb") as f:
+                f.write(brotli.compress(data, quality=11))
+
+        manifest[name] = hashed
+        print(f"{name} -> dist/{hashed} ({len(data)} bytes)")
+
+    with open(MANIFEST_PATH, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def vendor():
+    """
+    Download the pinned third-party scripts into static/ (commit them afterwards).
+    """
+    for name, (url, banner) in VENDOR.items():
+        target = os.path.join(STATIC_DIR, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with urllib.request.urlopen(url, timeout=30) as response:
+            data = response.read()
+        if banner.encode("utf-8") not in data[:200]:
+            raise MissingVendorFile(f"{url} is not {banner}")
+        with open(target, "wb") as f:
+            f.write(data)
+        print(f"{url} -> static/{name} ({len(data)} bytes)")
+
+
+# ==================== Lookup ====================
+
+def _load_manifest():
+    """
+    Manifest from the last build, re-read when the file changes (e.g. a deploy ran build).
+    """
+    global _manifest, _manifest_mtime
+    try:
+        mtime = os.path.getmtime(MANIFEST_PATH)
+    except OSError:
+        _manifest, _manifest_mtime = {}, None
+        return _manifest
+
+    if mtime != _manifest_mtime:
+        with open(MANIFEST_PATH) as f:
+            _manifest = json.load(f)
+        _manifest_mtime = mtime
+    return _manifest
+
+
+def asset_url(name):
+    """
+    URL for a static asset: the fingerprinted build output if there is one,
+    the plain file otherwise, and the pinned CDN copy for vendored files not committed yet.
+    """
+    hashed = _load_manifest().get(name)
+    if hashed:
+        return url_for("static", filename="dist/" + hashed)
+    if name in VENDOR and not os.path.exists(os.path.join(STATIC_DIR, name)):
+        if name not in _missing_reported:
+            _missing_reported.add(name)
+            log.warning("static/%s is missing, serving it from the CDN; run `python assets.py vendor`", name)
+        return VENDOR[name][0]
+    return url_for("static", filename=name)
+
+
+def compressed_variant(filename, accept_encoding):
+    """
+    Pick the best pre-compressed copy of a dist file the client accepts.
+    Returns (filename_to_send, content_encoding) - encoding is None for the plain file.
+    """
+    accept_encoding = accept_encoding or ""
+    for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if encoding in accept_encoding and os.path.exists(os.path.join(DIST_DIR, filename + suffix)):
+            return filename + suffix, encoding
+    return filename, None
+
+
+if __name__ == "__main__":
+    import sys
+
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "build":
+        build()
+    elif command == "vendor":
+        try:
+            vendor()
+        except MissingVendorFile as e:
+            sys.exit(f"vendor failed: {e}")
+    else:
+        print("Usage: python assets.py vendor|build")
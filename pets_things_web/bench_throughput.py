@@ -0,0 +1,134 @@
+"""
+Throughput benchmark for the production server.
+
+Starts gunicorn (gunicorn.conf.py) with 1, 2, 4 ... workers up to the number of
+CPU cores, drives it with several client processes for a few seconds each and
+prints requests/second and latency per configuration.
+
+    python bench_throughput.py                  # /login, 10s per run
+    python bench_throughput.py --path /products --seconds 20 --threads 4
+
+/login needs no database, so it measures the web tier alone; point --path at a
+catalog page to include MySQL.
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def _client(port, path, seconds, result_queue):
+    """
+    One load-generator process: sequential keep-alive requests until time is up.
+    """
+    latencies = []
+    errors = 0
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        started = time.perf_counter()
+        try:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 500:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - started)
+    conn.close()
+    result_queue.put((latencies, errors))
+
+
+def run(workers, threads, clients, path, seconds, port):
+    env = dict(os.environ, WEB_WORKERS=str(workers), WEB_THREADS=str(threads),
+               WEB_BIND=f"127.0.0.1:{port}")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--access-logfile", "/dev/null"],
+        cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        if not _wait_for_port(port):
+            raise RuntimeError("gunicorn did not start")
+        # let every worker finish booting
+        time.sleep(1 + workers * 0.2)
+
+        result_queue = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=_client, args=(port, path, seconds, result_queue))
+                 for _ in range(clients)]
+        for p in procs:
+            p.start()
+        results = [result_queue.get() for _ in procs]
+        for p in procs:
+            p.join()
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+    latencies = sorted(l for lat, _ in results for l in lat)
+    errors = sum(e for _, e in results)
+    if not latencies:
+        return {"workers": workers, "rps": 0.0, "p50": 0.0, "p99": 0.0, "errors": errors}
+    return {
+        "workers": workers,
+        "rps": len(latencies) / seconds,
+        "p50": statistics.median(latencies) * 1000,
+        "p99": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "errors": errors
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default="/login")
+    parser.add_argument("--seconds", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=1, help="threads per worker")
+    parser.add_argument("--clients", type=int, default=None, help="load processes (default: 2 x cores)")
+    parser.add_argument("--max-workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--port", type=int, default=8099)
+    args = parser.parse_args()
+
+    counts = []
+    n = 1
+    while n < args.max_workers:
+        counts.append(n)
+        n *= 2
+    counts.append(args.max_workers)
+
+    clients = args.clients or max(2, multiprocessing.cpu_count() * 2)
+    print(f"GET {args.path}  {args.seconds}s per run  {clients} clients  "
+          f"{args.threads} thread(s)/worker  {multiprocessing.cpu_count()} core(s)")
+    print(f"{'workers':>8} {'req/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7} {'scaling':>8}")
+
+    base = None
+    for workers in counts:
+        r = run(workers, args.threads, clients, args.path, args.seconds, args.port)
+        base = base or r["rps"] or None
+        scaling = f"{r['rps'] / base:.2f}x" if base else "-"
+        print(f"{r['workers']:>8} {r['rps']:>10.1f} {r['p50']:>9.1f} {r['p99']:>9.1f} {r['errors']:>7} {scaling:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+# Draft sale carts live in a small local SQLite file (not MySQL), keyed by cart id.
+# Scanning items only touches this file; sale_complete writes the final sale to MySQL.
+CART_STORE_PATH = os.getenv(
+    "CART_STORE_PATH",
+    os.path.join(os.path.dirname(__file__), "data", "carts.sqlite3")
+)
+CART_TTL_SECONDS = int(os.getenv("CART_TTL_SECONDS", 12 * 60 * 60))
+CART_PURGE_INTERVAL = int(os.getenv("CART_PURGE_INTERVAL", 10 * 60))
+
+_local = threading.local()
+_last_purge = 0.0
+
+
+def _store():
+    """
+    Return this thread's connection to the cart store, opening it on first use.
+    Connections are re-opened after a fork so workers never share a handle.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None and getattr(_local, "pid", None) == os.getpid():
+        return conn
+
+    os.makedirs(os.path.dirname(CART_STORE_PATH), exist_ok=True)
+    conn = sqlite3.connect(CART_STORE_PATH, timeout=5, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS cart (
+            cart_id TEXT PRIMARY KEY,
+            owner_id INTEGER NOT NULL,
+            data TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    """)
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
+
+
+def _load(conn, cart_id, owner_id):
+    row = conn.execute(
+        "SELECT data, updated_at FROM cart WHERE cart_id = ? AND owner_id = ?",
+        (cart_id, owner_id)
+    ).fetchone()
+    if not row:
+        return None
+    if row[1] < time.time() - CART_TTL_SECONDS:
+        conn.execute("DELETE FROM cart WHERE cart_id = ?", (cart_id,))
+        return None
+    return json.loads(row[0])
+
+
+def _save(conn, cart_id, owner_id, cart):
+    conn.execute(
+        "INSERT OR REPLACE INTO cart (cart_id, owner_id, data, updated_at) VALUES (?, ?, ?, ?)",
+        (cart_id, owner_id, json.dumps(cart), time.time())
+    )
+
+
+def _update(cart_id, owner_id, change):
+    """
+    Apply change(cart) to a stored cart inside one write transaction.
+    Returns the updated cart, or None if the cart does not exist.
+    """
+    conn = _store()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        cart = _load(conn, cart_id, owner_id)
+        if cart is not None:
+            change(cart)
+            _save(conn, cart_id, owner_id, cart)
+        conn.execute("COMMIT")
+        return cart
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def create_cart(owner_id, branch_id, branch_name, customer_id=None, customer_name=None):
+    """
+    Start a new draft cart for the given employee and return its id.
+    """
+    cart_id = uuid.uuid4().hex
+    cart = {
+        "cart_id": cart_id,
+        "branch_id": branch_id,
+        "branch_name": branch_name,
+        "customer_id": customer_id,
+        "customer_name": customer_name,
+        "employee_id": owner_id,
+        "created_at": time.time(),
+        "lines": []
+    }
+    _save(_store(), cart_id, owner_id, cart)
+    _purge_if_due()
+    return cart_id
+
+
+def get_cart(cart_id, owner_id):
+    """
+    Return the cart dict, or None if it does not exist, expired or belongs to someone else.
+    """
+    return _load(_store(), cart_id, owner_id)
+
+
+def add_item(cart_id, owner_id, product_id, product_name, unit_price, quantity):
+    """
+    Add quantity of a product to the cart, merging with an existing line.
+    The unit price is refreshed to the latest value, like the old sale_line update.
+    """
+    def change(cart):
+        for line in cart["lines"]:
+            if line["product_id"] == product_id:
+                line["quantity"] += quantity
+                line["unit_price"] = unit_price
+                line["product_name"] = product_name
+                return
+        cart["lines"].append({
+            "product_id": product_id,
+            "product_name": product_name,
+            "unit_price": unit_price,
+            "quantity": quantity
+        })
+
+    return _update(cart_id, owner_id, change)
+
+
+def set_quantity(cart_id, owner_id, product_id, quantity):
+    """
+    Set the quantity of a cart line. A quantity of 0 or less removes the line.
+    """
+    def change(cart):
+        if quantity <= 0:
+            cart["lines"] = [l for l in cart["lines"] if l["product_id"] != product_id]
+            return
+        for line in cart["lines"]:
+            if line["product_id"] == product_id:
+                line["quantity"] = quantity
+
+    return _update(cart_id, owner_id, change)
+
+
+def remove_item(cart_id, owner_id, product_id):
+    """
+    Remove a product line from the cart.
+    """
+    return set_quantity(cart_id, owner_id, product_id, 0)
+
+
+def discard_cart(cart_id):
+    """
+    Delete a cart (after completion or when the cashier abandons it).
+    """
+    _store().execute("DELETE FROM cart WHERE cart_id = ?", (cart_id,))
+
+
+def purge_expired():
+    """
+    Delete carts that have not been touched within CART_TTL_SECONDS.
+    Returns the number of carts removed.
+    """
+    cur = _store().execute(
+        "DELETE FROM cart WHERE updated_at < ?",
+        (time.time() - CART_TTL_SECONDS,)
+    )
+    return cur.rowcount
+
+
+def _purge_if_due():
+    """
+    Run purge_expired at most once per CART_PURGE_INTERVAL in this process, so
+    abandoned drafts are cleaned up as new carts are started.
+    """
+    global _last_purge
+    now = time.time()
+    if now - _last_purge < CART_PURGE_INTERVAL:
+        return
+    _last_purge = now
+    purge_expired()
+
+
+def cart_lines(cart):
+    """
+    Return the cart lines with line_total filled in, plus the cart total.
+    """
+    lines = []
+    total = 0.0
+    for line in cart["lines"]:
+        line_total = round(line["unit_price"] * line["quantity"], 2)
+        lines.append(dict(line, line_total=line_total))
+        total += line_total
+    return lines, round(total, 2)
@@ -0,0 +1,80 @@
+# Versioned product catalog for POS terminals.
+# Every product write bumps one counter (catalog_version) and stamps the product row
+# with the new value. Terminals download the snapshot once, then ask only for
+# "changes since version V".
+
+
+def bump_version(cur):
+    """
+    Increment the catalog counter inside the caller's transaction and return the new version.
+    The UPDATE locks the counter row, so the following SELECT sees our own increment.
+    """
+    cur.execute("UPDATE catalog_version SET version = version + 1 WHERE id = 1")
+    cur.execute("SELECT version FROM catalog_version WHERE id = 1")
+    row = cur.fetchone()
+    return row["version"] if isinstance(row, dict) else row[0]
+
+
+def current_version(cur):
+    cur.execute("SELECT version FROM catalog_version WHERE id = 1")
+    row = cur.fetchone()
+    if not row:
+        return 0
+    return row["version"] if isinstance(row, dict) else row[0]
+
+
+def _product_json(row):
+    return {
+        "product_id": row["product_id"],
+        "product_name": row["product_name"],
+        "unit_price": float(row["unit_price"])
+    }
+
+
+def snapshot(cur):
+    """
+    Full list of active products plus the version it is valid for.
+    The version is read first: a write that lands in between is simply sent
+    again by the next delta, which terminals apply idempotently.
+    """
+    version = current_version(cur)
+    cur.execute("""
+        SELECT product_id, product_name, unit_price
+        FROM product
+        WHERE is_active = 1
+        ORDER BY product_name
+    """)
+    return {
+        "version": version,
+        "products": [_product_json(r) for r in cur.fetchall()]
+    }
+
+
+def changes_since(cur, since):
+    """
+    Products changed after version `since`.
+    Active products come back in "upserts"; deactivated and deleted ones in "removed".
+    """
+    version = current_version(cur)
+    if since >= version:
+        return {"version": version, "upserts": [], "removed": []}
+
+    cur.execute("""
+        SELECT product_id, product_name, unit_price, is_active
+        FROM product
+        WHERE catalog_version > %s
+    """, (since,))
+    rows = cur.fetchall()
+
+    cur.execute("""
+        SELECT product_id
+        FROM catalog_tombstone
+        WHERE catalog_version > %s
+    """, (since,))
+    deleted = [r["product_id"] for r in cur.fetchall()]
+
+    return {
+        "version": version,
+        "upserts": [_product_json(r) for r in rows if r["is_active"]],
+        "removed": [r["product_id"] for r in rows if not r["is_active"]] + deleted
+    }
@@ -0,0 +1,365 @@
+"""
+Bulk product catalog import.
+
+Reads a CSV file (with a header row) or a JSONL file, one product per row:
+
+    sku, product_name, category, unit_price [, description, is_active, image]
+
+("name", "price" and "category_name" are accepted as column names too.) The SKU
+identifies the product: a known SKU updates it, a new one creates it. Missing
+categories are created. New products get a stock row in every warehouse and
+branch. `image` is a file name inside --images; pictures are copied and resized in
+the background after the rows are in.
+
+Every row is validated before anything is written. Invalid rows are reported
+with their line number and skipped.
+
+    python catalog_import.py supplier_catalog.csv --images ./pictures
+    python catalog_import.py supplier_catalog.jsonl --dry-run
+
+The same import is available to staff under Products -> Import.
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+
+import catalog
+import db
+import image_pipeline
+
+log = logging.getLogger(__name__)
+
+CATALOG_IMPORT_BATCH_SIZE = int(os.getenv("CATALOG_IMPORT_BATCH_SIZE", 1000))
+# Server-side folder the web import may take pictures from (empty = no pictures)
+CATALOG_IMPORT_IMAGE_DIR = os.getenv("CATALOG_IMPORT_IMAGE_DIR", "")
+IMAGE_CHUNK_SIZE = 200
+
+ALIASES = {"name": "product_name", "price": "unit_price", "category_name": "category"}
+IMAGE_EXTENSIONS = {"png", "jpg", "jpeg", "webp"}
+TRUE = {"1", "true", "yes", "y", "active"}
+FALSE = {"0", "false", "no", "n", "inactive"}
+MAX_PRICE = Decimal("99999999.99")
+
+
+def _in_clause(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def read_rows(stream, fmt):
+    """
+    Yield (line number, {column: value}) from a text stream in "csv" or "jsonl" format.
+    """
+    if fmt == "jsonl":
+        for number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield number, row if isinstance(row, dict) else None
+    else:
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+
+
+def detect_format(filename):
+    return "jsonl" if filename.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+
+def _text(row, key):
+    value = row.get(key)
+    return "" if value is None else str(value).strip()
+
+
+def validate(rows, image_dir=None):
+    """
+    Check every row. Returns (products, errors, warnings): products are clean dicts,
+    errors and warnings are (line, message) pairs. A row with an error is skipped.
+    """
+    image_root = os.path.realpath(image_dir) if image_dir else None
+    products, errors, warnings = [], [], []
+    seen = {}
+
+    for number, raw in rows:
+        if raw is None:
+            errors.append((number, "not a JSON object"))
+            continue
+        row = {ALIASES.get(k.strip().lower(), k.strip().lower()): v for k, v in raw.items() if k}
+        problems = []
+
+        sku = _text(row, "sku")
+        name = _text(row, "product_name")
+        category = _text(row, "category")
+        if not sku:
+            problems.append("sku is missing")
+        elif len(sku) > 64:
+            problems.append("sku is longer than 64 characters")
+        elif sku.lower() in seen:
+            problems.append(f"sku {sku} already on line {seen[sku.lower()]}")
+        if not name:
+            problems.append("product_name is missing")
+        elif len(name) > 120:
+            problems.append("product_name is longer than 120 characters")
+        if not category:
+            problems.append("category is missing")
+        elif len(category) > 80:
+            problems.append("category is longer than 80 characters")
+
+        price = None
+        try:
+            price = Decimal(_text(row, "unit_price"))
+            if not price.is_finite() or price < 0 or price > MAX_PRICE:
+                raise InvalidOperation
+        except InvalidOperation:
+            problems.append(f"unit_price {_text(row, 'unit_price')!r} is not a valid price")
+
+        # Description only overwrites the stored one when the file has the column
+        description = row.get("description")
+        if description is not None:
+            description = str(description).strip()
+            if len(description) > 255:
+                problems.append("description is longer than 255 characters")
+
+        active = _text(row, "is_active").lower()
+        if active and active not in TRUE | FALSE:
+            problems.append(f"is_active {active!r} is not yes/no")
+
+        image = _text(row, "image")
+        image_path = None
+        if image:
+            if not image_root:
+                warnings.append((number, "image ignored: no image folder given"))
+            else:
+                image_path = os.path.realpath(os.path.join(image_root, image))
+                extension = image.rsplit(".", 1)[-1].lower() if "." in image else ""
+                if not image_path.startswith(image_root + os.sep) or extension not in IMAGE_EXTENSIONS:
+                    problems.append(f"image {image!r} is not a png/jpg/jpeg/webp file in the image folder")
+                elif not os.path.isfile(image_path):
+                    problems.append(f"image {image!r} not found")
+
+        if problems:
+            errors.extend((number, p) for p in problems)
+            continue
+        if sku:
+            seen[sku.lower()] = number
+        products.append({
+            "line": number,
+            "sku": sku,
+            "product_name": name,
+            "category": category,
+            "unit_price": price.quantize(Decimal("0.01")),
+            "description": description,
+            "is_active": 0 if active in FALSE else 1,
+            "image": image_path,
+        })
+    return products, errors, warnings
+
+
+def _category_ids(cur, names):
+    """
+    {lower-case name: category_id}, creating the missing categories with one multi-row insert.
+    """
+    unique = list({n.lower(): n for n in names}.values())
+    ids = {}
+    for i in range(0, len(unique), CATALOG_IMPORT_BATCH_SIZE):
+        chunk = unique[i:i + CATALOG_IMPORT_BATCH_SIZE]
+        cur.execute(f"""
+            INSERT IGNORE INTO category (category_name)
+            VALUES {", ".join(["(%s)"] * len(chunk))}
+        """, chunk)
+        cur.execute(f"""
+            SELECT category_id, category_name FROM category WHERE category_name IN ({_in_clause(chunk)})
+        """, chunk)
+        ids.update({name.lower(): category_id for category_id, name in cur.fetchall()})
+    return ids
+
+
+def import_products(conn, products, batch_size=None, progress=print):
+    """
+    Upsert validated products, one transaction per batch:
+    one multi-row upsert for the products and one set-based insert per stock table.
+    Returns counts: created, updated, categories, stock_rows, images (queued for background work).
+    """
+    batch_size = batch_size or CATALOG_IMPORT_BATCH_SIZE
+    stats = {"created": 0, "updated": 0, "categories": 0, "stock_rows": 0, "images": []}
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT COUNT(*) FROM category")
+        categories_before = cur.fetchone()[0]
+        category_ids = _category_ids(cur, [p["category"] for p in products])
+        conn.commit()
+        cur.execute("SELECT COUNT(*) FROM category")
+        stats["categories"] = cur.fetchone()[0] - categories_before
+
+        for start in range(0, len(products), batch_size):
+            batch = products[start:start + batch_size]
+            skus = [p["sku"] for p in batch]
+            try:
+                cur.execute(f"SELECT COUNT(*) FROM product WHERE sku IN ({_in_clause(skus)})", skus)
+                existing = cur.fetchone()[0]
+
+                # Every product of the batch gets the same catalog version: POS terminals
+                # pick the batch up in their next delta, and it marks the rows for the stock insert
+                version = catalog.bump_version(cur)
+                params = []
+                for p in batch:
+                    params.extend((p["sku"], p["product_name"], category_ids[p["category"].lower()],
+                                   p["unit_price"], p["description"], p["is_active"], version))
+                cur.execute(f"""
+                    INSERT INTO product
+                        (sku, product_name, category_id, unit_price, description, is_active, catalog_version)
+                    VALUES {", ".join(["(%s, %s, %s, %s, %s, %s, %s)"] * len(batch))}
+                    ON DUPLICATE KEY UPDATE
+                        product_name = VALUES(product_name),
+                        category_id = VALUES(category_id),
+                        unit_price = VALUES(unit_price),
+                        description = COALESCE(VALUES(description), description),
+                        is_active = VALUES(is_active),
+                        catalog_version = VALUES(catalog_version)
+                """, params)
+
+                # Stock rows for every location, same defaults as a product added by hand
+                cur.execute("""
+                    INSERT IGNORE INTO warehouse_stock (warehouse_id, product_id, on_hand_qty, min_qty, last_purchase_date)
+                    SELECT w.warehouse_id, p.product_id, 0, 10, NULL
+                    FROM product p
+                    CROSS JOIN warehouse w
+                    WHERE p.catalog_version = %s
+                """, (version,))
+                stock_rows = cur.rowcount
+                cur.execute("""
+                    INSERT IGNORE INTO branch_stock (branch_id, product_id, on_hand_qty, min_qty, last_restock_date)
+                    SELECT b.branch_id, p.product_id, 0, 5, NULL
+                    FROM product p
+                    CROSS JOIN branch b
+                    WHERE p.catalog_version = %s
+                """, (version,))
+                stock_rows += cur.rowcount
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+            stats["created"] += len(batch) - existing
+            stats["updated"] += existing
+            stats["stock_rows"] += stock_rows
+            stats["images"].extend((p["sku"], p["image"]) for p in batch if p["image"])
+            progress(f"{start + len(batch)}/{len(products)} product(s) imported")
+    finally:
+        cur.close()
+    return stats
+
+
+def _attach_images(get_connection, items):
+    """
+    Worker job: store a chunk of (sku, local file) pictures, resize them and set
+    product_image in one statement. Pictures replaced by the import are released.
+    """
+    stored, resized = [], set()
+    for sku, source in items:
+        try:
+            path = image_pipeline.store_file(source)
+        except OSError as e:
+            log.warning("Catalog import: image %s for %s skipped: %s", source, sku, e)
+            continue
+        if image_pipeline.Image is not None and path not in resized:
+            resized.add(path)
+            try:
+                image_pipeline.make_derivatives(path)
+            except Exception as e:
+                # The original is still shown until derivatives exist
+                log.warning("Catalog import: resizing %s failed: %s", source, e)
+        stored.append((image_pipeline.relative_path(path), sku))
+    if not stored:
+        return 0
+
+    conn = get_connection()
+    if not conn:
+        log.error("Catalog import: database unavailable, %d image(s) not attached", len(stored))
+        return 0
+    cur = conn.cursor()
+    try:
+        skus = [sku for _, sku in stored]
+        cur.execute(f"SELECT product_image FROM product WHERE sku IN ({_in_clause(skus)})", skus)
+        previous = {row[0] for row in cur.fetchall() if row[0]}
+        cur.executemany("UPDATE product SET product_image = %s WHERE sku = %s", stored)
+        conn.commit()
+        for old in previous - {path for path, _ in stored}:
+            image_pipeline.release_image(cur, old)
+        return len(stored)
+    except Exception as e:
+        conn.rollback()
+        log.error("Catalog import: attaching images failed: %s", e)
+        return 0
+    finally:
+        cur.close()
+        conn.close()
+
+
+def queue_images(items, get_connection=db.get_connection):
+    """
+    Hand the pictures to the image worker pool in chunks. Returns the futures.
+    """
+    return [image_pipeline.submit(_attach_images, get_connection, items[i:i + IMAGE_CHUNK_SIZE])
+            for i in range(0, len(items), IMAGE_CHUNK_SIZE)]
+
+
+def run(stream, fmt, conn, image_dir=None, dry_run=False, progress=print):
+    """
+    Validate and import one file. Returns (stats or None, errors, warnings, futures).
+    """
+    products, errors, warnings = validate(read_rows(stream, fmt), image_dir)
+    if dry_run or not products:
+        return None, errors, warnings, []
+    stats = import_products(conn, products, progress=progress)
+    futures = queue_images(stats["images"])
+    return stats, errors, warnings, futures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file", help="catalog file (.csv or .jsonl)")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="default: from the file extension")
+    parser.add_argument("--images", help="folder the image column refers to")
+    parser.add_argument("--dry-run", action="store_true", help="only validate")
+    args = parser.parse_args(argv)
+    logging.basicConfig(format="%(levelname)s %(message)s")
+
+    conn = None
+    if not args.dry_run:
+        conn = db.get_connection()
+        if not conn:
+            print("Database connection failed.")
+            return 1
+
+    started = time.time()
+    try:
+        with open(args.file, encoding="utf-8-sig", newline="") as f:
+            stats, errors, warnings, futures = run(f, args.format or detect_format(args.file), conn,
+                                                   args.images, args.dry_run)
+    finally:
+        if conn:
+            conn.close()
+
+    for line, message in errors + warnings:
+        print(f"line {line}: {message}")
+    if stats:
+        print(f"{stats['created']} created, {stats['updated']} updated, {stats['categories']} new categories, "
+              f"{stats['stock_rows']} stock rows in {time.time() - started:.1f}s")
+    if futures:
+        print(f"Processing {len(stats['images'])} image(s)...")
+        attached = sum(f.result() for f in futures)
+        print(f"{attached} image(s) attached")
+    print(f"{len(errors)} error(s), {len(warnings)} warning(s)")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+import gzip
+import os
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional: without it responses are gzip-compressed only
+    brotli = None
+
+# Transparent compression for HTML and JSON responses.
+# Buffered responses are compressed when they are at least COMPRESS_MIN_SIZE bytes;
+# streamed ones are always compressed chunk by chunk, flushing after each chunk
+# so the browser can start rendering before the page is complete.
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", 6))
+COMPRESS_MIMETYPES = {"text/html", "application/json"}
+
+
+def _encoding():
+    offered = ["br", "gzip"] if brotli is not None else ["gzip"]
+    return request.accept_encodings.best_match(offered)
+
+
+def _compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=COMPRESS_LEVEL)
+    return gzip.compress(data, compresslevel=COMPRESS_LEVEL)
+
+
+def _compress_stream(chunks, encoding):
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=COMPRESS_LEVEL)
+        process, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        process = compressor.compress
+        flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+        finish = compressor.flush
+
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            data = process(chunk) + flush()
+            if data:
+                yield data
+        yield finish()
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+
+def compress_response(response):
+    """
+    after_request hook: compress the body if the client accepts it and it is worth it.
+    """
+    if (request.method == "HEAD"
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or response.mimetype not in COMPRESS_MIMETYPES
+            or response.direct_passthrough
+            or "Content-Encoding" in response.headers):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = _encoding()
+    if not encoding:
+        return response
+
+    if response.is_streamed:
+        response.response = _compress_stream(response.response, encoding)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+        response.set_data(_compress(data, encoding))
+
+    response.headers["Content-Encoding"] = encoding
+    # The compressed bytes differ from the original, so a strong ETag no longer fits
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
@@ -1,32 +1,538 @@
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, pooling
+import contextvars
+import logging
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+import sqlite_backend
 
 # Load environment variables
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
 
+log = logging.getLogger(__name__)
+
+
+# "mysql" (default) or "sqlite": an embedded database file (SQLITE_PATH), no server
+# needed - for tests, benchmarks and single-branch shops. See sqlite_backend.py.
+DB_BACKEND = os.getenv("DB_BACKEND", "mysql").lower()
+
+# Per-process connection pool. Size it to at least 2x the threads of a worker
+# (a streamed page holds one connection while context processors open another).
+# 0 disables pooling: every get_connection() opens a new connection.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 0))
+
+# Optional read replica for reports and listings. Any DB_READ_* setting enables it;
+# the ones left out default to the primary's (so a read-only user on the same
+# server is enough to try it locally).
+DB_READ_ENABLED = any(os.getenv(k) for k in ("DB_READ_HOST", "DB_READ_PORT", "DB_READ_USER"))
+# Fall back to the primary when the replica is further behind than this (seconds)
+DB_READ_MAX_LAG = float(os.getenv("DB_READ_MAX_LAG", 5))
+# How often each process re-checks the replica's lag (seconds)
+DB_READ_LAG_CHECK_INTERVAL = float(os.getenv("DB_READ_LAG_CHECK_INTERVAL", 10))
+# After a user's own write, read from the primary for at least this long (seconds)
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", 5))
+
+# Seconds to wait for the server when opening a connection
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", 5))
+# Circuit breaker: open after this many connection failures in a row, then probe
+# the server in the background every DB_BREAKER_PROBE_INTERVAL seconds
+DB_BREAKER_THRESHOLD = int(os.getenv("DB_BREAKER_THRESHOLD", 3))
+DB_BREAKER_PROBE_INTERVAL = float(os.getenv("DB_BREAKER_PROBE_INTERVAL", 5))
+
+_pools = {}
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+_replica_lag = None
+_replica_lag_checked_at = 0.0
+
+
+def _connect_args(target="primary"):
+    args = dict(
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=int(os.getenv('DB_PORT', 3306)),
+        user=os.getenv('DB_USER'),
+        password=os.getenv('DB_PASSWORD'),
+        database=os.getenv('DB_NAME'),
+        connection_timeout=DB_CONNECT_TIMEOUT
+    )
+    if target == "replica":
+        args.update(
+            host=os.getenv('DB_READ_HOST', args["host"]),
+            port=int(os.getenv('DB_READ_PORT', args["port"])),
+            user=os.getenv('DB_READ_USER', args["user"]),
+            password=os.getenv('DB_READ_PASSWORD', args["password"]),
+            database=os.getenv('DB_READ_NAME', args["database"])
+        )
+    return args
+
+
+def _get_pool(target="primary"):
+    """
+    This process's pool for `target`, created on first use. Pools inherited through
+    fork() share sockets with the parent, so they are replaced when the pid changes.
+    """
+    global _pools, _pool_pid
+    with _pool_lock:
+        if _pool_pid != os.getpid():
+            _pools = {}
+            _pool_pid = os.getpid()
+        pool = _pools.get(target)
+        if pool is None:
+            pool = _pools[target] = pooling.MySQLConnectionPool(
+                pool_name=f"pets_things_{target}_{os.getpid()}",
+                pool_size=min(DB_POOL_SIZE, pooling.CNX_POOL_MAXSIZE),
+                **_connect_args(target)
+            )
+        return pool
+
+
+def reset_pool():
+    """
+    Forget the current pools (e.g. in a freshly forked worker). Connections are
+    not closed: after a fork they still belong to the parent process.
+    """
+    global _pools, _pool_pid, _replica_lag, _replica_lag_checked_at
+    with _pool_lock:
+        _pools = {}
+        _pool_pid = None
+        _replica_lag = None
+        _replica_lag_checked_at = 0.0
+    for breaker in _breakers.values():
+        breaker.reset()
+
+
+# ==================== Statement tracing ====================
+
+_statement_listeners = []
+
+# Direct (non-pooled) connections opened, failed connection attempts, and requests
+# served by a one-off connection because the pool was empty. Every thread counts
+# into its own dict (no lock on the hot path); pool_stats() sums them.
+CONNECTION_EVENTS = ("opened", "failed", "pool_exhausted")
+_count_local = threading.local()
+_count_shards = []
+_count_shards_lock = threading.Lock()
+
+
+def _count(event):
+    counts = getattr(_count_local, "counts", None)
+    if counts is None:
+        counts = _count_local.counts = dict.fromkeys(CONNECTION_EVENTS, 0)
+        with _count_shards_lock:
+            _count_shards.append(counts)
+    counts[event] += 1
+
+
+def _connection_counts():
+    with _count_shards_lock:
+        shards = list(_count_shards)
+    return {event: sum(shard[event] for shard in shards) for event in CONNECTION_EVENTS}
+
+
+def add_statement_listener(listener):
+    """
+    Call listener(sql, params, seconds, error) after every statement run on a connection
+    from this module (COMMIT and ROLLBACK included). Listeners must be cheap and not raise.
+    """
+    _statement_listeners.append(listener)
+
+
+def _notify(sql, params, seconds, error):
+    for listener in _statement_listeners:
+        listener(sql, params, seconds, error)
+
+
+class _TracedCursor:
+    __slots__ = ("_cursor",)
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        started = time.perf_counter()
+        error = None
+        try:
+            return self._cursor.execute(operation, params, *args, **kwargs)
+        except Error as e:
+            error = e
+            raise
+        finally:
+            _notify(operation, params, time.perf_counter() - started, error)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        started = time.perf_counter()
+        error = None
+        try:
+            return self._cursor.executemany(operation, seq_params, *args, **kwargs)
+        except Error as e:
+            error = e
+            raise
+        finally:
+            _notify(operation, None, time.perf_counter() - started, error)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _TracedConnection:
+    """
+    Thin proxy that reports statements to the listeners; everything else is forwarded.
+    """
+    __slots__ = ("_conn",)
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        return _TracedCursor(self._conn.cursor(*args, **kwargs))
+
+    def _end(self, statement, method):
+        started = time.perf_counter()
+        error = None
+        try:
+            return method()
+        except Error as e:
+            error = e
+            raise
+        finally:
+            _notify(statement, None, time.perf_counter() - started, error)
+
+    def commit(self):
+        return self._end("COMMIT", self._conn.commit)
+
+    def rollback(self):
+        return self._end("ROLLBACK", self._conn.rollback)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def _traced(conn):
+    return _TracedConnection(conn) if conn is not None and _statement_listeners else conn
+
+
+def pool_stats():
+    """
+    Size and idle connections of this process's pools, plus connection counters.
+    """
+    with _pool_lock:
+        pools = dict(_pools) if _pool_pid == os.getpid() else {}
+    data = {"connections": _connection_counts(), "pools": {}}
+    for target, pool in pools.items():
+        data["pools"][target] = {"size": pool.pool_size, "idle": pool._cnx_queue.qsize()}
+    return data
+
+
+# ==================== Circuit breaker ====================
+
+class CircuitOpenError(Error):
+    """
+    Raised instead of connecting while the breaker for a database is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Fail fast while a database is unreachable. Closed: connections are attempted and
+    failures counted. Open (after DB_BREAKER_THRESHOLD failures in a row): callers are
+    refused at once and a background thread probes the server until it answers, then
+    the breaker closes again. Requests never wait for a probe.
+    """
+
+    def __init__(self, target):
+        self.target = target
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.state = "closed"
+        self.failures = 0
+        self.trips = 0
+        self.rejected = 0
+        self.opened_at = None
+        self.last_error = None
+        self.last_probe_at = None
+        self._prober_pid = None
+
+    def allow(self):
+        if self.state == "closed":
+            return True
+        with self._lock:
+            self.rejected += 1
+            self._ensure_prober()
+        return False
+
+    def success(self):
+        if self.failures:
+            with self._lock:
+                self.failures = 0
+
+    def failure(self, error):
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error)
+            if self.state == "closed" and self.failures >= DB_BREAKER_THRESHOLD:
+                self.state = "open"
+                self.opened_at = time.time()
+                self.trips += 1
+                log.warning("Database circuit breaker opened for %s after %d failed connections: %s",
+                            self.target, self.failures, error)
+                self._ensure_prober()
+
+    def _ensure_prober(self):
+        # Called with the lock held. A prober started before a fork is not running here.
+        if self._prober_pid != os.getpid():
+            self._prober_pid = os.getpid()
+            threading.Thread(target=self._probe, name=f"db-probe-{self.target}", daemon=True).start()
+
+    def _probe(self):
+        while self.state == "open":
+            time.sleep(DB_BREAKER_PROBE_INTERVAL)
+            self.last_probe_at = time.time()
+            try:
+                mysql.connector.connect(**_connect_args(self.target)).close()
+            except Error as e:
+                self.last_error = str(e)
+                continue
+            with self._lock:
+                log.info("Database circuit breaker closed for %s after %.0fs",
+                         self.target, time.time() - self.opened_at)
+                self.state = "closed"
+                self.failures = 0
+                self.opened_at = None
+                self._prober_pid = None
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "trips": self.trips,
+            "rejected": self.rejected,
+            "open_for_seconds": round(time.time() - self.opened_at, 1) if self.opened_at else None,
+            "last_probe_at": self.last_probe_at,
+            "last_error": self.last_error
+        }
+
+
+_breakers = {"primary": CircuitBreaker("primary"), "replica": CircuitBreaker("replica")}
+
+
+def database_available():
+    """
+    False while the primary's breaker is open (the database is known to be down).
+    """
+    return DB_BACKEND == "sqlite" or _breakers["primary"].state == "closed"
+
+
+def breaker_stats():
+    return {target: breaker.stats() for target, breaker in _breakers.items()}
+
+
+def _connect(target="primary"):
+    if DB_BACKEND == "sqlite":
+        # Opening a SQLite connection is cheap: no pool, and no replica to route to
+        return _traced(sqlite_backend.connect())
+
+    breaker = _breakers[target]
+    if not breaker.allow():
+        raise CircuitOpenError(msg=f"{target} database unavailable (circuit breaker open)")
+
+    try:
+        if DB_POOL_SIZE > 0:
+            try:
+                connection = _get_pool(target).get_connection()
+                breaker.success()
+                return _traced(connection)
+            except pooling.PoolError as e:
+                # Pool exhausted: serve this request with a one-off connection
+                _count("pool_exhausted")
+                log.warning("Connection pool exhausted, opening a direct connection: %s", e)
+
+        connection = mysql.connector.connect(**_connect_args(target))
+    except Error as e:
+        _count("failed")
+        breaker.failure(e)
+        raise
+    _count("opened")
+    breaker.success()
+    if connection.is_connected():
+        return _traced(connection)
+    return None
+
 
 def get_connection():
     """
     Establish and return a MySQL database connection using environment variables.
-    Returns None if connection fails.
+    With DB_POOL_SIZE set the connection comes from this process's pool, and
+    close() hands it back. Returns None if connection fails, immediately while
+    the circuit breaker is open.
     """
     try:
-        connection = mysql.connector.connect(
-            host=os.getenv('DB_HOST', 'localhost'),
-            port=int(os.getenv('DB_PORT', 3306)),
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD'),
-            database=os.getenv('DB_NAME')
-        )
-        
-        if connection.is_connected():
-            return connection
+        return _connect("primary")
+    except CircuitOpenError:
+        # Known outage: fail fast and quietly, the breaker already logged it
+        return None
     except Error as e:
-        print(f"Error connecting to MySQL: {e}")
+        log.error("Error connecting to MySQL: %s", e)
         return None
 
+
+def _check_replica_lag(conn):
+    """
+    Seconds the replica is behind the primary, or None if replication is stopped.
+    A server that is not a replica (or a user not allowed to ask) counts as 0.
+    """
+    cur = conn.cursor(dictionary=True)
+    try:
+        try:
+            cur.execute("SHOW REPLICA STATUS")
+        except Error:
+            # MySQL before 8.0.22
+            cur.execute("SHOW SLAVE STATUS")
+        status = cur.fetchone()
+    except Error as e:
+        log.warning("Replica lag check failed, assuming no lag: %s", e)
+        return 0.0
+    finally:
+        cur.close()
+
+    if not status:
+        return 0.0
+    lag = status.get("Seconds_Behind_Source", status.get("Seconds_Behind_Master"))
+    return None if lag is None else float(lag)
+
+
+def replica_lag():
+    """
+    Last measured replica lag in seconds (None: unknown or replication stopped).
+    """
+    return _replica_lag
+
+
+def _replica_usable(lag, last_write_at, now):
+    if lag is None or lag > DB_READ_MAX_LAG:
+        return False
+    # Read-your-writes: the replica may not have applied this user's write yet
+    return not (last_write_at and now - last_write_at <= max(READ_YOUR_WRITES_SECONDS, lag + 1))
+
+
+def get_read_connection(last_write_at=None):
+    """
+    Connection for read-only pages: the replica when one is configured, healthy and
+    caught up with the caller's last write (a time.time() value); otherwise the primary.
+    Returns None if no database can be reached.
+    """
+    global _replica_lag, _replica_lag_checked_at
+
+    if not DB_READ_ENABLED or DB_BACKEND == "sqlite":
+        return get_connection()
+
+    now = time.time()
+    lag_due = now - _replica_lag_checked_at >= DB_READ_LAG_CHECK_INTERVAL
+    if not lag_due and not _replica_usable(_replica_lag, last_write_at, now):
+        return get_connection()
+
+    try:
+        conn = _connect("replica")
+    except CircuitOpenError:
+        return get_connection()
+    except Error as e:
+        log.warning("Read replica unavailable, using the primary: %s", e)
+        return get_connection()
+    if not conn:
+        return get_connection()
+
+    if lag_due:
+        _replica_lag = _check_replica_lag(conn)
+        _replica_lag_checked_at = now
+        if not _replica_usable(_replica_lag, last_write_at, now):
+            conn.close()
+            return get_connection()
+
+    return conn
+
+
+# Threads used by run_concurrently(); each query borrows its own connection
+DB_FANOUT_WORKERS = int(os.getenv("DB_FANOUT_WORKERS", 8))
+
+_fanout = None
+_fanout_pid = None
+
+
+def _fanout_pool():
+    # An executor inherited through fork() has no threads left: start a new one
+    global _fanout, _fanout_pid
+    with _pool_lock:
+        if _fanout is None or _fanout_pid != os.getpid():
+            _fanout = ThreadPoolExecutor(max_workers=DB_FANOUT_WORKERS, thread_name_prefix="db-fanout")
+            _fanout_pid = os.getpid()
+        return _fanout
+
+
+def _run_query(connect, sql, params, fetch):
+    conn = connect()
+    if not conn:
+        raise Error(msg="DB connection failed")
+    try:
+        if hasattr(sql, "run"):
+            # a named queries.Query: timed, returns slot rows
+            return sql.run(conn, params or (), fetch)
+        cur = conn.cursor(dictionary=True)
+        try:
+            cur.execute(sql, params or None)
+            return cur.fetchone() if fetch == "one" else cur.fetchall()
+        finally:
+            cur.close()
+    finally:
+        conn.close()
+
+
+def run_concurrently(queries, connect=get_connection):
+    """
+    Run independent read queries at the same time, each on its own connection,
+    so a page waits for the slowest query instead of the sum of all of them.
+
+    queries maps a name to (sql, params) or (sql, params, "one"); sql may be a queries.Query.
+    connect() opens each connection (e.g. a read-replica connector).
+    Returns {name: rows} ({name: row} for "one"). The first failure is re-raised.
+    """
+    def unpack(spec):
+        sql, params = spec[0], spec[1]
+        fetch = spec[2] if len(spec) > 2 else "all"
+        return sql, params, fetch
+
+    if len(queries) <= 1 or DB_FANOUT_WORKERS <= 1:
+        return {name: _run_query(connect, *unpack(spec)) for name, spec in queries.items()}
+
+    executor = _fanout_pool()
+    # Each query runs in a copy of the caller's context, so per-request statement
+    # accounting (metrics) follows it into the worker thread
+    futures = {name: executor.submit(contextvars.copy_context().run, _run_query, connect, *unpack(spec))
+               for name, spec in queries.items()}
+    return {name: future.result() for name, future in futures.items()}
+
+
+def discard_connection(conn):
+    """
+    Close a connection that may still have unread rows (an abandoned streamed query).
+    A pooled connection is disconnected first, so the pool reconnects it on next use
+    instead of handing out a session with a half-read result.
+    """
+    raw = getattr(conn, "_cnx", None)
+    try:
+        if raw is not None:
+            raw.disconnect()
+        conn.close()
+    except Error:
+        pass
+
 def get_user_by_email(email):
     """
     Retrieve user by email using parameterized query to prevent SQL injection.
@@ -48,38 +554,33 @@ def get_user_by_email(email):
         user = cursor.fetchone()
         return user
     except Error as e:
-        print(f"Database error: {e}")
+        log.error("Database error: %s", e)
         return None
     finally:
         if conn.is_connected():
             cursor.close()
             conn.close()
 
-def create_user(full_name, email, password_hash, role='customer'):
+def create_user(full_name, email, password_hash, role='customer', phone=None):
     """
     Create a new user in the database.
     Returns True if successful, False otherwise.
     """
-    print("create_user called:", full_name, email, role)
-
     conn = get_connection()
     if not conn:
         return False
     
     try:
         cursor = conn.cursor()
-        cursor.execute("SELECT DATABASE() AS db")
-        print("Flask connected to DB:", cursor.fetchone())
-
         query = """
-            INSERT INTO users (full_name, email, password_hash, role, is_active)
-            VALUES (%s, %s, %s, %s, 1)
+            INSERT INTO users (full_name, email, password_hash, role, phone, is_active)
+            VALUES (%s, %s, %s, %s, %s, 1)
         """
-        cursor.execute(query, (full_name, email, password_hash, role))
+        cursor.execute(query, (full_name, email, password_hash, role, phone))
         conn.commit()
         return True
     except Error as e:
-        print(f"Database error: {e}")
+        log.error("Database error: %s", e)
         return False
     finally:
         if conn.is_connected():
@@ -102,7 +603,7 @@ def email_exists(email):
         count = cursor.fetchone()[0]
         return count > 0
     except Error as e:
-        print(f"Database error: {e}")
+        log.error("Database error: %s", e)
         return False
     finally:
         if conn.is_connected():
@@ -129,7 +630,7 @@ def get_today_sales_summary():
             "total": float(row["total_amount"] or 0)
         }
     except Exception as e:
-        print("today sales summary error:", e)
+        log.error("today sales summary error: %s", e)
         return {"count": 0, "total": 0.0}
     finally:
         try:
@@ -0,0 +1,328 @@
+import math
+import os
+import time
+from datetime import date, timedelta
+from statistics import NormalDist
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional: without it the reorder suggestions page is disabled
+    np = None
+
+# Demand forecasting and reorder suggestions.
+# Daily SALE movements of the last FORECAST_HISTORY_DAYS are loaded into flat NumPy
+# arrays (one entry per branch, product and day with sales), and every statistic is
+# computed for all branch/product series at once with bincount, no Python loop per
+# SKU:
+#   rate      blend of the recent (FORECAST_RECENT_DAYS) and long-run daily average
+#   season    day-of-week profile, shrunk towards flat for slow sellers
+#   safety    z(service level) x daily std dev x sqrt(lead + review days)
+# Branch series are then summed per product for the network (all branches and
+# warehouses, plus open draft purchases), and whatever the network will be short of
+# over lead + review time becomes a suggested purchase, grouped by each product's
+# last supplier.
+FORECAST_HISTORY_DAYS = int(os.getenv("FORECAST_HISTORY_DAYS", 182))
+FORECAST_RECENT_DAYS = int(os.getenv("FORECAST_RECENT_DAYS", 28))
+FORECAST_RECENT_WEIGHT = float(os.getenv("FORECAST_RECENT_WEIGHT", 0.6))
+FORECAST_LEAD_DAYS = int(os.getenv("FORECAST_LEAD_DAYS", 7))
+FORECAST_REVIEW_DAYS = int(os.getenv("FORECAST_REVIEW_DAYS", 7))
+FORECAST_SERVICE_LEVEL = float(os.getenv("FORECAST_SERVICE_LEVEL", 0.95))
+
+# Sales needed before a series' own weekday pattern counts for half
+SEASON_SHRINK = 50.0
+FETCH_SIZE = 50000
+
+
+def available():
+    return np is not None
+
+
+def _fetch(cur, sql, params=()):
+    cur.execute(sql, params)
+    rows = []
+    while True:
+        chunk = cur.fetchmany(FETCH_SIZE)
+        if not chunk:
+            return rows
+        rows.extend(chunk)
+
+
+def _fetch_array(cur, sql, params=(), columns=4):
+    # Converted a chunk at a time: millions of rows never sit in memory as tuples
+    cur.execute(sql, params)
+    chunks = [np.zeros((0, columns))]
+    while True:
+        chunk = cur.fetchmany(FETCH_SIZE)
+        if not chunk:
+            return np.concatenate(chunks)
+        chunks.append(np.array(chunk, dtype=np.float64))
+
+
+def load_branch_stock(cur):
+    """
+    (branch_id, product_id, on_hand_qty, min_qty) of every active product, in key order.
+    """
+    return _fetch_array(cur, """
+        SELECT bs.branch_id, bs.product_id, bs.on_hand_qty, bs.min_qty
+        FROM branch_stock bs
+        JOIN product p ON p.product_id = bs.product_id AND p.is_active = 1
+        ORDER BY bs.branch_id, bs.product_id
+    """)
+
+
+def load(conn, history_days=FORECAST_HISTORY_DAYS, today=None):
+    """
+    Everything the forecast needs: branch stock and daily sales as float arrays
+    (one row per branch_stock row / per branch, product and day), the rest as dicts.
+    """
+    today = today or date.today()
+    since = today - timedelta(days=history_days)
+    cur = conn.cursor()
+    try:
+        stock = load_branch_stock(cur)
+        # Days counted back from today: 0 = today, 1 = yesterday ...
+        sales = _fetch_array(cur, """
+            SELECT branch_id, product_id, DATEDIFF(%s, movement_date) AS age, -SUM(change_qty) AS qty
+            FROM stock_movement
+            WHERE movement_type = 'SALE' AND branch_id IS NOT NULL AND movement_date >= %s
+            GROUP BY branch_id, product_id, age
+            ORDER BY branch_id, product_id
+        """, (today.isoformat(), since.isoformat()))
+        warehouse = _fetch(cur, """
+            SELECT product_id, SUM(on_hand_qty) FROM warehouse_stock GROUP BY product_id
+        """)
+        # Purchases not completed yet (no PURCHASE movement) are stock on the way
+        on_order = _fetch(cur, """
+            SELECT pl.product_id, SUM(pl.quantity)
+            FROM purchase_line pl
+            LEFT JOIN (
+                SELECT DISTINCT reference_purchase_id AS purchase_id
+                FROM stock_movement
+                WHERE movement_type = 'PURCHASE'
+            ) done ON done.purchase_id = pl.purchase_id
+            WHERE done.purchase_id IS NULL
+            GROUP BY pl.product_id
+        """)
+        # Latest supplier and unit cost per product
+        suppliers = _fetch(cur, """
+            SELECT pl.product_id, pu.supplier_id, s.name, pl.unit_cost
+            FROM purchase_line pl
+            JOIN purchase pu ON pu.purchase_id = pl.purchase_id
+            JOIN supplier s ON s.supplier_id = pu.supplier_id
+            JOIN (
+                SELECT pl2.product_id, MAX(pl2.purchase_line_id) AS last_line_id
+                FROM purchase_line pl2
+                JOIN purchase pu2 ON pu2.purchase_id = pl2.purchase_id
+                WHERE pu2.supplier_id IS NOT NULL
+                GROUP BY pl2.product_id
+            ) last ON last.last_line_id = pl.purchase_line_id
+        """)
+        products = _fetch(cur, """
+            SELECT product_id, product_name, unit_price FROM product WHERE is_active = 1
+        """)
+    finally:
+        cur.close()
+
+    return {
+        "today": today,
+        "history_days": history_days,
+        "stock": stock,
+        "sales": sales,
+        "warehouse": dict(warehouse),
+        "on_order": dict(on_order),
+        "suppliers": {r[0]: r[1:] for r in suppliers},
+        "products": {r[0]: (r[1], r[2]) for r in products},
+    }
+
+
+class Forecast:
+    """
+    Per branch/product series arrays (index i = i-th branch_stock row) and the
+    per-product network view used for purchase suggestions.
+    """
+
+    def __init__(self, data, lead_days=FORECAST_LEAD_DAYS, review_days=FORECAST_REVIEW_DAYS,
+                 service_level=FORECAST_SERVICE_LEVEL, recent_days=FORECAST_RECENT_DAYS,
+                 recent_weight=FORECAST_RECENT_WEIGHT):
+        started = time.perf_counter()
+        self.data = data
+        self.lead_days = lead_days
+        self.review_days = review_days
+        self.service_level = service_level
+        history = max(1, data["history_days"])
+        recent_days = max(1, min(recent_days, history))
+        horizon = lead_days + review_days
+
+        stock = data["stock"]
+        self.branch_ids = stock[:, 0].astype(np.int64)
+        self.product_ids = stock[:, 1].astype(np.int64)
+        self.on_hand = stock[:, 2]
+        self.min_qty = stock[:, 3]
+        n = len(stock)
+
+        # Map each sales row to its series through a sorted (branch, product) key.
+        # Sales come back in key order too, which keeps searchsorted cache friendly.
+        # Sales of products without a series (inactive, no stock row) can have larger ids,
+        # so the span covers both sides; otherwise their keys land on another branch.
+        sales = data["sales"]
+        s_products = sales[:, 1].astype(np.int64)
+        span = max(int(self.product_ids.max()) if n else 0, int(s_products.max()) if len(sales) else 0) + 1
+        keys = self.branch_ids * span + self.product_ids
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        s_keys = sales[:, 0].astype(np.int64) * span + s_products
+        age = sales[:, 2].astype(np.int64)
+        qty = sales[:, 3]
+        pos = np.searchsorted(sorted_keys, s_keys)
+        pos_ok = np.minimum(pos, max(n - 1, 0))
+        keep = (pos < n) & (age >= 1) & (age <= history) & (qty > 0)
+        if n:
+            keep &= sorted_keys[pos_ok] == s_keys
+        series = order[pos_ok[keep]]
+        age, qty = age[keep], qty[keep]
+
+        total = np.bincount(series, qty, minlength=n)
+        sumsq = np.bincount(series, qty * qty, minlength=n)
+        recent = np.bincount(series, qty * (age <= recent_days), minlength=n)
+
+        mean = total / history
+        self.std = np.sqrt(np.maximum(sumsq / history - mean * mean, 0.0))
+        self.rate = recent_weight * (recent / recent_days) + (1 - recent_weight) * mean
+
+        # Weekday profile (Mon=0): 1.0 = an average day
+        today = data["today"]
+        weekday = (today.weekday() - age) % 7
+        by_day = np.bincount(series * 7 + weekday, qty, minlength=n * 7).reshape(n, 7)
+        expected = np.where(total > 0, total / 7.0, 1.0)[:, None]
+        raw = np.where(total[:, None] > 0, by_day / expected, 1.0)
+        trust = (total / (total + SEASON_SHRINK))[:, None]
+        self.season = trust * raw + (1 - trust)
+
+        # How many of each weekday the horizon (tomorrow on) contains
+        days_ahead = np.bincount([(today.weekday() + d) % 7 for d in range(1, horizon + 1)], minlength=7)
+        self.demand = self.rate * (self.season @ days_ahead)
+        z = NormalDist().inv_cdf(service_level)
+        self.safety = z * self.std * math.sqrt(horizon)
+        # What each branch should have on its shelf to get through the horizon
+        self.branch_target = np.ceil(self.demand + self.safety)
+        self.branch_need = np.maximum(self.branch_target - self.on_hand, 0.0)
+
+        # ---- Network view per product ----
+        self.network_ids, inverse = np.unique(self.product_ids, return_inverse=True)
+        m = len(self.network_ids)
+        self.network_demand = np.bincount(inverse, self.demand, minlength=m)
+        self.network_safety = z * np.sqrt(np.bincount(inverse, self.std ** 2, minlength=m)) * math.sqrt(horizon)
+        warehouse = data["warehouse"]
+        on_order = data["on_order"]
+        self.network_position = (
+            np.bincount(inverse, self.on_hand, minlength=m)
+            + np.array([float(warehouse.get(p, 0) or 0) for p in self.network_ids.tolist()])
+            + np.array([float(on_order.get(p, 0) or 0) for p in self.network_ids.tolist()])
+        )
+        self.purchase_qty = np.ceil(np.maximum(
+            self.network_demand + self.network_safety - self.network_position, 0.0
+        ))
+        self.seconds = time.perf_counter() - started
+
+    def purchase_orders(self):
+        """
+        Suggested purchases grouped by supplier: [{supplier_id, supplier_name, lines, total}].
+        Products never bought before have no supplier and go to a group with supplier_id None.
+        """
+        products = self.data["products"]
+        suppliers = self.data["suppliers"]
+        orders = {}
+        for i in np.flatnonzero(self.purchase_qty > 0):
+            pid = int(self.network_ids[i])
+            name, price = products.get(pid, (f"#{pid}", 0))
+            supplier_id, supplier_name, unit_cost = suppliers.get(pid, (None, None, None))
+            order = orders.setdefault(supplier_id, {
+                "supplier_id": supplier_id,
+                "supplier_name": supplier_name or "No supplier on record",
+                "lines": [],
+                "total": 0.0,
+            })
+            cost = float(unit_cost if unit_cost is not None else price or 0)
+            quantity = int(self.purchase_qty[i])
+            order["lines"].append({
+                "product_id": pid,
+                "product_name": name,
+                "quantity": quantity,
+                "unit_cost": cost,
+                "cost_estimated": unit_cost is None,
+                "daily_rate": round(float(self.network_demand[i]) / (self.lead_days + self.review_days), 2),
+                "position": int(self.network_position[i]),
+            })
+            order["total"] += quantity * cost
+        for order in orders.values():
+            order["lines"].sort(key=lambda l: l["product_name"])
+        # Known suppliers first, by name
+        return sorted(orders.values(), key=lambda o: (o["supplier_id"] is None, o["supplier_name"]))
+
+    def summary(self):
+        return {
+            "series": int(len(self.rate)),
+            "products": int(len(self.network_ids)),
+            "sales_rows": len(self.data["sales"]),
+            "to_order": int((self.purchase_qty > 0).sum()),
+            "compute_ms": round(self.seconds * 1000, 1),
+        }
+
+
+def create_drafts(conn, orders, warehouse_id, performed_by, supplier_ids=None):
+    """
+    Write the suggested orders as open (not completed) purchases for `warehouse_id`.
+    They show up under Purchases, where they can be edited and completed as usual.
+    Returns the new purchase ids.
+    """
+    cur = conn.cursor()
+    created = []
+    try:
+        for order in orders:
+            if order["supplier_id"] is None:
+                continue
+            if supplier_ids is not None and order["supplier_id"] not in supplier_ids:
+                continue
+            cur.execute("""
+                INSERT INTO purchase (warehouse_id, supplier_id, performed_by, notes)
+                VALUES (%s, %s, %s, %s)
+            """, (warehouse_id, order["supplier_id"], performed_by, "Draft from reorder suggestions"))
+            purchase_id = cur.lastrowid
+            cur.executemany("""
+                INSERT INTO purchase_line (purchase_id, product_id, quantity, unit_cost)
+                VALUES (%s, %s, %s, %s)
+            """, [(purchase_id, l["product_id"], l["quantity"], l["unit_cost"]) for l in order["lines"]])
+            created.append(purchase_id)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return created
+
+
+if __name__ == "__main__":
+    import sys
+    from db import get_connection
+
+    if np is None:
+        sys.exit("NumPy is required: pip install numpy")
+    conn = get_connection()
+    if not conn:
+        sys.exit("Database connection failed.")
+    try:
+        started = time.time()
+        data = load(conn)
+        loaded = time.time() - started
+        result = Forecast(data)
+    finally:
+        conn.close()
+    for order in result.purchase_orders():
+        print(f"{order['supplier_name']}: {len(order['lines'])} product(s), ${order['total']:.2f}")
+        for line in order["lines"]:
+            print(f"    {line['quantity']:>6} x {line['product_name']} (demand {line['daily_rate']}/day, "
+                  f"on hand + on order {line['position']})")
+    s = result.summary()
+    print(f"{s['series']} series, {s['products']} products, {s['to_order']} to order. "
+          f"Loaded {s['sales_rows']} sales rows in {loaded:.2f}s, forecast in {s['compute_ms']} ms.")
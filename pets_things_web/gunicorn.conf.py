@@ -0,0 +1,35 @@
+import multiprocessing
+import os
+
+# Production server settings. Run from pets_things_web/:
+#   gunicorn -c gunicorn.conf.py
+# Graceful restart (e.g. after a deploy): kill -HUP <master pid>
+wsgi_app = "wsgi:app"
+bind = os.getenv("WEB_BIND", "0.0.0.0:8000")
+
+# Concurrency: WEB_WORKERS processes x WEB_THREADS threads each
+workers = int(os.getenv("WEB_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("WEB_THREADS", 4))
+worker_class = "gthread"
+
+# Import the app once in the master so workers fork with it already loaded
+preload_app = True
+
+timeout = int(os.getenv("WEB_TIMEOUT", 60))
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+
+# Recycle workers now and then so slow leaks cannot accumulate
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", 2000))
+max_requests_jitter = max_requests // 10
+
+accesslog = "-"
+
+# One pool per worker, big enough for every thread (see db.DB_POOL_SIZE)
+os.environ.setdefault("DB_POOL_SIZE", str(threads * 2))
+
+
+def post_fork(server, worker):
+    # Sockets and threads from the master are unusable here: build this worker's own
+    import app
+    app.init_worker()
@@ -0,0 +1,223 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional: without it only the original upload is kept
+    Image = None
+
+# Product image pipeline.
+# Uploads are streamed to disk under their SHA-256 name (duplicates collapse into one
+# file), then thumb/medium derivatives are generated as WebP and JPEG in a worker pool.
+# Because the name is the content hash, every file can be cached forever by browsers.
+PRODUCT_IMAGE_DIR = os.path.join(os.path.dirname(__file__), "static", "uploads", "products")
+PRODUCT_IMAGE_URL_PREFIX = "uploads/products"
+IMAGE_SIZES = {"thumb": 160, "medium": 640}
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 2))
+CHUNK_SIZE = 64 * 1024
+
+HASHED_NAME = re.compile(r"^[0-9a-f]{64}(_(thumb|medium))?\.(png|jpe?g|webp)$")
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+_known_variants = {}
+
+
+def _pool():
+    # An executor inherited through fork() has no threads left: start a new one
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="image")
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def save_upload(file_storage, ext):
+    """
+    Stream an uploaded file to disk in chunks, name it by its SHA-256 and queue its derivatives.
+    Returns the path relative to static/ (stored in product.product_image).
+    """
+    final_path = _store(file_storage.stream, ext)
+    queue_derivatives(final_path)
+    return relative_path(final_path)
+
+
+def store_file(source_path):
+    """
+    Copy a local image into the store under its SHA-256 name (catalog imports).
+    Returns the absolute path of the stored file; derivatives are up to the caller.
+    """
+    ext = os.path.splitext(source_path)[1].lstrip(".").lower()
+    with open(source_path, "rb") as f:
+        return _store(f, ext)
+
+
+def relative_path(stored_path):
+    return f"{PRODUCT_IMAGE_URL_PREFIX}/{os.path.basename(stored_path)}"
+
+
+def submit(fn, *args):
+    """
+    Run fn(*args) in the image worker pool. Returns the future.
+    """
+    return _pool().submit(fn, *args)
+
+
+def _store(stream, ext):
+    os.makedirs(PRODUCT_IMAGE_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+
+    fd, tmp_path = tempfile.mkstemp(dir=PRODUCT_IMAGE_DIR, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+
+        filename = f"{digest.hexdigest()}.{ext}"
+        final_path = os.path.join(PRODUCT_IMAGE_DIR, filename)
+        if os.path.exists(final_path):
+            # Same picture uploaded before: keep the existing file
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, final_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return final_path
+
+
+def queue_derivatives(source_path):
+    """
+    Generate the resized copies of an image in the background. Returns the future (or None).
+    """
+    if Image is None:
+        return None
+    return _pool().submit(make_derivatives, source_path)
+
+
+def make_derivatives(source_path):
+    """
+    Write <name>_<size>.webp and <name>_<size>.jpg for every size in IMAGE_SIZES.
+    Existing derivatives are left alone, so re-running is cheap.
+    """
+    base, _ = os.path.splitext(source_path)
+    targets = []
+    for size_name in IMAGE_SIZES:
+        for fmt in ("webp", "jpg"):
+            target = f"{base}_{size_name}.{fmt}"
+            if not os.path.exists(target):
+                targets.append((size_name, fmt, target))
+    if not targets:
+        return []
+
+    with Image.open(source_path) as img:
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        written = []
+        for size_name, fmt, target in targets:
+            edge = IMAGE_SIZES[size_name]
+            copy = img.copy()
+            copy.thumbnail((edge, edge), Image.LANCZOS)
+
+            # Per-thread temp name: two jobs for the same picture may run at once
+            tmp_target = f"{target}.{os.getpid()}-{threading.get_ident()}.part"
+            if fmt == "webp":
+                copy.save(tmp_target, "WEBP", quality=80, method=4)
+            else:
+                copy.save(tmp_target, "JPEG", quality=82, optimize=True, progressive=True)
+            os.replace(tmp_target, target)
+            written.append(target)
+    return written
+
+
+def variant(image_path, size_name, fmt):
+    """
+    Static path of a derivative if it has been generated, otherwise None.
+    Positive answers are remembered; derivatives are never modified once written.
+    """
+    if not image_path:
+        return None
+    key = (image_path, size_name, fmt)
+    if key in _known_variants:
+        return _known_variants[key]
+
+    base, _ = os.path.splitext(image_path)
+    candidate = f"{base}_{size_name}.{fmt}"
+    if os.path.exists(os.path.join(os.path.dirname(__file__), "static", candidate)):
+        _known_variants[key] = candidate
+        return candidate
+    return None
+
+
+def image_sources(image_path, size_name="thumb"):
+    """
+    Template helper: {"webp": ..., "fallback": ...} static paths for a product image.
+    Falls back to the original upload until the derivatives exist.
+    """
+    return {
+        "webp": variant(image_path, size_name, "webp"),
+        "fallback": variant(image_path, size_name, "jpg") or image_path
+    }
+
+
+def is_immutable(filename):
+    """
+    True for content-addressed files, which may be cached by browsers forever.
+    """
+    return bool(HASHED_NAME.match(filename))
+
+
+def release_image(cur, image_path):
+    """
+    Delete an uploaded image and its derivatives unless another product still uses it
+    (identical uploads share one file). Call after the product row was changed or removed.
+    """
+    if not image_path:
+        return
+    cur.execute("SELECT 1 FROM product WHERE product_image = %s LIMIT 1", (image_path,))
+    if cur.fetchone():
+        return
+
+    static_dir = os.path.join(os.path.dirname(__file__), "static")
+    base, _ = os.path.splitext(image_path)
+    paths = [image_path]
+    for size_name in IMAGE_SIZES:
+        for fmt in ("webp", "jpg"):
+            paths.append(f"{base}_{size_name}.{fmt}")
+            _known_variants.pop((image_path, size_name, fmt), None)
+
+    for p in paths:
+        try:
+            os.remove(os.path.join(static_dir, p))
+        except OSError:
+            pass
+
+
+if __name__ == "__main__":
+    import sys
+
+    if Image is None:
+        print("Pillow is not installed: pip install Pillow")
+    elif len(sys.argv) > 1 and sys.argv[1] == "backfill":
+        # Generate derivatives for images uploaded before the pipeline existed
+        count = 0
+        for name in sorted(os.listdir(PRODUCT_IMAGE_DIR)):
+            if name.endswith(".part") or re.search(r"_(thumb|medium)\.\w+$", name):
+                continue
+            try:
+                count += len(make_derivatives(os.path.join(PRODUCT_IMAGE_DIR, name)))
+            except Exception as e:
+                print(f"{name}: {e}")
+        print(f"Wrote {count} derivative file(s).")
+    else:
+        print("Usage: python image_pipeline.py backfill")
@@ -0,0 +1,270 @@
+import hmac
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from flask import g, request
+
+import applog
+import db
+import page_cache
+import pos_journal
+import queries
+import report_governor
+
+# Operational metrics in Prometheus text format (GET /metrics).
+# Every thread counts into its own shard (plain dicts, no locks on the hot path);
+# a scrape sums the shards. Numbers are per worker process: with several gunicorn
+# workers each scrape sees the worker that answered it.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+STATEMENTS_PER_REQUEST_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# MySQL errors that a client is expected to retry
+ER_LOCK_WAIT_TIMEOUT = 1205
+ER_LOCK_DEADLOCK = 1213
+
+_HELP = {
+    "pets_http_requests_total": ("counter", "HTTP requests by endpoint and status code."),
+    "pets_http_request_duration_seconds": ("histogram", "Time from request start until the response body was sent."),
+    "pets_sql_statements_per_request": ("histogram", "SQL statements executed while serving one request."),
+    "pets_sql_statement_duration_seconds": ("histogram", "SQL statement execution time by kind."),
+    "pets_sql_errors_total": ("counter", "Failed SQL statements by MySQL error number."),
+    "pets_db_transactions_total": ("counter", "Transactions ended, by outcome (commit / rollback)."),
+    "pets_db_retryable_errors_total": ("counter", "Deadlocks and lock wait timeouts (transactions to retry)."),
+    "pets_pos_journal_failed": ("gauge", "Offline sales set aside after failing to sync POS_SYNC_MAX_ATTEMPTS times."),
+}
+
+_started_at = time.time()
+_local = threading.local()
+_shards = []
+_shards_lock = threading.Lock()
+
+# Statement count and time of the request being served; copied into fan-out threads
+_request_sql = ContextVar("request_sql", default=None)
+
+
+class _Shard:
+    __slots__ = ("counters", "histograms")
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+
+def _shard():
+    shard = getattr(_local, "shard", None)
+    if shard is None:
+        shard = _local.shard = _Shard()
+        with _shards_lock:
+            _shards.append(shard)
+    return shard
+
+
+def inc(name, labels=(), amount=1):
+    """
+    Add to a counter. labels is a tuple of (name, value) pairs.
+    """
+    counters = _shard().counters
+    key = (name, labels)
+    counters[key] = counters.get(key, 0) + amount
+
+
+def observe(name, value, labels=(), buckets=LATENCY_BUCKETS):
+    """
+    Record one observation in a histogram.
+    """
+    histograms = _shard().histograms
+    key = (name, labels)
+    entry = histograms.get(key)
+    if entry is None:
+        # [per-bucket counts (last one is +Inf), sum, bucket bounds]
+        entry = histograms[key] = [[0] * (len(buckets) + 1), 0.0, buckets]
+    entry[0][bisect_left(buckets, value)] += 1
+    entry[1] += value
+
+
+# ==================== Collection ====================
+
+def _statement_kind(sql):
+    word = sql.lstrip(" \n\t(").split(None, 1)[0].upper() if sql.strip() else ""
+    return word if word in ("SELECT", "INSERT", "UPDATE", "DELETE", "COMMIT", "ROLLBACK") else "OTHER"
+
+
+def _on_statement(sql, params, seconds, error):
+    kind = _statement_kind(sql)
+    observe("pets_sql_statement_duration_seconds", seconds, (("kind", kind),), STATEMENT_BUCKETS)
+    if kind in ("COMMIT", "ROLLBACK"):
+        inc("pets_db_transactions_total", (("outcome", kind.lower()),))
+    if error is not None:
+        errno = getattr(error, "errno", None)
+        inc("pets_sql_errors_total", (("errno", str(errno)),))
+        if errno in (ER_LOCK_WAIT_TIMEOUT, ER_LOCK_DEADLOCK):
+            inc("pets_db_retryable_errors_total", (("errno", str(errno)),))
+
+    current = _request_sql.get()
+    if current is not None:
+        current[0] += 1
+        current[1] += seconds
+
+
+db.add_statement_listener(_on_statement)
+
+
+def start_request():
+    g.metrics_started = time.perf_counter()
+    g.metrics_sql = [0, 0.0]
+    _request_sql.set(g.metrics_sql)
+
+
+def finish_request(response):
+    """
+    after_request hook: record status, and latency once the body has been sent
+    (streamed pages included).
+    """
+    started = g.pop("metrics_started", None)
+    if started is None:
+        return response
+    endpoint = request.endpoint or "unmatched"
+    sql = g.metrics_sql
+    status = str(response.status_code)
+
+    def record():
+        labels = (("endpoint", endpoint),)
+        inc("pets_http_requests_total", labels + (("status", status),))
+        observe("pets_http_request_duration_seconds", time.perf_counter() - started, labels)
+        observe("pets_sql_statements_per_request", sql[0], labels, STATEMENTS_PER_REQUEST_BUCKETS)
+
+    response.call_on_close(record)
+    return response
+
+
+def authorized():
+    """
+    Scrapers send "Authorization: Bearer <METRICS_TOKEN>"; without a token only admins may read.
+    """
+    if not METRICS_TOKEN:
+        return False
+    header = request.headers.get("Authorization", "")
+    return hmac.compare_digest(header, f"Bearer {METRICS_TOKEN}")
+
+
+# ==================== Exposition ====================
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _merged():
+    with _shards_lock:
+        shards = list(_shards)
+    counters, histograms = {}, {}
+    for shard in shards:
+        for key, value in dict(shard.counters).items():
+            counters[key] = counters.get(key, 0) + value
+        for key, (counts, total, buckets) in dict(shard.histograms).items():
+            merged = histograms.get(key)
+            if merged is None:
+                histograms[key] = [list(counts), total, buckets]
+            else:
+                merged[0] = [a + b for a, b in zip(merged[0], counts)]
+                merged[1] += total
+    return counters, histograms
+
+
+def _gauges():
+    """
+    Point-in-time values read from the other modules at scrape time.
+    """
+    samples = [("pets_process_start_time_seconds", (), _started_at)]
+
+    pools = db.pool_stats()
+    for kind, count in pools["connections"].items():
+        samples.append(("pets_db_connections_total", (("event", kind),), count))
+    for target, pool in pools["pools"].items():
+        samples.append(("pets_db_pool_size", (("target", target),), pool["size"]))
+        samples.append(("pets_db_pool_idle", (("target", target),), pool["idle"]))
+    for target, breaker in db.breaker_stats().items():
+        labels = (("target", target),)
+        samples.append(("pets_db_breaker_open", labels, int(breaker["state"] == "open")))
+        samples.append(("pets_db_breaker_trips_total", labels, breaker["trips"]))
+        samples.append(("pets_db_breaker_rejected_total", labels, breaker["rejected"]))
+    if db.replica_lag() is not None:
+        samples.append(("pets_db_replica_lag_seconds", (), db.replica_lag()))
+
+    cache = page_cache.catalog_pages.stats()
+    labels = (("cache", "catalog_pages"),)
+    samples.append(("pets_cache_hits_total", labels, cache["hits"]))
+    samples.append(("pets_cache_misses_total", labels, cache["misses"]))
+    samples.append(("pets_cache_entries", labels, cache["entries"]))
+
+    for name, q in queries.stats().items():
+        labels = (("query", name),)
+        samples.append(("pets_named_query_calls_total", labels, q["calls"]))
+        samples.append(("pets_named_query_seconds_total", labels, q["total_ms"] / 1000))
+
+    governor = report_governor.stats()
+    for key in ("admitted", "rejected_busy", "rejected_timeout"):
+        samples.append(("pets_report_governor_total", (("outcome", key),), governor[key]))
+    samples.append(("pets_report_governor_running", (), governor["running"]))
+
+    logs = applog.stats()
+    samples.append(("pets_log_dropped_total", (), logs["dropped"]))
+    samples.append(("pets_log_suppressed_total", (), logs["suppressed"]))
+    samples.append(("pets_log_queue_depth", (), logs["queued"]))
+
+    if pos_journal.POS_OFFLINE_MODE:
+        # Journaled sales wait here and are retried until they reach MySQL
+        samples.append(("pets_pos_journal_pending", (), pos_journal.pending_count()))
+        # Sales set aside after failing POS_SYNC_MAX_ATTEMPTS times; they need a look
+        samples.append(("pets_pos_journal_failed", (), pos_journal.failed_count()))
+    return samples
+
+
+def render():
+    """
+    All metrics in the Prometheus text exposition format (version 0.0.4).
+    """
+    counters, histograms = _merged()
+    lines = []
+    seen = set()
+
+    def header(name, kind=None, text=None):
+        if name in seen:
+            return
+        seen.add(name)
+        kind, text = _HELP.get(name, (kind or "gauge", text or name.replace("_", " ")))
+        lines.append(f"# HELP {name} {text}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in sorted(counters.items()):
+        header(name, "counter")
+        lines.append(f"{name}{_labels(labels)} {value}")
+
+    for (name, labels), (counts, total, buckets) in sorted(histograms.items(), key=lambda i: i[0]):
+        header(name, "histogram")
+        cumulative = 0
+        for bound, count in zip(buckets + (float("inf"),), counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(float(bound))
+            lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labels)} {total}")
+        lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+
+    # All samples of one metric must be adjacent
+    for name, labels, value in sorted(_gauges(), key=lambda sample: sample[0]):
+        kind = "counter" if name.endswith("_total") else "gauge"
+        header(name, kind)
+        lines.append(f"{name}{_labels(labels)} {value}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,166 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import g, make_response, request, session
+
+import db
+
+# Full-page cache for anonymous visitors of the public catalog pages.
+# Entries live in this worker's memory. Product writes call invalidate(); other
+# workers pick the change up after PAGE_CACHE_TTL seconds at the latest.
+PAGE_CACHE_TTL = int(os.getenv("PAGE_CACHE_TTL", 30))
+PAGE_CACHE_MAX_ENTRIES = int(os.getenv("PAGE_CACHE_MAX_ENTRIES", 512))
+
+
+class PageCache:
+    """
+    Small LRU of rendered pages with a TTL and a generation counter for invalidation.
+    """
+
+    def __init__(self, max_entries=PAGE_CACHE_MAX_ENTRIES, ttl=PAGE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def get(self, key, allow_stale=False):
+        """
+        Return the cached entry for key, or None when missing, expired or invalidated.
+        With allow_stale=True an expired entry of the current generation is returned too.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry["generation"] != self.generation:
+                self.misses += 1
+                return None
+            if not allow_stale and entry["created_at"] < time.time() - self.ttl:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body, mimetype):
+        entry = {
+            "body": body,
+            "mimetype": mimetype,
+            "etag": hashlib.sha1(body).hexdigest(),
+            "created_at": time.time(),
+            "generation": self.generation
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self):
+        """
+        Drop every cached page. Called after product or category writes.
+        """
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def lock_for(self, key):
+        """
+        Per-key lock so a burst of misses for the same page renders it only once.
+        """
+        with self._lock:
+            lock = self._key_locks.get(key)
+            if lock is None:
+                if len(self._key_locks) > self.max_entries * 2:
+                    self._key_locks.clear()
+                lock = self._key_locks[key] = threading.Lock()
+            return lock
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "generation": self.generation}
+
+
+catalog_pages = PageCache()
+
+
+def skip():
+    """
+    Mark the current response as not cacheable (e.g. it shows a database error).
+    """
+    g.skip_page_cache = True
+
+
+def normalized_key(filters):
+    """
+    Cache key for this request: the path plus the known filters in canonical form.
+    `filters` maps query parameter name -> type (int, float or str); anything else is ignored.
+    """
+    parts = []
+    for name in sorted(filters):
+        value = request.args.get(name, type=filters[name])
+        if filters[name] is str:
+            value = (value or "").strip()
+        if value is None or value == "":
+            continue
+        if isinstance(value, float):
+            value = repr(value)
+        parts.append(f"{name}={value}")
+    return request.path + "?" + "&".join(parts)
+
+
+def _cached_response(entry, stale=False):
+    response = make_response(entry["body"])
+    response.mimetype = entry["mimetype"]
+    response.set_etag(entry["etag"])
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["Vary"] = "Cookie"
+    if stale:
+        response.headers["Warning"] = '110 - "Response is Stale"'
+        response.headers["X-Page-Cache"] = "stale"
+    return response.make_conditional(request)
+
+
+def cached_page(filters, cache=catalog_pages):
+    """
+    Decorator: serve anonymous GET requests from the page cache, keyed on the normalized filters.
+    Logged-in users always get a freshly rendered page. While the database is unreachable,
+    expired entries are served (marked stale) instead of the error page.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != "GET" or "user_id" in session:
+                return view(*args, **kwargs)
+
+            key = normalized_key(filters)
+            entry = cache.get(key)
+            if entry is None and not db.database_available():
+                # Database outage: an expired copy beats an error page
+                stale = cache.get(key, allow_stale=True)
+                if stale is not None:
+                    return _cached_response(stale, stale=True)
+
+            if entry is None:
+                with cache.lock_for(key):
+                    entry = cache.get(key)
+                    if entry is None:
+                        response = make_response(view(*args, **kwargs))
+                        if response.status_code != 200 or g.get("skip_page_cache"):
+                            stale = cache.get(key, allow_stale=True)
+                            if stale is not None and g.get("skip_page_cache"):
+                                return _cached_response(stale, stale=True)
+                            return response
+                        entry = cache.put(key, response.get_data(), response.mimetype)
+
+            return _cached_response(entry)
+        return wrapper
+    return decorator
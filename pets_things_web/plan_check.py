@@ -0,0 +1,381 @@
+"""
+Query plan regression check.
+
+1. collect: crawl every GET page of the app (Flask test client, one login per
+   --user) with statement tracing on, then drive the write paths once each
+   (checkout, transfer, booking, replenishment, purchase invoice import with
+   completion), and save each distinct SQL statement with the parameters it was
+   first run with. Works on either backend. The write paths really write, so
+   they only run against a local database (see workload_sim.py).
+
+       python plan_check.py collect --user admin@pets.com:secret --user employee@pets.com:secret
+
+2. check: run EXPLAIN FORMAT=JSON for every collected statement against MySQL
+   (a copy seeded with seed_data.py, so the optimizer sees realistic row counts)
+   and flag full table / index scans, filesorts and temporary tables on more than
+   --rows rows. Plans are compared with the stored baseline: a new problem, or a
+   table read with a worse access type than before, is a regression and the exit
+   status is 1, so a CI job fails.
+
+       python plan_check.py check
+       python plan_check.py check --update-baseline    # accept the current plans
+
+3. run: collect, then check; the one command a CI job needs.
+
+       python plan_check.py run --user admin@pets.com:secret --init-baseline   # first run
+       python plan_check.py run --user admin@pets.com:secret
+
+plan_baseline.json is committed. The tree does not ship one: the first run on a
+MySQL copy seeded by seed_data.py bootstraps it with --init-baseline (writes the
+baseline when there is none, checks against it otherwise), then commit it. Without
+that flag a missing baseline is an error, so CI cannot pass by accident.
+plan_statements.json can be regenerated at any time.
+"""
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import random
+import re
+import sys
+from datetime import date, timedelta
+
+from werkzeug.routing import IntegerConverter
+
+import db
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STATEMENTS_PATH = os.path.join(HERE, "plan_statements.json")
+BASELINE_PATH = os.path.join(HERE, "plan_baseline.json")
+ROW_THRESHOLD = 1000
+
+# Best to worst (MySQL EXPLAIN access types)
+ACCESS_TYPES = ("system", "const", "eq_ref", "ref", "fulltext", "ref_or_null", "unique_subquery",
+                "index_subquery", "index_merge", "range", "index", "ALL")
+FULL_SCANS = ("index", "ALL")
+
+_today = date.today()
+_year_ago = (_today - timedelta(days=365)).isoformat()
+
+# Filtered variants of the pages, so search and date-range statements are collected too
+EXTRA_URLS = (
+    "/products?search=dog&category_id=1&min_price=1&max_price=100",
+    "/products/active?search=dog",
+    "/api/customers/search?q=em",
+    "/api/catalog/changes?since=0",
+    "/inventory?view=warehouse&status=LOW&sort=on_hand_qty&dir=desc&page=2",
+    "/inventory?view=branch&location_id=1&category_id=1",
+    f"/purchases?warehouse_id=1&date_from={_year_ago}&date_to={_today}",
+    f"/sales?branch_id=1&date_from={_year_ago}&date_to={_today}",
+    f"/reports/top-products?branch_id=1&date_from={_year_ago}&date_to={_today}&metric=revenue",
+    f"/reports/sales-analytics?group_by=month&date_from={_year_ago}&date_to={_today}",
+    f"/stock-movements?location_type=branch&location_id=1&type=SALE&date_from={_year_ago}&date_to={_today}",
+    f"/booking/search?date_from={_today}&date_to={_today + timedelta(days=7)}",
+    f"/admin/bookings?status=CONFIRMED&date_from={_year_ago}&date_to={_today}",
+    f"/admin/bookings/today?date={_today}",
+)
+SKIP_ENDPOINTS = {"static", "dist_asset", "logout", "profile_download"}
+EXPLAINABLE = re.compile(r"^\s*\(?\s*(SELECT|WITH|UPDATE|DELETE|INSERT|REPLACE)\b", re.IGNORECASE)
+
+
+def normalize(sql):
+    return " ".join(sql.split())
+
+
+def statement_key(sql):
+    return hashlib.sha1(normalize(sql).encode()).hexdigest()[:12]
+
+
+# ==================== collect ====================
+
+def _urls(app):
+    urls = []
+    for rule in app.url_map.iter_rules():
+        if "GET" not in rule.methods or rule.endpoint in SKIP_ENDPOINTS:
+            continue
+        # Pages keyed by an id are visited with id 1; other placeholders are skipped
+        if any(not isinstance(c, IntegerConverter) for c in rule._converters.values()):
+            continue
+        urls.append(rule.build({a: 1 for a in rule.arguments})[1])
+    return sorted(urls) + list(EXTRA_URLS)
+
+
+def _purchase(client, plan, stats, current):
+    """
+    New purchase, then a supplier invoice for three products, completed on import.
+    """
+    import workload_sim
+
+    current["url"] = None
+    conn = db.get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT MIN(supplier_id) FROM supplier")
+        supplier_id = cur.fetchone()[0]
+        # Products the invoice can name unambiguously
+        cur.execute("""
+            SELECT sku, product_name FROM product p
+            WHERE sku IS NOT NULL
+               OR NOT EXISTS (SELECT 1 FROM product q
+                              WHERE q.product_name = p.product_name AND q.product_id <> p.product_id)
+            ORDER BY product_id
+            LIMIT 3
+        """)
+        products = cur.fetchall()
+    finally:
+        cur.close()
+        conn.close()
+
+    current["url"] = "POST purchase_import_invoice"
+    _, location = workload_sim.submit(client, stats, "purchase_new", "/purchases/new",
+                                      {"warehouse_id": plan["warehouse_id"], "supplier_id": supplier_id})
+    if not location or "/purchases/" not in location:
+        return "error"
+    invoice = io.StringIO()
+    writer = csv.writer(invoice)
+    writer.writerow(("sku", "product_name", "quantity", "unit_cost"))
+    writer.writerows((sku or "", "" if sku else name, 5, "1.00") for sku, name in products)
+    return workload_sim.submit(client, stats, "purchase_import_invoice", location + "/import-invoice", {
+        "invoice_file": (io.BytesIO(invoice.getvalue().encode()), "invoice.csv"), "complete": "1",
+    })[0]
+
+
+def _write_paths(app, current, log):
+    """
+    Run each write path once so its statements (FOR UPDATE reads, UPDATE ... JOIN,
+    INSERT ... SELECT, upserts) are collected too.
+    """
+    import workload_sim
+
+    if not workload_sim.is_local():
+        log("write paths skipped: they write, so they only run against a local database")
+        return
+    # The harness's own setup statements are not recorded
+    current["url"] = None
+    plan = workload_sim.prepare(hot_products=3, rooms=1, start_stock=1000, customers=1)
+    stats, rng = workload_sim.Stats(), random.Random(0)
+    staff = workload_sim.client_for(app, plan["staff"][0], "admin")
+
+    steps = [
+        ("sale_complete", lambda: workload_sim.checkout_step(staff, plan, stats, rng)),
+        ("transfer_stock", lambda: workload_sim.transfer_step(staff, plan, stats, rng)),
+        ("inventory_replenish", lambda: workload_sim.submit(staff, stats, "inventory_replenish",
+                                                            "/inventory/replenish", {
+            "warehouse_id": plan["warehouse_id"], "target": "target", "branch_id": plan["branch_id"],
+        })[0]),
+        ("purchase_import_invoice", lambda: _purchase(staff, plan, stats, current)),
+    ]
+    if plan["customers"] and plan["rooms"]:
+        owner, cat_id = plan["customers"][0]
+        customer = workload_sim.client_for(app, owner, "customer")
+        steps.append(("booking_new", lambda: workload_sim.booking_step(customer, plan, stats, rng, cat_id)))
+
+    for name, step in steps:
+        current["url"] = f"POST {name}"
+        log(f"{step()} POST {name}")
+
+
+def collect(users, path=STATEMENTS_PATH, log=print):
+    """
+    Crawl the app as each user, run the write paths, and write the distinct statements to `path`.
+    """
+    import app as web
+
+    app = web.create_app(start_workers=False)
+    statements = {}
+    current = {"url": None}
+
+    def listener(sql, params, seconds, error):
+        if current["url"] is None or not EXPLAINABLE.match(sql):
+            return
+        entry = statements.setdefault(statement_key(sql), {
+            "sql": normalize(sql), "params": list(params or ()), "urls": []
+        })
+        if current["url"] not in entry["urls"]:
+            entry["urls"].append(current["url"])
+
+    db.add_statement_listener(listener)
+    for user in users:
+        email, _, password = user.partition(":")
+        client = app.test_client()
+        client.post("/login", data={"email": email, "password": password}).close()
+        for url in _urls(app):
+            current["url"] = url
+            response = client.get(url)
+            response.get_data()
+            response.close()
+            log(f"{response.status_code} {url} ({email})")
+    _write_paths(app, current, log)
+
+    with open(path, "w") as f:
+        json.dump(statements, f, indent=1, default=str, sort_keys=True)
+    log(f"{len(statements)} distinct statement(s) written to {path}")
+    return statements
+
+
+# ==================== check ====================
+
+def _walk(node, found):
+    if isinstance(node, dict):
+        if "access_type" in node:
+            found["tables"].append(node)
+        if node.get("using_filesort"):
+            found["filesort"] = True
+        if node.get("using_temporary_table"):
+            found["temporary"] = True
+        for value in node.values():
+            _walk(value, found)
+    elif isinstance(node, list):
+        for value in node:
+            _walk(value, found)
+
+
+def analyze_plan(plan, threshold=ROW_THRESHOLD):
+    """
+    Summary of an EXPLAIN FORMAT=JSON document: access type and rows per table,
+    and the problems on more than `threshold` rows.
+    """
+    found = {"tables": [], "filesort": False, "temporary": False}
+    _walk(plan, found)
+    tables, issues = {}, []
+    max_rows = 0
+    for node in found["tables"]:
+        name = node.get("table_name", "?")
+        rows = int(node.get("rows_examined_per_scan") or 0)
+        max_rows = max(max_rows, rows)
+        access = node["access_type"]
+        # Keep the worst access if an alias shows up more than once (subqueries)
+        if name not in tables or ACCESS_TYPES.index(access) > ACCESS_TYPES.index(tables[name]["access"]):
+            tables[name] = {"access": access, "rows": rows, "key": node.get("key")}
+        if access in FULL_SCANS and rows >= threshold:
+            issue = f"full {'index' if access == 'index' else 'table'} scan on {name}"
+            if issue not in issues:
+                issues.append(issue)
+    if found["filesort"] and max_rows >= threshold:
+        issues.append("filesort")
+    if found["temporary"] and max_rows >= threshold:
+        issues.append("temporary table")
+    return {"tables": tables, "issues": issues}
+
+
+def explain(conn, sql, params):
+    cur = conn.cursor()
+    try:
+        cur.execute("EXPLAIN FORMAT=JSON " + sql, tuple(params))
+        return json.loads(cur.fetchone()[0])
+    finally:
+        cur.close()
+
+
+def compare(current, baseline, threshold=ROW_THRESHOLD):
+    """
+    Regressions of one statement: new issues, and big tables now read with a worse access type.
+    """
+    if baseline is None:
+        return list(current["issues"])
+    regressions = [i for i in current["issues"] if i not in baseline["issues"]]
+    for name, table in current["tables"].items():
+        before = baseline["tables"].get(name)
+        if (before and table["rows"] >= threshold
+                and ACCESS_TYPES.index(table["access"]) > ACCESS_TYPES.index(before["access"])):
+            regressions.append(f"{name}: access {before['access']} -> {table['access']}")
+    return regressions
+
+
+def check(statements_path=STATEMENTS_PATH, baseline_path=BASELINE_PATH, threshold=ROW_THRESHOLD,
+          update_baseline=False, init_baseline=False, log=print):
+    """
+    EXPLAIN every collected statement; returns the number of regressions.
+    init_baseline writes the baseline instead of comparing when there is none yet.
+    """
+    if db.DB_BACKEND == "sqlite":
+        raise SystemExit("check needs MySQL: EXPLAIN FORMAT=JSON has no SQLite equivalent")
+    with open(statements_path) as f:
+        statements = json.load(f)
+    baseline = {}
+    if not update_baseline and not os.path.exists(baseline_path):
+        # Without a baseline every known issue would look like a regression
+        if not init_baseline:
+            raise SystemExit(f"No baseline at {baseline_path}: run with --init-baseline "
+                             f"on a MySQL copy seeded by seed_data.py and commit it")
+        log(f"No baseline at {baseline_path} yet: writing one from these plans")
+        update_baseline = True
+    if not update_baseline:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+
+    conn = db.get_connection()
+    if not conn:
+        raise SystemExit("Cannot connect to MySQL (check .env)")
+
+    plans, regressions, failed = {}, 0, 0
+    try:
+        for key, entry in sorted(statements.items()):
+            try:
+                plan = explain(conn, entry["sql"], entry["params"])
+            except db.Error as e:
+                failed += 1
+                log(f"SKIP {key} {entry['sql'][:80]}: {e}")
+                continue
+            summary = analyze_plan(plan, threshold)
+            plans[key] = dict(summary, sql=entry["sql"], urls=entry["urls"])
+            problems = compare(summary, baseline.get(key), threshold) if not update_baseline else []
+            if problems:
+                regressions += len(problems)
+                log(f"REGRESSION {key} ({', '.join(entry['urls'][:3])})\n  {entry['sql'][:200]}")
+                for problem in problems:
+                    log(f"  - {problem}")
+            elif summary["issues"]:
+                log(f"known      {key}: {', '.join(summary['issues'])}")
+    finally:
+        conn.close()
+
+    for key in sorted(set(baseline) - set(plans)):
+        log(f"gone       {key} {baseline[key]['sql'][:80]}")
+
+    if update_baseline:
+        with open(baseline_path, "w") as f:
+            json.dump(plans, f, indent=1, sort_keys=True)
+        log(f"Baseline of {len(plans)} plan(s) written to {baseline_path}; commit it")
+    log(f"{len(plans)} plan(s) checked, {regressions} regression(s), {failed} statement(s) not explainable")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("collect", help="crawl the app and record its SQL statements")
+    p.add_argument("--user", action="append", required=True, metavar="EMAIL:PASSWORD",
+                   help="log in as this user (repeat for several roles)")
+    p.add_argument("--out", default=STATEMENTS_PATH)
+
+    p = sub.add_parser("check", help="EXPLAIN the statements and compare with the baseline")
+    p.add_argument("--statements", default=STATEMENTS_PATH)
+    p.add_argument("--baseline", default=BASELINE_PATH)
+    p.add_argument("--rows", type=int, default=ROW_THRESHOLD, help="ignore problems on fewer rows")
+    p.add_argument("--update-baseline", action="store_true")
+    p.add_argument("--init-baseline", action="store_true", help="write the baseline if there is none yet")
+
+    p = sub.add_parser("run", help="collect, then check (exit status 1 on regressions)")
+    p.add_argument("--user", action="append", required=True, metavar="EMAIL:PASSWORD")
+    p.add_argument("--statements", default=STATEMENTS_PATH)
+    p.add_argument("--baseline", default=BASELINE_PATH)
+    p.add_argument("--rows", type=int, default=ROW_THRESHOLD, help="ignore problems on fewer rows")
+    p.add_argument("--update-baseline", action="store_true")
+    p.add_argument("--init-baseline", action="store_true", help="write the baseline if there is none yet")
+
+    args = parser.parse_args(argv)
+    if args.command == "collect":
+        collect(args.user, args.out)
+        return 0
+    if args.command == "run":
+        collect(args.user, args.statements)
+    regressions = check(args.statements, args.baseline, args.rows, args.update_baseline, args.init_baseline)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
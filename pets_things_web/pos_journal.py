@@ -0,0 +1,439 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from mysql.connector import errors
+
+# Branch-local journal for sales completed while the central MySQL is unreachable.
+# Journaled sales are replayed later in bulk by sync_pending().
+POS_JOURNAL_PATH = os.getenv(
+    "POS_JOURNAL_PATH",
+    os.path.join(os.path.dirname(__file__), "data", "pos_journal.sqlite3")
+)
+POS_OFFLINE_MODE = os.getenv("POS_OFFLINE_MODE", "0") == "1"
+POS_SYNC_INTERVAL = int(os.getenv("POS_SYNC_INTERVAL", 30))
+POS_SYNC_BATCH_SIZE = int(os.getenv("POS_SYNC_BATCH_SIZE", 500))
+# A sale that fails on its own this many times is set aside so it stops blocking the queue
+POS_SYNC_MAX_ATTEMPTS = int(os.getenv("POS_SYNC_MAX_ATTEMPTS", 3))
+
+# Failures caused by the sale itself (missing product or customer, bad line data);
+# anything else (connection lost, lock wait) is retried on the next pass
+_DATA_ERRORS = (errors.IntegrityError, errors.DataError, KeyError, TypeError, ValueError)
+
+log = logging.getLogger(__name__)
+
+_local = threading.local()
+_sync_lock = threading.Lock()
+
+
+def _journal():
+    """
+    Return this thread's connection to the journal, creating the tables on first use.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None and getattr(_local, "pid", None) == os.getpid():
+        return conn
+
+    os.makedirs(os.path.dirname(POS_JOURNAL_PATH), exist_ok=True)
+    conn = sqlite3.connect(POS_JOURNAL_PATH, timeout=10, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    # Every offline sale must survive a power cut
+    conn.execute("PRAGMA synchronous=FULL")
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS pending_sale (
+            client_ref TEXT PRIMARY KEY,
+            branch_id INTEGER NOT NULL,
+            employee_id INTEGER NOT NULL,
+            customer_id INTEGER NULL,
+            sale_date TEXT NOT NULL,
+            lines TEXT NOT NULL,
+            recorded_at REAL NOT NULL,
+            synced_at REAL NULL,
+            sale_id INTEGER NULL,
+            last_error TEXT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            failed_at REAL NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS catalog_product (
+            product_id INTEGER PRIMARY KEY,
+            product_name TEXT NOT NULL,
+            unit_price REAL NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS catalog_branch (
+            branch_id INTEGER PRIMARY KEY,
+            branch_name TEXT NOT NULL
+        );
+    """)
+    # Journals created before failed sales were set aside
+    columns = {r["name"] for r in conn.execute("PRAGMA table_info(pending_sale)")}
+    if "failed_at" not in columns:
+        conn.execute("ALTER TABLE pending_sale ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+        conn.execute("ALTER TABLE pending_sale ADD COLUMN failed_at REAL NULL")
+    conn.execute("DROP INDEX IF EXISTS idx_pending_sale_unsynced")
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_pending_sale_queue
+            ON pending_sale (synced_at, failed_at, recorded_at, client_ref)
+    """)
+    _local.conn = conn
+    _local.pid = os.getpid()
+    return conn
+
+
+# ==================== Recording ====================
+
+def record_sale(client_ref, branch_id, employee_id, customer_id, lines):
+    """
+    Journal a completed sale locally. lines is a list of
+    {"product_id", "quantity", "unit_price"} dicts.
+    Recording the same client_ref twice is a no-op.
+    """
+    _journal().execute("""
+        INSERT OR IGNORE INTO pending_sale
+            (client_ref, branch_id, employee_id, customer_id, sale_date, lines, recorded_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (
+        client_ref, branch_id, employee_id, customer_id,
+        datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        json.dumps([
+            {"product_id": l["product_id"], "quantity": l["quantity"], "unit_price": l["unit_price"]}
+            for l in lines
+        ]),
+        time.time()
+    ))
+
+
+def pending_count():
+    """
+    Number of journaled sales waiting to be replayed to MySQL.
+    """
+    return _journal().execute(
+        "SELECT COUNT(*) FROM pending_sale WHERE synced_at IS NULL AND failed_at IS NULL"
+    ).fetchone()[0]
+
+
+def failed_count():
+    """
+    Number of journaled sales set aside after failing POS_SYNC_MAX_ATTEMPTS times.
+    """
+    return _journal().execute(
+        "SELECT COUNT(*) FROM pending_sale WHERE synced_at IS NULL AND failed_at IS NOT NULL"
+    ).fetchone()[0]
+
+
+def failed_sales():
+    """
+    The sales that were set aside, oldest first, with their last error.
+    """
+    rows = _journal().execute("""
+        SELECT client_ref, branch_id, sale_date, attempts, last_error
+        FROM pending_sale
+        WHERE synced_at IS NULL AND failed_at IS NOT NULL
+        ORDER BY recorded_at
+    """).fetchall()
+    return [dict(r) for r in rows]
+
+
+def retry_failed():
+    """
+    Put the set-aside sales back in the queue (after the data was fixed in MySQL).
+    Returns the number of sales re-queued.
+    """
+    return _journal().execute("""
+        UPDATE pending_sale SET attempts = 0, failed_at = NULL
+        WHERE synced_at IS NULL AND failed_at IS NOT NULL
+    """).rowcount
+
+
+# ==================== Local catalog copy ====================
+
+def refresh_catalog(conn):
+    """
+    Copy the active product list and the branches from MySQL into the journal,
+    so the POS can keep scanning items while offline.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT product_id, product_name, unit_price FROM product WHERE is_active = 1")
+        products = [(r[0], r[1], float(r[2])) for r in cur.fetchall()]
+        cur.execute("SELECT branch_id, branch_name FROM branch")
+        branches = cur.fetchall()
+    finally:
+        cur.close()
+
+    j = _journal()
+    j.execute("BEGIN IMMEDIATE")
+    try:
+        j.execute("DELETE FROM catalog_product")
+        j.executemany("INSERT INTO catalog_product VALUES (?, ?, ?)", products)
+        j.execute("DELETE FROM catalog_branch")
+        j.executemany("INSERT INTO catalog_branch VALUES (?, ?)", branches)
+        j.execute("COMMIT")
+    except Exception:
+        j.execute("ROLLBACK")
+        raise
+
+
+def cached_products():
+    """
+    Active products as last copied from MySQL, ordered by name.
+    """
+    rows = _journal().execute(
+        "SELECT product_id, product_name, unit_price FROM catalog_product ORDER BY product_name"
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def cached_product(product_id):
+    """
+    Single product from the local catalog copy, or None.
+    """
+    row = _journal().execute(
+        "SELECT product_id, product_name, unit_price FROM catalog_product WHERE product_id = ?",
+        (product_id,)
+    ).fetchone()
+    return dict(row) if row else None
+
+
+def cached_branches():
+    """
+    Branches as last copied from MySQL, ordered by name.
+    """
+    rows = _journal().execute(
+        "SELECT branch_id, branch_name FROM catalog_branch ORDER BY branch_name"
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+# ==================== Bulk replay ====================
+
+def _in_clause(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def _replay_batch(conn, batch):
+    """
+    Replay one batch of journaled sales in a single MySQL transaction.
+    Returns {client_ref: sale_id} for every sale in the batch.
+    """
+    cur = conn.cursor()
+    try:
+        refs = [r["client_ref"] for r in batch]
+
+        # Sales that already reached MySQL (earlier sync that died before marking them)
+        cur.execute(f"SELECT client_ref, sale_id FROM sale WHERE client_ref IN ({_in_clause(refs)})", refs)
+        done = dict(cur.fetchall())
+        new_rows = [r for r in batch if r["client_ref"] not in done]
+
+        if new_rows:
+            # 1) Sale headers - one multi-row insert
+            cur.executemany("""
+                INSERT INTO sale (branch_id, sale_date, employee_id, customer_id, client_ref)
+                VALUES (%s, %s, %s, %s, %s)
+            """, [(r["branch_id"], r["sale_date"], r["employee_id"], r["customer_id"], r["client_ref"])
+                  for r in new_rows])
+
+            new_refs = [r["client_ref"] for r in new_rows]
+            cur.execute(f"SELECT client_ref, sale_id FROM sale WHERE client_ref IN ({_in_clause(new_refs)})",
+                        new_refs)
+            ids = dict(cur.fetchall())
+
+            sale_lines = []
+            movements = []
+            decrements = {}
+            for r in new_rows:
+                sale_id = ids[r["client_ref"]]
+                for l in json.loads(r["lines"]):
+                    sale_lines.append((sale_id, l["product_id"], l["quantity"], l["unit_price"]))
+                    movements.append((r["branch_id"], l["product_id"], -l["quantity"], sale_id, r["employee_id"]))
+                    key = (r["branch_id"], l["product_id"])
+                    decrements[key] = decrements.get(key, 0) + l["quantity"]
+
+            # 2) Lines - one multi-row insert
+            cur.executemany("""
+                INSERT INTO sale_line (sale_id, product_id, quantity, unit_price)
+                VALUES (%s, %s, %s, %s)
+            """, sale_lines)
+
+            # 3) Stock - one set-based update for every (branch, product) touched by the batch
+            derived = " UNION ALL ".join(
+                ["SELECT %s AS branch_id, %s AS product_id, %s AS qty"] * len(decrements)
+            )
+            params = [v for (b, p), q in sorted(decrements.items()) for v in (b, p, q)]
+            cur.execute(f"""
+                UPDATE branch_stock bs
+                JOIN ({derived}) d ON bs.branch_id = d.branch_id AND bs.product_id = d.product_id
+                SET bs.on_hand_qty = bs.on_hand_qty - d.qty
+            """, params)
+
+            # 4) Movements - one multi-row insert
+            cur.executemany("""
+                INSERT INTO stock_movement
+                    (branch_id, product_id, change_qty, movement_type, reference_sale_id, performed_by)
+                VALUES (%s, %s, %s, 'SALE', %s, %s)
+            """, movements)
+
+            done.update(ids)
+
+        conn.commit()
+        return done
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def _replay_one_by_one(conn, j, batch):
+    """
+    Replay a batch that failed as a whole one sale at a time, so one bad sale does
+    not hold back the rest. Sales that fail because of their own data get another
+    attempt, and are set aside after POS_SYNC_MAX_ATTEMPTS.
+    Returns {client_ref: sale_id} for the sales that went through; raises on errors
+    that are not about the sale itself (the rest of the batch waits for the next pass).
+    """
+    done = {}
+    for row in batch:
+        try:
+            done.update(_replay_batch(conn, [row]))
+        except _DATA_ERRORS as e:
+            attempts = row["attempts"] + 1
+            failed_at = time.time() if attempts >= POS_SYNC_MAX_ATTEMPTS else None
+            j.execute(
+                "UPDATE pending_sale SET attempts = ?, failed_at = ?, last_error = ? WHERE client_ref = ?",
+                (attempts, failed_at, str(e), row["client_ref"])
+            )
+            if failed_at:
+                log.error("pos journal sale %s set aside after %d attempts: %s", row["client_ref"], attempts, e)
+            else:
+                log.warning("pos journal sale %s failed (attempt %d): %s", row["client_ref"], attempts, e)
+    return done
+
+
+def _mark_synced(j, done):
+    now = time.time()
+    j.executemany(
+        "UPDATE pending_sale SET synced_at = ?, sale_id = ?, last_error = NULL WHERE client_ref = ?",
+        [(now, sale_id, ref) for ref, sale_id in done.items()]
+    )
+
+
+def sync_pending(get_connection, batch_size=None):
+    """
+    Replay every journaled sale to MySQL in batches.
+    Returns the number of sales synced, or None if MySQL is still unreachable.
+    """
+    batch_size = batch_size or POS_SYNC_BATCH_SIZE
+
+    # One sync at a time per process; the unique client_ref keeps concurrent processes safe
+    if not _sync_lock.acquire(blocking=False):
+        return 0
+
+    try:
+        j = _journal()
+        if not j.execute(
+            "SELECT 1 FROM pending_sale WHERE synced_at IS NULL AND failed_at IS NULL LIMIT 1"
+        ).fetchone():
+            return 0
+
+        conn = get_connection()
+        if not conn:
+            return None
+
+        synced = 0
+        # Walk the queue in (recorded_at, client_ref) order; a sale that failed in this
+        # pass is behind the cursor and is not picked up again until the next pass
+        after = (-1.0, "")
+        try:
+            while True:
+                batch = j.execute("""
+                    SELECT * FROM pending_sale
+                    WHERE synced_at IS NULL AND failed_at IS NULL
+                      AND (recorded_at > ? OR (recorded_at = ? AND client_ref > ?))
+                    ORDER BY recorded_at, client_ref
+                    LIMIT ?
+                """, (after[0], after[0], after[1], batch_size)).fetchall()
+                if not batch:
+                    break
+                after = (batch[-1]["recorded_at"], batch[-1]["client_ref"])
+
+                try:
+                    done = _replay_batch(conn, batch)
+                except Exception as e:
+                    log.warning("pos journal batch failed, replaying one by one: %s", e)
+                    try:
+                        done = _replay_one_by_one(conn, j, batch)
+                    except Exception as e:
+                        # Sales of this batch that already went through are found by
+                        # client_ref and marked on the next pass
+                        j.executemany(
+                            "UPDATE pending_sale SET last_error = ? WHERE client_ref = ?",
+                            [(str(e), r["client_ref"]) for r in batch]
+                        )
+                        log.error("pos journal sync error: %s", e)
+                        break
+
+                _mark_synced(j, done)
+                synced += len(done)
+        finally:
+            conn.close()
+
+        return synced
+    finally:
+        _sync_lock.release()
+
+
+def start_sync_worker(get_connection, interval=None):
+    """
+    Start a daemon thread that replays the journal and refreshes the local
+    catalog copy every `interval` seconds while MySQL is reachable.
+    """
+    interval = interval or POS_SYNC_INTERVAL
+
+    def run():
+        while True:
+            try:
+                sync_pending(get_connection)
+                conn = get_connection()
+                if conn:
+                    try:
+                        refresh_catalog(conn)
+                    finally:
+                        conn.close()
+            except Exception as e:
+                log.exception("pos sync worker error: %s", e)
+            time.sleep(interval)
+
+    t = threading.Thread(target=run, name="pos-sync", daemon=True)
+    t.start()
+    return t
+
+
+if __name__ == "__main__":
+    import sys
+    from db import get_connection
+
+    logging.basicConfig(format="%(levelname)s %(message)s")
+    if len(sys.argv) > 1 and sys.argv[1] == "sync":
+        started = time.time()
+        count = sync_pending(get_connection)
+        if count is None:
+            print("MySQL is unreachable; nothing synced.")
+        else:
+            print(f"Synced {count} sale(s) in {time.time() - started:.2f}s. Pending: {pending_count()}")
+    elif len(sys.argv) > 1 and sys.argv[1] == "failed":
+        for sale in failed_sales():
+            print(f"{sale['client_ref']}  branch {sale['branch_id']}  {sale['sale_date']}  "
+                  f"{sale['attempts']} attempts: {sale['last_error']}")
+        print(f"Set-aside sales: {failed_count()}")
+    elif len(sys.argv) > 1 and sys.argv[1] == "retry":
+        print(f"Re-queued {retry_failed()} set-aside sale(s).")
+    else:
+        print(f"Pending offline sales: {pending_count()}, set aside: {failed_count()}")
+        print("Usage: python pos_journal.py sync | failed | retry")
@@ -0,0 +1,201 @@
+import cProfile
+import json
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime
+
+from flask import g, request, session
+
+import db
+
+# On-demand request profiling for admins.
+# Add ?_profile=1 (or the header "X-Profile: 1") to any page while logged in as an
+# admin. The request then runs under cProfile plus a stack sampler, and three files
+# are written to PROFILE_DIR: <id>.prof (pstats), <id>.collapsed (one "a;b;c count"
+# line per stack, for flamegraph.pl / speedscope) and <id>.sql.json (every statement
+# with its time). Only the newest PROFILE_KEEP profiles are kept. Files on disk, so
+# any gunicorn worker can serve the download.
+PROFILE_DIR = os.getenv(
+    "PROFILE_DIR",
+    os.path.join(os.path.dirname(__file__), "data", "profiles")
+)
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", 20))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", 0.005))
+
+PROFILE_ID = re.compile(r"^[0-9]{8}T[0-9]{9}-[a-z0-9_]+-[0-9a-f]{6}$")
+KINDS = {"prof": ".prof", "collapsed": ".collapsed", "sql": ".sql.json"}
+
+_active = ContextVar("active_profile", default=None)
+_write_lock = threading.Lock()
+
+
+def requested():
+    """
+    True when an admin asked for this request to be profiled.
+    """
+    if session.get("role") != "admin":
+        return False
+    return request.args.get("_profile") == "1" or request.headers.get("X-Profile") == "1"
+
+
+class _Sampler(threading.Thread):
+    """
+    Records the stack of one thread every PROFILE_SAMPLE_INTERVAL seconds.
+    """
+
+    def __init__(self, thread_id):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.stacks = {}
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(PROFILE_SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                key = ";".join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started_at = time.time()
+        self.statements = []
+        self.profiler = cProfile.Profile()
+        self.sampler = _Sampler(threading.get_ident())
+
+    def start(self):
+        self.sampler.start()
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+        self.sampler.stop()
+
+
+def _on_statement(sql, params, seconds, error):
+    profile = _active.get()
+    if profile is not None:
+        profile.statements.append({
+            "sql": " ".join(str(sql).split()),
+            "params": [str(p) for p in params] if isinstance(params, (list, tuple)) else params,
+            "ms": round(seconds * 1000, 3),
+            "error": str(error) if error else None
+        })
+
+
+db.add_statement_listener(_on_statement)
+
+
+def start():
+    """
+    before_request hook.
+    """
+    # Threads are reused between requests: clear whatever the last one left
+    _active.set(None)
+    if not requested():
+        return
+    profile = RequestProfile()
+    g.request_profile = profile
+    _active.set(profile)
+    profile.start()
+
+
+def finish(response):
+    """
+    after_request hook: stop once the body has been sent (streamed pages included) and save.
+    """
+    profile = g.pop("request_profile", None)
+    if profile is None:
+        return response
+
+    endpoint = request.endpoint or "unmatched"
+    stamp = datetime.now().strftime("%Y%m%dT%H%M%S%f")[:-3]
+    profile_id = f"{stamp}-{endpoint.lower()}-{secrets.token_hex(3)}"
+    meta = {"id": profile_id, "method": request.method, "path": request.full_path.rstrip("?"),
+            "endpoint": endpoint, "status": response.status_code}
+
+    def done():
+        profile.stop()
+        meta["seconds"] = round(time.time() - profile.started_at, 4)
+        _save(profile, meta)
+
+    response.call_on_close(done)
+    response.headers["X-Profile-Id"] = profile_id
+    return response
+
+
+def _save(profile, meta):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, meta["id"])
+
+    profile.profiler.dump_stats(base + ".prof")
+    with open(base + ".collapsed", "w") as f:
+        for stack, count in sorted(profile.sampler.stacks.items()):
+            f.write(f"{stack} {count}\n")
+    with open(base + ".sql.json", "w") as f:
+        meta = dict(meta, sql_statements=len(profile.statements),
+                    sql_ms=round(sum(s["ms"] for s in profile.statements), 3))
+        json.dump(dict(meta, statements=profile.statements), f, indent=1, default=str)
+
+    _prune()
+
+
+def _prune():
+    with _write_lock:
+        ids = sorted(list_ids(), reverse=True)
+        for old in ids[PROFILE_KEEP:]:
+            for suffix in KINDS.values():
+                try:
+                    os.remove(os.path.join(PROFILE_DIR, old + suffix))
+                except OSError:
+                    pass
+
+
+def list_ids():
+    try:
+        names = os.listdir(PROFILE_DIR)
+    except OSError:
+        return []
+    return [n[:-len(".sql.json")] for n in names if n.endswith(".sql.json")]
+
+
+def recent():
+    """
+    Newest first: summary of every kept profile (from its .sql.json).
+    """
+    profiles = []
+    for profile_id in sorted(list_ids(), reverse=True):
+        try:
+            with open(os.path.join(PROFILE_DIR, profile_id + ".sql.json")) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        data.pop("statements", None)
+        profiles.append(data)
+    return profiles
+
+
+def path_for(profile_id, kind):
+    """
+    File path of a saved profile, or None for an unknown id / kind.
+    """
+    if kind not in KINDS or not PROFILE_ID.match(profile_id):
+        return None
+    path = os.path.join(PROFILE_DIR, profile_id + KINDS[kind])
+    return path if os.path.exists(path) else None
+
@@ -0,0 +1,199 @@
+import csv
+from decimal import Decimal, InvalidOperation
+
+# Supplier invoice import for purchases.
+# A CSV invoice (header row; columns sku and/or product_name, quantity, unit_cost) is
+# checked as a whole: products are resolved by SKU or name in one batched lookup,
+# repeated products are merged into one line (quantities added, cost weighted by
+# quantity), and all lines are written with a single upsert on
+# (purchase_id, product_id). If any line has a problem nothing is written. The
+# purchase can be completed in the same transaction.
+
+ALIASES = {
+    "name": "product_name", "product": "product_name",
+    "qty": "quantity",
+    "cost": "unit_cost", "price": "unit_cost", "unit_price": "unit_cost",
+}
+LOOKUP_CHUNK = 1000
+MAX_QUANTITY = 1000000
+MAX_COST = Decimal("99999999.99")
+
+
+class InvoiceError(Exception):
+    """
+    The invoice cannot be imported; `problems` lists (line, message) pairs.
+    """
+
+    def __init__(self, problems):
+        super().__init__(f"{len(problems)} problem(s) in the invoice")
+        self.problems = problems
+
+
+def _in_clause(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def read_invoice(stream):
+    """
+    Parse and check the CSV rows. Returns [{line, sku, product_name, quantity, unit_cost}].
+    """
+    rows, problems = [], []
+    reader = csv.DictReader(stream)
+    while True:
+        try:
+            raw = next(reader)
+        except StopIteration:
+            break
+        except csv.Error as e:
+            problems.append((reader.line_num, f"unreadable CSV: {e}"))
+            break
+        number = reader.line_num
+        row = {ALIASES.get(k.strip().lower(), k.strip().lower()): (v or "").strip()
+               for k, v in raw.items() if k}
+        if not any(row.values()):
+            continue
+        sku, name = row.get("sku", ""), row.get("product_name", "")
+        if not sku and not name:
+            problems.append((number, "no sku or product_name"))
+
+        raw_quantity = row.get("quantity", "")
+        # isdigit() alone accepts "²", which int() rejects
+        quantity = int(raw_quantity) if raw_quantity.isascii() and raw_quantity.isdigit() else 0
+        if not 0 < quantity <= MAX_QUANTITY:
+            quantity = 0
+            problems.append((number, f"quantity {raw_quantity!r} is not a whole number from 1 to {MAX_QUANTITY}"))
+        try:
+            unit_cost = Decimal(row.get("unit_cost", ""))
+            if not unit_cost.is_finite() or unit_cost < 0 or unit_cost > MAX_COST:
+                raise InvalidOperation
+            unit_cost = unit_cost.quantize(Decimal("0.01"))
+        except InvalidOperation:
+            unit_cost = None
+            problems.append((number, f"unit_cost {row.get('unit_cost', '')!r} is not a cost from 0 to {MAX_COST}"))
+
+        rows.append({"line": number, "sku": sku, "product_name": name,
+                     "quantity": quantity, "unit_cost": unit_cost})
+    if not rows and not problems:
+        problems.append((1, "the invoice has no lines"))
+    if problems:
+        raise InvoiceError(problems)
+    return rows
+
+
+def resolve_products(cur, rows):
+    """
+    Set row["product_id"] for every row: SKU first, otherwise the exact product name.
+    One query per LOOKUP_CHUNK SKUs/names. Raises InvoiceError for unknown or ambiguous names.
+    """
+    keys = sorted({r["sku"] for r in rows if r["sku"]} | {r["product_name"] for r in rows if r["product_name"]})
+    by_sku, by_name = {}, {}
+    for i in range(0, len(keys), LOOKUP_CHUNK):
+        chunk = keys[i:i + LOOKUP_CHUNK]
+        cur.execute(f"""
+            SELECT product_id, sku, product_name
+            FROM product
+            WHERE sku IN ({_in_clause(chunk)}) OR product_name IN ({_in_clause(chunk)})
+        """, chunk + chunk)
+        for product_id, sku, name in cur.fetchall():
+            if sku:
+                by_sku[sku.lower()] = product_id
+            by_name.setdefault(name.lower(), set()).add(product_id)
+
+    problems = []
+    for r in rows:
+        product_id = by_sku.get(r["sku"].lower()) if r["sku"] else None
+        if product_id is None and r["product_name"]:
+            matches = by_name.get(r["product_name"].lower(), set())
+            if len(matches) > 1:
+                problems.append((r["line"], f"product name {r['product_name']!r} is ambiguous, use the SKU"))
+                continue
+            product_id = next(iter(matches), None)
+        if product_id is None:
+            problems.append((r["line"], f"unknown product {r['sku'] or r['product_name']!r}"))
+        r["product_id"] = product_id
+    if problems:
+        raise InvoiceError(problems)
+    return rows
+
+
+def merge_lines(rows):
+    """
+    One line per product: quantities added up, unit cost averaged by quantity.
+    """
+    merged = {}
+    for r in rows:
+        line = merged.setdefault(r["product_id"], {"product_id": r["product_id"], "quantity": 0, "cost": Decimal(0)})
+        line["quantity"] += r["quantity"]
+        line["cost"] += r["quantity"] * r["unit_cost"]
+    return [(l["product_id"], l["quantity"], (l["cost"] / l["quantity"]).quantize(Decimal("0.01")))
+            for l in merged.values()]
+
+
+def upsert_lines(cur, purchase_id, lines):
+    """
+    Write all lines in one statement. A product already on the purchase gets the
+    quantity added and the new cost, as when adding an item by hand.
+    """
+    params = [v for product_id, quantity, unit_cost in lines for v in (purchase_id, product_id, quantity, unit_cost)]
+    cur.execute(f"""
+        INSERT INTO purchase_line (purchase_id, product_id, quantity, unit_cost)
+        VALUES {", ".join(["(%s, %s, %s, %s)"] * len(lines))}
+        ON DUPLICATE KEY UPDATE
+            quantity = quantity + VALUES(quantity),
+            unit_cost = VALUES(unit_cost)
+    """, params)
+
+
+def complete(cur, purchase_id, warehouse_id, performed_by):
+    """
+    Receive every line of the purchase into the warehouse: one set-based stock update and
+    one insert of the PURCHASE movements. Runs in the caller's transaction.
+    """
+    cur.execute("""
+        UPDATE warehouse_stock ws
+        JOIN purchase_line pl ON pl.product_id = ws.product_id
+        SET ws.on_hand_qty = ws.on_hand_qty + pl.quantity,
+            ws.last_purchase_date = NOW()
+        WHERE pl.purchase_id = %s AND ws.warehouse_id = %s
+    """, (purchase_id, warehouse_id))
+    cur.execute("""
+        INSERT INTO stock_movement
+            (warehouse_id, product_id, change_qty, movement_type, reference_purchase_id, performed_by)
+        SELECT %s, product_id, quantity, 'PURCHASE', purchase_id, %s
+        FROM purchase_line
+        WHERE purchase_id = %s
+    """, (warehouse_id, performed_by, purchase_id))
+
+
+def import_invoice(conn, purchase_id, stream, performed_by, complete_purchase=False):
+    """
+    Import a CSV invoice into an open purchase, in one transaction.
+    Returns (number of invoice rows, number of purchase lines written).
+    Raises InvoiceError (nothing written) for bad lines or a purchase that is already completed.
+    """
+    rows = read_invoice(stream)
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT warehouse_id FROM purchase WHERE purchase_id = %s FOR UPDATE", (purchase_id,))
+        purchase = cur.fetchone()
+        if not purchase:
+            raise InvoiceError([(0, "purchase not found")])
+        cur.execute("""
+            SELECT 1 FROM stock_movement
+            WHERE reference_purchase_id = %s AND movement_type = 'PURCHASE'
+            LIMIT 1
+        """, (purchase_id,))
+        if cur.fetchone():
+            raise InvoiceError([(0, "this purchase is already completed")])
+
+        lines = merge_lines(resolve_products(cur, rows))
+        upsert_lines(cur, purchase_id, lines)
+        if complete_purchase:
+            complete(cur, purchase_id, purchase[0], performed_by)
+        conn.commit()
+        return len(rows), len(lines)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
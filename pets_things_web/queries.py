@@ -0,0 +1,160 @@
+import threading
+import time
+
+# Named queries shared by several routes, with per-query timings.
+# Rows are small __slots__ objects instead of dicts; they support row.col,
+# row["col"] and row.get("col"), so templates and views read them as before.
+# Queries use the plain text protocol (one round trip). Server-side prepared
+# statements would not pay off here: pooled connections reset their session on
+# every checkout, which drops the statements, so each run would cost a PREPARE
+# plus an EXECUTE.
+
+
+class Row:
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def keys(self):
+        return self.__slots__
+
+    def as_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.as_dict()!r})"
+
+
+class Query:
+    """
+    A named SQL statement. `one=True` queries return a single row (or None).
+    """
+
+    def __init__(self, name, sql, one=False):
+        self.name = name
+        self.sql = sql
+        self.one = one
+        self._row_class = None
+        self._columns = None
+
+    def _rows(self, columns, values):
+        if self._columns != columns:
+            self._row_class = type(f"{self.name.title().replace('_', '')}Row", (Row,),
+                                   {"__slots__": tuple(columns)})
+            self._columns = columns
+        cls = self._row_class
+        rows = []
+        for value in values:
+            row = cls.__new__(cls)
+            for column, v in zip(columns, value):
+                object.__setattr__(row, column, v)
+            rows.append(row)
+        return rows
+
+    def run(self, conn, params=(), fetch=None):
+        """
+        Execute on `conn` and return the rows (or one row / None).
+        """
+        started = time.perf_counter()
+        cur = conn.cursor()
+        try:
+            cur.execute(self.sql, tuple(params) or None)
+            rows = self._rows(tuple(cur.column_names), cur.fetchall())
+        finally:
+            cur.close()
+        _record(self.name, time.perf_counter() - started)
+
+        if fetch == "one" or (fetch is None and self.one):
+            return rows[0] if rows else None
+        return rows
+
+
+# ==================== Timing ====================
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _record(name, seconds):
+    with _stats_lock:
+        entry = _stats.get(name)
+        if entry is None:
+            entry = _stats[name] = {"calls": 0, "total_ms": 0.0, "max_ms": 0.0}
+        ms = seconds * 1000
+        entry["calls"] += 1
+        entry["total_ms"] += ms
+        entry["max_ms"] = max(entry["max_ms"], ms)
+
+
+def stats():
+    """
+    Per-query call count, total and max time (ms) in this process, plus the average.
+    """
+    with _stats_lock:
+        return {
+            name: dict(e, avg_ms=e["total_ms"] / e["calls"] if e["calls"] else 0.0)
+            for name, e in _stats.items()
+        }
+
+
+# ==================== Queries ====================
+
+BRANCHES = Query("branches", "SELECT branch_id, branch_name FROM branch ORDER BY branch_name")
+
+WAREHOUSES = Query("warehouses", "SELECT warehouse_id, warehouse_name FROM warehouse ORDER BY warehouse_name")
+
+CATEGORIES = Query("categories", "SELECT category_id, category_name FROM category ORDER BY category_name")
+
+SUPPLIERS = Query("suppliers", "SELECT supplier_id, name FROM supplier ORDER BY name")
+
+ALL_PRODUCTS = Query("all_products", "SELECT product_id, product_name FROM product ORDER BY product_name")
+
+ACTIVE_PRODUCTS = Query("active_products", """
+    SELECT product_id, product_name, unit_price
+    FROM product
+    WHERE is_active = 1
+    ORDER BY product_name
+""")
+
+# Sale header with its computed total (sale detail page and receipt)
+SALE_HEADER = Query("sale_header", """
+    SELECT
+        s.sale_id,
+        s.branch_id,
+        b.branch_name,
+        s.sale_date,
+        s.employee_id,
+        e.full_name AS employee_name,
+        s.customer_id,
+        cu.full_name AS customer_name,
+        COALESCE(SUM(sl.quantity * sl.unit_price), 0) AS total_amount
+    FROM sale s
+    JOIN branch b ON s.branch_id = b.branch_id
+    JOIN users e ON s.employee_id = e.user_id
+    LEFT JOIN users cu ON s.customer_id = cu.user_id
+    LEFT JOIN sale_line sl ON s.sale_id = sl.sale_id
+    WHERE s.sale_id = %s
+    GROUP BY s.sale_id, s.branch_id, b.branch_name, s.sale_date,
+             s.employee_id, e.full_name, s.customer_id, cu.full_name
+""", one=True)
+
+SALE_LINES = Query("sale_lines", """
+    SELECT
+        sl.sale_line_id,
+        sl.product_id,
+        p.product_name,
+        sl.quantity,
+        sl.unit_price,
+        (sl.quantity * sl.unit_price) AS line_total
+    FROM sale_line sl
+    JOIN product p ON sl.product_id = p.product_id
+    WHERE sl.sale_id = %s
+    ORDER BY sl.sale_line_id
+""")
@@ -0,0 +1,228 @@
+import os
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional: without it the replenishment planner is disabled
+    np = None
+
+import forecast
+
+# Warehouse -> branch replenishment planner.
+# Every branch's shortfall against its target level is computed for all branch/product
+# rows at once, and each product's available warehouse stock is shared out across the
+# branches that need it in proportion to their shortfall (largest remainders get the
+# leftover units), so a short product is spread fairly instead of going to whichever
+# branch is restocked first. The plan is executed as one multi-line transfer order per
+# branch, each in a single transaction with set-based stock updates and multi-row
+# inserts.
+#
+# Target levels:
+#   min       fill up to branch_stock.min_qty
+#   target    fill up to min_qty x REPLENISH_TARGET_FACTOR
+#   forecast  fill up to forecast demand + safety stock (forecast.py)
+REPLENISH_TARGET_FACTOR = float(os.getenv("REPLENISH_TARGET_FACTOR", 2.0))
+TARGETS = ("min", "target", "forecast")
+
+
+def available():
+    return np is not None
+
+
+def _in_clause(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def shortfall(conn, target="min", factor=REPLENISH_TARGET_FACTOR):
+    """
+    (branch_ids, product_ids, on_hand, need) arrays, one entry per branch_stock row.
+    """
+    if target == "forecast":
+        result = forecast.Forecast(forecast.load(conn))
+        return result.branch_ids, result.product_ids, result.on_hand, result.branch_need
+
+    cur = conn.cursor()
+    try:
+        stock = forecast.load_branch_stock(cur)
+    finally:
+        cur.close()
+    min_qty, on_hand = stock[:, 3], stock[:, 2]
+    level = min_qty if target == "min" else np.ceil(min_qty * factor)
+    return stock[:, 0].astype(np.int64), stock[:, 1].astype(np.int64), on_hand, np.maximum(level - on_hand, 0.0)
+
+
+def allocate(product_ids, need, stock_product_ids, stock_qty):
+    """
+    Share each product's stock (stock_qty[i] units of stock_product_ids[i]) across the
+    rows needing it, in proportion to `need`. Returns the integer quantity per row.
+    """
+    need = np.floor(need)
+    products, inverse = np.unique(product_ids, return_inverse=True)
+    total_need = np.bincount(inverse, need, minlength=len(products))
+    total_supply = np.zeros(len(products))
+    if len(stock_product_ids):
+        order = np.argsort(stock_product_ids)
+        sorted_ids = stock_product_ids[order]
+        pos = np.minimum(np.searchsorted(sorted_ids, products), len(order) - 1)
+        found = sorted_ids[pos] == products
+        total_supply[found] = np.maximum(stock_qty[order][pos][found], 0)
+
+    ratio = np.divide(total_supply, total_need, out=np.zeros(len(products)), where=total_need > 0)
+    exact = need * np.minimum(ratio, 1.0)[inverse]
+    base = np.floor(exact)
+
+    # Units left over after rounding down go to the largest remainders, one each
+    given = np.minimum(total_supply, total_need)
+    leftover = np.rint(given - np.bincount(inverse, base, minlength=len(products)))
+    remainder = exact - base
+    by_remainder = np.lexsort((-need, -remainder, inverse))
+    group_start = np.searchsorted(inverse[by_remainder], inverse[by_remainder], side="left")
+    rank = np.empty(len(need), dtype=np.int64)
+    rank[by_remainder] = np.arange(len(need)) - group_start
+    extra = (rank < leftover[inverse]) & (remainder > 1e-9)
+    return (base + extra).astype(np.int64)
+
+
+def plan(conn, warehouse_id, target="min", factor=REPLENISH_TARGET_FACTOR, branch_ids=None):
+    """
+    Transfer orders to restock the branches from `warehouse_id`:
+    [{branch_id, branch_name, lines: [{product_id, product_name, on_hand, need, quantity}], units}].
+    """
+    branches, products, on_hand, need = shortfall(conn, target, factor)
+    if branch_ids:
+        keep = np.isin(branches, list(branch_ids))
+        branches, products, on_hand, need = branches[keep], products[keep], on_hand[keep], need[keep]
+
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT product_id, on_hand_qty FROM warehouse_stock WHERE warehouse_id = %s",
+                    (warehouse_id,))
+        stock = np.array(cur.fetchall(), dtype=np.float64).reshape(-1, 2)
+        cur.execute("SELECT branch_id, branch_name FROM branch")
+        branch_names = dict(cur.fetchall())
+        cur.execute("SELECT product_id, product_name FROM product")
+        product_names = dict(cur.fetchall())
+    finally:
+        cur.close()
+
+    quantity = allocate(products, need, stock[:, 0].astype(np.int64), stock[:, 1])
+
+    orders = {}
+    for i in np.flatnonzero(quantity > 0):
+        branch_id, product_id = int(branches[i]), int(products[i])
+        order = orders.setdefault(branch_id, {
+            "branch_id": branch_id,
+            "branch_name": branch_names.get(branch_id, f"#{branch_id}"),
+            "lines": [],
+            "units": 0,
+        })
+        order["lines"].append({
+            "product_id": product_id,
+            "product_name": product_names.get(product_id, f"#{product_id}"),
+            "on_hand": int(on_hand[i]),
+            "need": int(need[i]),
+            "quantity": int(quantity[i]),
+        })
+        order["units"] += int(quantity[i])
+    return sorted(orders.values(), key=lambda o: o["branch_name"])
+
+
+def execute_order(conn, warehouse_id, branch_id, lines, performed_by, notes=None):
+    """
+    Move `lines` ([(product_id, quantity)]) from the warehouse to the branch as one
+    transfer order, in one transaction. Quantities are cut to what the warehouse still
+    has (stock may have moved since the plan was made).
+    Returns (transfer_order_id, units moved), or (None, 0) if nothing could be moved.
+    """
+    wanted = {}
+    for product_id, quantity in lines:
+        if quantity > 0:
+            wanted[product_id] = wanted.get(product_id, 0) + quantity
+    if not wanted:
+        return None, 0
+    # Same lock order in every transaction: by product id
+    product_ids = sorted(wanted)
+
+    cur = conn.cursor()
+    try:
+        cur.execute(f"""
+            SELECT product_id, on_hand_qty
+            FROM warehouse_stock
+            WHERE warehouse_id = %s AND product_id IN ({_in_clause(product_ids)})
+            ORDER BY product_id
+            FOR UPDATE
+        """, [warehouse_id] + product_ids)
+        in_stock = dict(cur.fetchall())
+        moves = [(p, min(wanted[p], in_stock.get(p) or 0)) for p in product_ids]
+        moves = [(p, q) for p, q in moves if q > 0]
+        if not moves:
+            conn.rollback()
+            return None, 0
+
+        cur.execute("""
+            INSERT INTO transfer_order (warehouse_id, branch_id, performed_by, notes)
+            VALUES (%s, %s, %s, %s)
+        """, (warehouse_id, branch_id, performed_by, notes))
+        transfer_order_id = cur.lastrowid
+
+        # Stock on both sides - one set-based update each
+        derived = " UNION ALL ".join(["SELECT %s AS product_id, %s AS qty"] * len(moves))
+        params = [v for move in moves for v in move]
+        cur.execute(f"""
+            UPDATE warehouse_stock ws
+            JOIN ({derived}) d ON ws.product_id = d.product_id
+            SET ws.on_hand_qty = ws.on_hand_qty - d.qty
+            WHERE ws.warehouse_id = %s
+        """, params + [warehouse_id])
+        cur.execute(f"""
+            UPDATE branch_stock bs
+            JOIN ({derived}) d ON bs.product_id = d.product_id
+            SET bs.on_hand_qty = bs.on_hand_qty + d.qty,
+                bs.last_restock_date = NOW()
+            WHERE bs.branch_id = %s
+        """, params + [branch_id])
+
+        # Lines - one multi-row insert
+        cur.executemany("""
+            INSERT INTO stock_transfer
+                (warehouse_id, branch_id, product_id, quantity, performed_by, transfer_order_id)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, [(warehouse_id, branch_id, p, q, performed_by, transfer_order_id) for p, q in moves])
+
+        # Movements - TRANSFER_OUT and TRANSFER_IN for every line, straight from the lines
+        cur.execute("""
+            INSERT INTO stock_movement
+                (warehouse_id, product_id, change_qty, movement_type, reference_transfer_id, performed_by)
+            SELECT warehouse_id, product_id, -quantity, 'TRANSFER_OUT', transfer_id, performed_by
+            FROM stock_transfer
+            WHERE transfer_order_id = %s
+        """, (transfer_order_id,))
+        cur.execute("""
+            INSERT INTO stock_movement
+                (branch_id, product_id, change_qty, movement_type, reference_transfer_id, performed_by)
+            SELECT branch_id, product_id, quantity, 'TRANSFER_IN', transfer_id, performed_by
+            FROM stock_transfer
+            WHERE transfer_order_id = %s
+        """, (transfer_order_id,))
+
+        conn.commit()
+        return transfer_order_id, sum(q for _, q in moves)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def execute_plan(conn, warehouse_id, orders, performed_by, notes="Replenishment plan"):
+    """
+    Run every order of a plan; one transaction per branch.
+    Returns [(branch_id, transfer_order_id, units)] for the orders that moved stock.
+    """
+    done = []
+    for order in orders:
+        lines = [(l["product_id"], l["quantity"]) for l in order["lines"]]
+        transfer_order_id, units = execute_order(conn, warehouse_id, order["branch_id"], lines,
+                                                 performed_by, notes)
+        if transfer_order_id:
+            done.append((order["branch_id"], transfer_order_id, units))
+    return done
@@ -0,0 +1,121 @@
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import g, make_response, render_template, request
+from mysql.connector import Error
+
+# Report governor.
+# Heavy report pages run with a per-statement time limit (MySQL MAX_EXECUTION_TIME)
+# and at most REPORT_MAX_CONCURRENT at a time per worker process, so a manager's
+# multi-year report cannot starve the checkout queries on the same server.
+# A request that cannot get a slot within REPORT_QUEUE_WAIT seconds, or whose query
+# hits the time limit, gets a "report is queued" page that retries by itself.
+REPORT_MAX_CONCURRENT = int(os.getenv("REPORT_MAX_CONCURRENT", 2))
+REPORT_QUEUE_WAIT = float(os.getenv("REPORT_QUEUE_WAIT", 2))
+REPORT_MAX_EXECUTION_MS = int(os.getenv("REPORT_MAX_EXECUTION_MS", 15000))
+REPORT_RETRY_AFTER = int(os.getenv("REPORT_RETRY_AFTER", 15))
+
+# MySQL: "Query execution was interrupted, maximum statement execution time exceeded"
+ER_QUERY_TIMEOUT = 3024
+
+_slots = threading.BoundedSemaphore(REPORT_MAX_CONCURRENT)
+_stats_lock = threading.Lock()
+_stats = {
+    "admitted": 0,
+    "rejected_busy": 0,
+    "rejected_timeout": 0,
+    "running": 0,
+    "wait_seconds_total": 0.0,
+}
+
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def stats():
+    """
+    Counters for this worker process since it started.
+    """
+    with _stats_lock:
+        data = dict(_stats)
+    data["max_concurrent"] = REPORT_MAX_CONCURRENT
+    data["max_execution_ms"] = REPORT_MAX_EXECUTION_MS
+    return data
+
+
+def current_limit():
+    """
+    Statement time limit (ms) for the current request, or None outside governed reports.
+    """
+    return g.get("report_max_execution_ms")
+
+
+def apply_limit(conn, max_ms):
+    """
+    Limit every SELECT on this connection to max_ms milliseconds.
+    Pooled connections drop the setting when their session is reset on close().
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("SET SESSION MAX_EXECUTION_TIME = %s", (int(max_ms),))
+    finally:
+        cur.close()
+
+
+def is_timeout(error):
+    return isinstance(error, Error) and error.errno == ER_QUERY_TIMEOUT
+
+
+def queued_response(reason):
+    """
+    503 "report is queued" page; the browser retries after REPORT_RETRY_AFTER seconds.
+    """
+    _count("rejected_timeout" if reason == "timeout" else "rejected_busy")
+    response = make_response(render_template("report_queued.html", reason=reason,
+                                             retry_after=REPORT_RETRY_AFTER), 503)
+    response.headers["Retry-After"] = str(REPORT_RETRY_AFTER)
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+
+def governed(view):
+    """
+    Decorator for report routes: take a concurrency slot (or answer "queued"),
+    and set the statement time limit for connections opened through read_connector().
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        started = time.time()
+        if not _slots.acquire(timeout=REPORT_QUEUE_WAIT):
+            return queued_response("busy")
+
+        _count("admitted")
+        _count("wait_seconds_total", time.time() - started)
+        _count("running")
+
+        released = []
+
+        def release():
+            if not released:
+                released.append(True)
+                _count("running", -1)
+                _slots.release()
+
+        g.report_max_execution_ms = REPORT_MAX_EXECUTION_MS
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            release()
+            raise
+
+        if response.is_streamed:
+            # The query keeps running while the page streams: hold the slot until then
+            response.call_on_close(release)
+        else:
+            release()
+        return response
+    return wrapper
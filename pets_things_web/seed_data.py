@@ -0,0 +1,224 @@
+"""
+Bulk sample data for benchmarks, plan checks and load tests.
+
+Adds branches, warehouses, products with stock everywhere, customers with cats,
+a year of sales (with their stock movements), purchases and room bookings to the
+database configured in .env (MySQL, or SQLite with DB_BACKEND=sqlite). Existing
+rows are kept; every run adds a new, uniquely named batch.
+
+    python seed_data.py                 # ~2k products, ~50k sales
+    python seed_data.py --scale 5       # five times as much
+    python seed_data.py --scale 0.1 --seed 7
+
+Never point this at the production database.
+"""
+import argparse
+import random
+import secrets
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import db
+
+BATCH_SIZE = 1000
+
+# Base row counts at --scale 1
+BRANCHES = 10
+WAREHOUSES = 3
+CATEGORIES = 20
+PRODUCTS = 2000
+SUPPLIERS = 50
+EMPLOYEES = 30
+CUSTOMERS = 5000
+SALES = 50000
+PURCHASES = 2000
+ROOMS = 40
+BOOKINGS = 5000
+DAYS = 365
+
+ANALYZED_TABLES = ("users", "category", "product", "branch", "warehouse", "branch_stock",
+                   "warehouse_stock", "sale", "sale_line", "purchase", "purchase_line",
+                   "supplier", "stock_movement", "room", "cat", "booking", "booking_room")
+
+
+def _insert(cur, table, columns, rows, key=None):
+    """
+    Insert rows in batches; with `key`, return the new ids in insertion order.
+    """
+    if key:
+        cur.execute(f"SELECT COALESCE(MAX({key}), 0) FROM {table}")
+        before = cur.fetchone()[0]
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+    for i in range(0, len(rows), BATCH_SIZE):
+        cur.executemany(sql, rows[i:i + BATCH_SIZE])
+    if key:
+        cur.execute(f"SELECT {key} FROM {table} WHERE {key} > %s ORDER BY {key}", (before,))
+        return [r[0] for r in cur.fetchall()]
+    return None
+
+
+def _scaled(count, scale, minimum=1):
+    return max(minimum, int(count * scale))
+
+
+def seed(conn, scale=1.0, rng=None, log=print):
+    """
+    Add one batch of sample data. Returns the number of rows inserted per table.
+    """
+    rng = rng or random.Random()
+    tag = secrets.token_hex(3)
+    now = datetime.now().replace(microsecond=0)
+    counts = {}
+    cur = conn.cursor()
+
+    def step(table, columns, rows, key=None):
+        started = time.time()
+        ids = _insert(cur, table, columns, rows, key)
+        conn.commit()
+        counts[table] = counts.get(table, 0) + len(rows)
+        log(f"{table}: {len(rows)} row(s) in {time.time() - started:.1f}s")
+        return ids
+
+    def when(max_days=DAYS):
+        return now - timedelta(days=rng.randrange(max_days), seconds=rng.randrange(12 * 3600))
+
+    # ---- Locations, catalog, people ----
+    branch_ids = step("branch", ("branch_name", "address", "phone"), [
+        (f"Branch {tag}-{i}", f"{i} Market Street", f"059{rng.randrange(10**7):07d}")
+        for i in range(_scaled(BRANCHES, scale ** 0.5))
+    ], "branch_id")
+    warehouse_ids = step("warehouse", ("warehouse_name", "address", "is_main"), [
+        (f"Warehouse {tag}-{i}", f"{i} Industrial Zone", 0)
+        for i in range(_scaled(WAREHOUSES, scale ** 0.5))
+    ], "warehouse_id")
+    category_ids = step("category", ("category_name",), [
+        (f"Category {tag}-{i}",) for i in range(CATEGORIES)
+    ], "category_id")
+    prices = {}
+    product_rows = []
+    for i in range(_scaled(PRODUCTS, scale)):
+        price = round(rng.uniform(2, 150), 2)
+        product_rows.append((f"Product {tag}-{i}", rng.choice(category_ids), price,
+                             f"Sample product {i}", int(rng.random() > 0.05)))
+    product_ids = step("product", ("product_name", "category_id", "unit_price", "description", "is_active"),
+                       product_rows, "product_id")
+    for pid, row in zip(product_ids, product_rows):
+        prices[pid] = row[2]
+    supplier_ids = step("supplier", ("name", "contact"), [
+        (f"Supplier {tag}-{i}", f"supplier{i}@example.com") for i in range(_scaled(SUPPLIERS, scale ** 0.5))
+    ], "supplier_id")
+    employee_ids = step("users", ("full_name", "email", "password_hash", "role", "phone"), [
+        (f"Employee {tag}-{i}", f"employee.{tag}.{i}@example.com", "!", "employee", None)
+        for i in range(_scaled(EMPLOYEES, scale ** 0.5))
+    ], "user_id")
+    customer_ids = step("users", ("full_name", "email", "password_hash", "role", "phone"), [
+        (f"Customer {tag}-{i}", f"customer.{tag}.{i}@example.com", "!", "customer",
+         f"05{rng.randrange(10**8):08d}")
+        for i in range(_scaled(CUSTOMERS, scale))
+    ], "user_id")
+
+    # ---- Stock everywhere ----
+    step("branch_stock", ("branch_id", "product_id", "on_hand_qty", "min_qty"), [
+        (b, p, rng.randrange(0, 80), rng.randrange(2, 15)) for b in branch_ids for p in product_ids
+    ])
+    step("warehouse_stock", ("warehouse_id", "product_id", "on_hand_qty", "min_qty"), [
+        (w, p, rng.randrange(50, 500), rng.randrange(10, 60)) for w in warehouse_ids for p in product_ids
+    ])
+
+    # ---- Sales with their stock movements ----
+    sale_rows = [(rng.choice(branch_ids), when(), rng.choice(employee_ids),
+                  rng.choice(customer_ids) if rng.random() < 0.5 else None)
+                 for _ in range(_scaled(SALES, scale))]
+    sale_ids = step("sale", ("branch_id", "sale_date", "employee_id", "customer_id"), sale_rows, "sale_id")
+    line_rows, movement_rows = [], []
+    # A few best sellers, like a real store
+    popular = product_ids[:max(1, len(product_ids) // 20)]
+    for sale_id, (branch_id, sale_date, employee_id, _) in zip(sale_ids, sale_rows):
+        products = set(rng.choice(popular if rng.random() < 0.4 else product_ids)
+                       for _ in range(rng.randint(1, 5)))
+        for pid in products:
+            qty = rng.randint(1, 4)
+            line_rows.append((sale_id, pid, qty, prices[pid]))
+            movement_rows.append((None, branch_id, pid, -qty, "SALE", sale_id, None, employee_id, sale_date))
+    step("sale_line", ("sale_id", "product_id", "quantity", "unit_price"), line_rows)
+
+    # ---- Purchases ----
+    purchase_rows = [(rng.choice(warehouse_ids), when(), rng.choice(employee_ids), rng.choice(supplier_ids))
+                     for _ in range(_scaled(PURCHASES, scale))]
+    purchase_ids = step("purchase", ("warehouse_id", "purchase_date", "performed_by", "supplier_id"),
+                        purchase_rows, "purchase_id")
+    purchase_lines = []
+    for purchase_id, (warehouse_id, purchase_date, user_id, _) in zip(purchase_ids, purchase_rows):
+        for pid in set(rng.choice(product_ids) for _ in range(rng.randint(1, 8))):
+            qty = rng.randint(10, 200)
+            purchase_lines.append((purchase_id, pid, qty, round(prices[pid] * 0.6, 2)))
+            movement_rows.append((warehouse_id, None, pid, qty, "PURCHASE", None, purchase_id,
+                                  user_id, purchase_date))
+    step("purchase_line", ("purchase_id", "product_id", "quantity", "unit_cost"), purchase_lines)
+    step("stock_movement", ("warehouse_id", "branch_id", "product_id", "change_qty", "movement_type",
+                            "reference_sale_id", "reference_purchase_id", "performed_by", "movement_date"),
+         movement_rows)
+
+    # ---- Boarding: rooms, cats, bookings ----
+    room_ids = step("room", ("room_number", "room_type"), [
+        (f"{tag}-{i:03d}", rng.choice(("Standard", "Standard", "Deluxe"))) for i in range(ROOMS)
+    ], "room_id")
+    owners = rng.sample(customer_ids, min(len(customer_ids), _scaled(BOOKINGS, scale)))
+    cat_ids = step("cat", ("owner_id", "cat_name", "breed", "age_years", "gender"), [
+        (owner, f"Cat {i}", rng.choice(("Persian", "Siamese", "Mixed")), rng.randint(1, 15), rng.choice("MF"))
+        for i, owner in enumerate(owners)
+    ], "cat_id")
+    booking_rows, booked_cats = [], []
+    for owner, cat_id in zip(owners, cat_ids):
+        start = date.today() + timedelta(days=rng.randint(-DAYS, 60))
+        status = "COMPLETED" if start < date.today() else rng.choice(("PENDING", "CONFIRMED", "CONFIRMED"))
+        booking_rows.append((owner, start, start + timedelta(days=rng.randint(1, 10)), status,
+                             rng.choice(employee_ids)))
+        booked_cats.append(cat_id)
+    booking_ids = step("booking", ("customer_id", "date_from", "date_to", "status", "created_by"),
+                       booking_rows, "booking_id")
+    step("booking_room", ("booking_id", "room_id", "cat_id", "nights", "price_per_night"), [
+        (booking_id, rng.choice(room_ids), cat_id, (row[2] - row[1]).days, 30.00)
+        for booking_id, cat_id, row in zip(booking_ids, booked_cats, booking_rows)
+    ])
+
+    cur.close()
+    return counts
+
+
+def analyze(conn):
+    """
+    Refresh optimizer statistics so EXPLAIN sees the new row counts (MySQL only).
+    """
+    if db.DB_BACKEND == "sqlite":
+        conn.cursor().execute("ANALYZE")
+        return
+    cur = conn.cursor()
+    cur.execute(f"ANALYZE TABLE {', '.join(ANALYZED_TABLES)}")
+    cur.fetchall()
+    cur.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier for the row counts")
+    parser.add_argument("--seed", type=int, default=None, help="random seed (repeatable data)")
+    args = parser.parse_args(argv)
+
+    conn = db.get_connection()
+    if not conn:
+        print("Cannot connect to the database (check .env).")
+        return 1
+    try:
+        started = time.time()
+        counts = seed(conn, args.scale, random.Random(args.seed))
+        analyze(conn)
+    finally:
+        conn.close()
+    print(f"Inserted {sum(counts.values())} row(s) in {time.time() - started:.1f}s.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
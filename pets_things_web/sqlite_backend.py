@@ -0,0 +1,557 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from functools import lru_cache
+
+from mysql.connector import errors
+
+# Embedded SQLite backend (DB_BACKEND=sqlite in .env).
+# connect() returns an object that behaves like a mysql-connector connection, and the
+# MySQL statements used by the app are translated on the fly (placeholders, FOR UPDATE,
+# ON DUPLICATE KEY UPDATE, UPDATE ... JOIN, MySQL date functions), so app.py runs
+# unchanged on a single file in WAL mode - for tests, benchmarks and small branches.
+# The schema is built from pets_things_sql/pets_things_SQL.sql on first use.
+SQLITE_PATH = os.getenv(
+    "SQLITE_PATH",
+    os.path.join(os.path.dirname(__file__), "data", "pets_things.sqlite3")
+)
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           "pets_things_sql", "pets_things_SQL.sql")
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", 10))
+
+log = logging.getLogger(__name__)
+
+ER_QUERY_TIMEOUT = 3024
+ER_DUP_ENTRY = 1062
+ER_NO_REFERENCED_ROW = 1452
+ER_CHECK_CONSTRAINT_VIOLATED = 3819
+ER_LOCK_WAIT_TIMEOUT = 1205
+
+_init_lock = threading.Lock()
+_initialized = set()
+
+
+# ==================== Type mapping ====================
+
+def _parse_datetime(value):
+    text = value.decode() if isinstance(value, bytes) else value
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        return text
+
+
+def _parse_date(value):
+    text = value.decode() if isinstance(value, bytes) else value
+    try:
+        return date.fromisoformat(text[:10])
+    except ValueError:
+        return text
+
+
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(date, lambda d: d.isoformat())
+sqlite3.register_adapter(datetime, lambda d: d.isoformat(" "))
+# Declared column types come back as the Python types mysql-connector returns
+sqlite3.register_converter("DATETIME", _parse_datetime)
+sqlite3.register_converter("TIMESTAMP", _parse_datetime)
+sqlite3.register_converter("DATE", _parse_date)
+sqlite3.register_converter("DECIMAL", lambda v: Decimal(v.decode()))
+
+
+# ==================== MySQL functions ====================
+
+_MYSQL_DATE_FORMAT = {
+    "Y": "%Y", "y": "%y", "m": "%m", "c": "%-m", "d": "%d", "e": "%-d",
+    "H": "%H", "k": "%-H", "h": "%I", "I": "%I", "i": "%M", "s": "%S", "S": "%S",
+    "p": "%p", "M": "%B", "b": "%b", "W": "%A", "a": "%a", "j": "%j", "%": "%%",
+}
+
+
+def _as_datetime(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    text = str(value)
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        return None
+
+
+def _date_format(value, fmt):
+    dt = _as_datetime(value)
+    if dt is None or fmt is None:
+        return None
+    out = re.sub(r"%(.)", lambda m: _MYSQL_DATE_FORMAT.get(m.group(1), m.group(1)), fmt)
+    return dt.strftime(out)
+
+
+_UNIT_SECONDS = {"SECOND": 1, "MINUTE": 60, "HOUR": 3600, "DAY": 86400, "WEEK": 604800}
+
+
+def _timestampdiff(unit, start, end):
+    # A float, so "TIMESTAMPDIFF(...) / 60" keeps its fraction like MySQL's decimal division
+    a, b = _as_datetime(start), _as_datetime(end)
+    if a is None or b is None:
+        return None
+    unit = unit.upper()
+    if unit == "MONTH":
+        return float((b.year - a.year) * 12 + b.month - a.month - (b.day < a.day))
+    if unit == "YEAR":
+        return float(b.year - a.year - ((b.month, b.day) < (a.month, a.day)))
+    return float(int((b - a).total_seconds() // _UNIT_SECONDS[unit]))
+
+
+def _date_add(value, amount, unit):
+    dt = _as_datetime(value)
+    if dt is None or amount is None:
+        return None
+    unit = unit.upper()
+    if unit == "MONTH" or unit == "YEAR":
+        months = dt.month - 1 + int(amount) * (12 if unit == "YEAR" else 1)
+        year, month = dt.year + months // 12, months % 12 + 1
+        day = min(dt.day, [31, 29 if year % 4 == 0 and (year % 100 or year % 400 == 0) else 28,
+                           31, 30, 31, 30, 31, 31, 30, 31, 30, 31][month - 1])
+        dt = dt.replace(year=year, month=month, day=day)
+    else:
+        dt = dt + timedelta(seconds=float(amount) * _UNIT_SECONDS[unit])
+    # DATE in, DATE out
+    return dt.date().isoformat() if len(str(value)) == 10 else dt.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _datediff(a, b):
+    a, b = _as_datetime(a), _as_datetime(b)
+    if a is None or b is None:
+        return None
+    return (a.date() - b.date()).days
+
+
+def _greatest(*args):
+    return None if any(a is None for a in args) else max(args)
+
+
+def _least(*args):
+    return None if any(a is None for a in args) else min(args)
+
+
+def _concat(*args):
+    return None if any(a is None for a in args) else "".join(str(a) for a in args)
+
+
+def _part(index):
+    def extract(value):
+        dt = _as_datetime(value)
+        return None if dt is None else (dt.year, dt.month, dt.day)[index]
+    return extract
+
+
+_FUNCTIONS = [
+    ("NOW", 0, lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+    ("CURDATE", 0, lambda: date.today().isoformat()),
+    ("DATE_FORMAT", 2, _date_format),
+    ("TIMESTAMPDIFF", 3, _timestampdiff),
+    ("MYSQL_DATE_ADD", 3, _date_add),
+    ("DATEDIFF", 2, _datediff),
+    ("GREATEST", -1, _greatest),
+    ("LEAST", -1, _least),
+    ("CONCAT", -1, _concat),
+    ("YEAR", 1, _part(0)),
+    ("MONTH", 1, _part(1)),
+    ("DAY", 1, _part(2)),
+]
+
+
+# ==================== Statement translation ====================
+
+_LITERAL = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
+_MASK = re.compile(r"\x00(\d+)\x00")
+
+_UPDATE_JOIN = re.compile(
+    r"^\s*UPDATE\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?\s+(?:INNER\s+)?JOIN\s+(.+?)\s+ON\s+(.+?)"
+    r"\s+SET\s+(.+?)(?:\s+WHERE\s+(.+?))?\s*$",
+    re.I | re.S
+)
+_SET_SESSION_LIMIT = re.compile(r"^\s*SET\s+SESSION\s+MAX_EXECUTION_TIME\s*=\s*(\?|\d+)\s*$", re.I)
+
+
+def _split_top_level(text, sep=","):
+    parts, depth, start = [], 0, 0
+    for i, ch in enumerate(text):
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == sep and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return [p.strip() for p in parts]
+
+
+def _update_join(m):
+    table, alias, source, on, assignments, where = m.groups()
+    sets = []
+    for assignment in _split_top_level(assignments):
+        column, _, value = assignment.partition("=")
+        # SQLite's UPDATE ... FROM wants bare target column names
+        sets.append(f"{column.strip().split('.')[-1]} = {value.strip()}")
+    condition = f"({on})" + (f" AND ({where})" if where else "")
+    target = f"{table} AS {alias}" if alias else table
+    return f"UPDATE {target} SET {', '.join(sets)} FROM {source} WHERE {condition}"
+
+
+@lru_cache(maxsize=1024)
+def translate(sql):
+    """
+    MySQL statement -> (SQLite statement, locks). `locks` is True for SELECT ... FOR UPDATE,
+    which SQLite has no row locks for: the caller takes the write lock up front instead.
+    """
+    literals = []
+
+    def mask(m):
+        literals.append(m.group(0))
+        return f"\x00{len(literals) - 1}\x00"
+
+    s = _LITERAL.sub(mask, sql)
+    s = re.sub(r"/\*.*?\*/", " ", s, flags=re.S)
+    s = re.sub(r"--[^\n]*", " ", s)
+
+    s = s.replace("%s", "?")
+    locks = bool(re.search(r"\bFOR\s+UPDATE\b", s, re.I))
+    s = re.sub(r"\s+FOR\s+UPDATE\b", "", s, flags=re.I)
+
+    # MySQL "/" is decimal division; SQLite divides integers as integers
+    s = re.sub(r"(?<![*/])/(?![*/])", " * 1.0 /", s)
+
+    s = re.sub(r"\bTIMESTAMPDIFF\(\s*(\w+)\s*,", r"TIMESTAMPDIFF('\1',", s, flags=re.I)
+    s = re.sub(r"\bDATE_(ADD|SUB)\(\s*(.+?)\s*,\s*INTERVAL\s+(\?|-?[\d.]+)\s+(\w+)\s*\)",
+               lambda m: f"MYSQL_DATE_ADD({m.group(2)}, {'-' if m.group(1).upper() == 'SUB' else ''}"
+                         f"({m.group(3)}), '{m.group(4).upper()}')",
+               s, flags=re.I)
+    s = re.sub(r"\bIF\(", "iif(", s, flags=re.I)
+    s = re.sub(r"\bAS\s+(UN)?SIGNED(\s+INTEGER)?\s*\)", "AS INTEGER)", s, flags=re.I)
+    s = re.sub(r"\s+SEPARATOR\s+", ", ", s, flags=re.I)
+    s = re.sub(r"\bINSERT\s+IGNORE\b", "INSERT OR IGNORE", s, flags=re.I)
+    s = re.sub(r"\bDATABASE\(\)", "'main'", s, flags=re.I)
+
+    if re.search(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", s, re.I):
+        s = re.sub(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", "ON CONFLICT DO UPDATE SET", s, flags=re.I)
+        s = re.sub(r"\bVALUES\((\w+)\)", r"excluded.\1", s, flags=re.I)
+
+    s = _UPDATE_JOIN.sub(_update_join, s)
+
+    return _MASK.sub(lambda m: literals[int(m.group(1))], s), locks
+
+
+def _translate_error(e):
+    message = str(e)
+    if isinstance(e, sqlite3.IntegrityError):
+        if "UNIQUE" in message or "PRIMARY KEY" in message:
+            errno = ER_DUP_ENTRY
+        elif "FOREIGN KEY" in message:
+            errno = ER_NO_REFERENCED_ROW
+        else:
+            errno = ER_CHECK_CONSTRAINT_VIOLATED
+        return errors.IntegrityError(msg=message, errno=errno)
+    if isinstance(e, sqlite3.OperationalError) and message == "interrupted":
+        return errors.DatabaseError(msg="Query execution was interrupted, maximum statement "
+                                        "execution time exceeded", errno=ER_QUERY_TIMEOUT)
+    if isinstance(e, sqlite3.OperationalError) and "locked" in message:
+        # SQLITE_BUSY after SQLITE_BUSY_TIMEOUT: the same situation as a MySQL lock wait timeout
+        return errors.DatabaseError(msg=message, errno=ER_LOCK_WAIT_TIMEOUT)
+    if isinstance(e, sqlite3.OperationalError):
+        return errors.OperationalError(msg=message)
+    if isinstance(e, sqlite3.ProgrammingError):
+        return errors.ProgrammingError(msg=message)
+    return errors.DatabaseError(msg=message)
+
+
+# ==================== Connection ====================
+
+class Cursor:
+    """
+    mysql-connector style cursor: tuple rows, or dict rows with dictionary=True.
+    """
+
+    def __init__(self, connection, dictionary=False):
+        self._connection = connection
+        self._cur = connection._db.cursor()
+        self._dictionary = dictionary
+        self.lastrowid = None
+        self.rowcount = -1
+
+    @property
+    def column_names(self):
+        return tuple(d[0] for d in self._cur.description or ())
+
+    @property
+    def description(self):
+        return self._cur.description
+
+    def _prepare(self, sql):
+        limit = _SET_SESSION_LIMIT.match(sql.replace("%s", "?"))
+        if limit:
+            return None, limit
+        translated, locks = translate(sql)
+        if locks and not self._connection._db.in_transaction:
+            self._connection._db.execute("BEGIN IMMEDIATE")
+        return translated, None
+
+    def execute(self, sql, params=None):
+        translated, limit = self._prepare(sql)
+        if limit:
+            value = params[0] if limit.group(1) == "?" else limit.group(1)
+            self._connection.max_execution_ms = int(value)
+            return
+        try:
+            with self._connection._limit():
+                self._cur.execute(translated, tuple(params or ()))
+        except sqlite3.Error as e:
+            raise _translate_error(e) from e
+        self.lastrowid = self._cur.lastrowid
+        self.rowcount = self._cur.rowcount
+
+    def executemany(self, sql, seq_params):
+        translated, _ = self._prepare(sql)
+        try:
+            self._cur.executemany(translated, [tuple(p) for p in seq_params])
+        except sqlite3.Error as e:
+            raise _translate_error(e) from e
+        self.lastrowid = self._cur.lastrowid
+        self.rowcount = self._cur.rowcount
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip(self.column_names, row))
+
+    def fetchone(self):
+        return self._row(self._cur.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(r) for r in self._cur.fetchmany(size)]
+
+    def fetchall(self):
+        try:
+            with self._connection._limit():
+                rows = self._cur.fetchall()
+        except sqlite3.Error as e:
+            raise _translate_error(e) from e
+        return [self._row(r) for r in rows] if self._dictionary else rows
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def close(self):
+        self._cur.close()
+
+
+class Connection:
+    """
+    mysql-connector style connection to the SQLite file.
+    """
+
+    def __init__(self, path):
+        self._db = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT, check_same_thread=False,
+                                   detect_types=sqlite3.PARSE_DECLTYPES)
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        for name, nargs, func in _FUNCTIONS:
+            self._db.create_function(name, nargs, func)
+        # Set by "SET SESSION MAX_EXECUTION_TIME = n" (report governor); 0 = no limit
+        self.max_execution_ms = 0
+        self._open = True
+
+    @contextmanager
+    def _limit(self):
+        if not self.max_execution_ms:
+            yield
+            return
+        deadline = time.monotonic() + self.max_execution_ms / 1000
+        # A non-zero return from the handler aborts the statement ("interrupted")
+        self._db.set_progress_handler(lambda: time.monotonic() > deadline, 10000)
+        try:
+            yield
+        finally:
+            self._db.set_progress_handler(None, 0)
+
+    def cursor(self, dictionary=False, prepared=False, buffered=None, **kwargs):
+        return Cursor(self, dictionary=dictionary)
+
+    def commit(self):
+        self._db.commit()
+
+    def rollback(self):
+        self._db.rollback()
+
+    def start_transaction(self, **kwargs):
+        if not self._db.in_transaction:
+            self._db.execute("BEGIN")
+
+    @property
+    def in_transaction(self):
+        return self._db.in_transaction
+
+    def is_connected(self):
+        return self._open
+
+    def close(self):
+        if self._open:
+            # Like MySQL, closing without commit discards the transaction
+            self._db.rollback()
+            self._db.close()
+            self._open = False
+
+
+def connect(path=None):
+    """
+    Open the SQLite database (creating the schema the first time). Returns a Connection.
+    """
+    path = path or SQLITE_PATH
+    try:
+        if path not in _initialized:
+            with _init_lock:
+                if path not in _initialized:
+                    init_db(path)
+                    _initialized.add(path)
+        return Connection(path)
+    except sqlite3.Error as e:
+        raise _translate_error(e) from e
+
+
+# ==================== Schema ====================
+
+def _split_script(script):
+    script = re.sub(r"--[^\n]*", "", script)
+    statements, current, quote = [], [], None
+    for ch in script:
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in "'\"":
+            quote = ch
+        elif ch == ";":
+            statements.append("".join(current).strip())
+            current = []
+            continue
+        current.append(ch)
+    statements.append("".join(current).strip())
+    return [s for s in statements if s]
+
+
+def _translate_create_table(sql):
+    s = re.sub(r"\)\s*(ENGINE|DEFAULT\s+CHARSET|CHARSET|COLLATE)\b[^)]*$", ")", sql, flags=re.I)
+    s = re.sub(r"\bINT\s+AUTO_INCREMENT\s+PRIMARY\s+KEY\b", "INTEGER PRIMARY KEY AUTOINCREMENT", s, flags=re.I)
+    s = re.sub(r"\s+AUTO_INCREMENT\b(\s*=\s*\d+)?", "", s, flags=re.I)
+    s = re.sub(r"\bENUM\s*\([^)]*\)", "TEXT COLLATE NOCASE", s, flags=re.I)
+    # MySQL's default collations compare text case-insensitively
+    s = re.sub(r"\b((?:VAR)?CHAR\s*\(\d+\))", r"\1 COLLATE NOCASE", s, flags=re.I)
+    s = re.sub(r"\bUNSIGNED\b", "", s, flags=re.I)
+    s = re.sub(r"\s+ON\s+UPDATE\s+CURRENT_TIMESTAMP\b", "", s, flags=re.I)
+    s = re.sub(r"\bDEFAULT\s+CURRENT_TIMESTAMP\b", "DEFAULT (datetime('now', 'localtime'))", s, flags=re.I)
+    s = re.sub(r"\bUNIQUE\s+KEY\s+\w+\s*\(", "UNIQUE (", s, flags=re.I)
+    # Plain secondary keys inside CREATE TABLE become separate indexes
+    table = re.match(r"\s*CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?`?(\w+)`?", s, re.I).group(1)
+    indexes = []
+
+    def index(m):
+        indexes.append(f"CREATE INDEX {m.group(1)} ON {table} ({m.group(2)})")
+        return ""
+
+    s = re.sub(r",\s*(?:KEY|INDEX)\s+(\w+)\s*\(([^)]*)\)", index, s, flags=re.I)
+    return [s] + indexes
+
+
+def _translate_alter_table(sql):
+    m = re.match(r"\s*ALTER\s+TABLE\s+`?(\w+)`?\s+(.*)$", sql, re.I | re.S)
+    table, clauses = m.group(1), m.group(2)
+    statements = []
+    for clause in _split_top_level(clauses):
+        unique = re.match(r"ADD\s+(UNIQUE\s+)?(?:KEY|INDEX)\s+(\w+)\s*\(([^)]*)\)", clause, re.I)
+        if unique:
+            kind = "UNIQUE INDEX" if unique.group(1) else "INDEX"
+            statements.append(f"CREATE {kind} {unique.group(2)} ON {table} ({unique.group(3)})")
+        elif re.match(r"ADD\s+CONSTRAINT\b|ADD\s+FOREIGN\s+KEY\b", clause, re.I):
+            # SQLite cannot add constraints to an existing table
+            continue
+        elif re.match(r"(ADD|DROP)\s+(COLUMN\s+)?", clause, re.I):
+            column = _translate_create_table(f"CREATE TABLE {table} ({clause})")[0]
+            column = column[column.index("(") + 1:column.rindex(")")]
+            statements.append(f"ALTER TABLE {table} {column}")
+    return statements
+
+
+def translate_schema(script):
+    """
+    MySQL schema script -> list of SQLite statements.
+    """
+    statements = []
+    for sql in _split_script(script):
+        keyword = sql.split(None, 2)[:2]
+        head = " ".join(keyword).upper()
+        if head.startswith(("DROP DATABASE", "CREATE DATABASE", "USE", "SELECT")):
+            continue
+        if head == "CREATE TABLE":
+            statements.extend(_translate_create_table(sql))
+        elif head == "ALTER TABLE":
+            statements.extend(_translate_alter_table(sql))
+        else:
+            statements.append(translate(sql)[0])
+    return statements
+
+
+def init_db(path=None, schema_path=SCHEMA_PATH):
+    """
+    Create the schema in an empty database. Statements that fail are reported and
+    skipped, like running the script with "continue on error" (it has a few
+    out-of-order ALTERs). Does nothing if the database already has tables.
+    """
+    path = path or SQLITE_PATH
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    db = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT, isolation_level=None)
+    try:
+        db.execute("PRAGMA journal_mode=WAL")
+        for name, nargs, func in _FUNCTIONS:
+            db.create_function(name, nargs, func)
+        # Exclusive: other workers starting at the same time wait, then see the tables
+        db.execute("BEGIN EXCLUSIVE")
+        if db.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table'").fetchone()[0]:
+            db.execute("COMMIT")
+            return 0
+
+        with open(schema_path, encoding="utf-8") as f:
+            statements = translate_schema(f.read())
+        applied = 0
+        for statement in statements:
+            try:
+                db.execute(statement)
+                applied += 1
+            except sqlite3.Error as e:
+                log.warning("SQLite schema: skipped %r: %s", statement.split("\n")[0][:70], e)
+        db.execute("COMMIT")
+        return applied
+    except Exception:
+        if db.in_transaction:
+            db.execute("ROLLBACK")
+        raise
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(format="%(message)s")
+    if len(sys.argv) > 1 and sys.argv[1] == "init":
+        target = sys.argv[2] if len(sys.argv) > 2 else SQLITE_PATH
+        print(f"{target}: {init_db(target)} schema statement(s) applied")
+    else:
+        print("Usage: python sqlite_backend.py init [path]")
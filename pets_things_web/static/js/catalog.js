@@ -0,0 +1,97 @@
+// Product catalog cache for POS terminals.
+// Keeps a versioned copy of the catalog in localStorage and fills every
+// <select data-catalog-select> from it. After the first download only the
+// delta feed ("changes since version V") is requested.
+(function () {
+    var STORAGE_KEY = 'pets_things_catalog';
+
+    function loadCached() {
+        try {
+            return JSON.parse(localStorage.getItem(STORAGE_KEY));
+        } catch (e) {
+            return null;
+        }
+    }
+
+    function saveCached(catalog) {
+        try {
+            localStorage.setItem(STORAGE_KEY, JSON.stringify(catalog));
+        } catch (e) {
+            // Storage full or disabled: the catalog is simply downloaded again next time
+        }
+    }
+
+    function fetchJson(url) {
+        return fetch(url, { credentials: 'same-origin', headers: { 'Accept': 'application/json' } })
+            .then(function (response) {
+                if (!response.ok) {
+                    throw new Error('catalog request failed: ' + response.status);
+                }
+                return response.json();
+            });
+    }
+
+    function sync(select, cached) {
+        if (!cached) {
+            return fetchJson(select.dataset.snapshotUrl).then(function (snap) {
+                var catalog = { version: snap.version, products: {} };
+                snap.products.forEach(function (p) { catalog.products[p.product_id] = p; });
+                return catalog;
+            });
+        }
+
+        return fetchJson(select.dataset.changesUrl + '?since=' + cached.version).then(function (delta) {
+            delta.upserts.forEach(function (p) { cached.products[p.product_id] = p; });
+            delta.removed.forEach(function (id) { delete cached.products[id]; });
+            cached.version = delta.version;
+            return cached;
+        });
+    }
+
+    function render(select, catalog) {
+        var current = select.value;
+        var placeholder = select.options.length ? select.options[0] : null;
+        var showPrice = select.hasAttribute('data-show-price');
+
+        var products = Object.keys(catalog.products).map(function (id) { return catalog.products[id]; });
+        products.sort(function (a, b) { return a.product_name.localeCompare(b.product_name); });
+
+        var fragment = document.createDocumentFragment();
+        if (placeholder) {
+            fragment.appendChild(placeholder);
+        }
+        products.forEach(function (p) {
+            var option = document.createElement('option');
+            option.value = p.product_id;
+            option.textContent = showPrice
+                ? p.product_name + ' — $' + p.unit_price.toFixed(2)
+                : p.product_name;
+            fragment.appendChild(option);
+        });
+
+        select.innerHTML = '';
+        select.appendChild(fragment);
+        select.value = current;
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        var selects = document.querySelectorAll('select[data-catalog-select]');
+        if (!selects.length) {
+            return;
+        }
+
+        var cached = loadCached();
+        if (cached) {
+            selects.forEach(function (select) { render(select, cached); });
+        }
+
+        sync(selects[0], cached)
+            .then(function (catalog) {
+                saveCached(catalog);
+                selects.forEach(function (select) { render(select, catalog); });
+            })
+            .catch(function () {
+                // Offline or server error: keep whatever copy we already have
+            });
+    });
+})();
@@ -0,0 +1,121 @@
+// Customer typeahead for the New Sale form.
+// Queries /api/customers/search as the cashier types and stores the chosen
+// customer's id in the hidden customer_id field.
+(function () {
+    var DEBOUNCE_MS = 200;
+    var MIN_CHARS = 2;
+
+    document.addEventListener('DOMContentLoaded', function () {
+        var input = document.getElementById('customer_search');
+        var hidden = document.getElementById('customer_id');
+        var list = document.getElementById('customer_results');
+        if (!input || !hidden || !list || input.disabled) {
+            return;
+        }
+
+        var timer = null;
+        var lastQuery = '';
+        var controller = null;
+        var active = -1;
+
+        function close() {
+            list.style.display = 'none';
+            list.innerHTML = '';
+            active = -1;
+        }
+
+        function choose(customer) {
+            hidden.value = customer.user_id;
+            input.value = customer.full_name;
+            lastQuery = input.value.trim();
+            close();
+        }
+
+        function highlight(index) {
+            var items = list.querySelectorAll('li');
+            items.forEach(function (li, i) {
+                li.style.background = i === index ? 'rgba(230, 126, 34, 0.12)' : '';
+            });
+            active = index;
+        }
+
+        function show(results) {
+            list.innerHTML = '';
+            if (!results.length) {
+                var empty = document.createElement('li');
+                empty.className = 'dropdown-link';
+                empty.textContent = 'No matching customers';
+                list.appendChild(empty);
+            }
+            results.forEach(function (c) {
+                var li = document.createElement('li');
+                li.className = 'dropdown-link';
+                li.style.cursor = 'pointer';
+                li.textContent = c.full_name + ' — ' + c.email + (c.phone ? ' · ' + c.phone : '');
+                li.addEventListener('mousedown', function (e) {
+                    e.preventDefault();
+                    choose(c);
+                });
+                li.dataset.customer = JSON.stringify(c);
+                list.appendChild(li);
+            });
+            list.style.display = 'block';
+            active = -1;
+        }
+
+        function search(q) {
+            if (controller) {
+                controller.abort();
+            }
+            controller = new AbortController();
+            var url = input.dataset.searchUrl + '?q=' + encodeURIComponent(q);
+            fetch(url, { credentials: 'same-origin', signal: controller.signal })
+                .then(function (r) { return r.ok ? r.json() : { results: [] }; })
+                .then(function (data) {
+                    if (input.value.trim() === q) {
+                        show(data.results || []);
+                    }
+                })
+                .catch(function () { /* aborted or offline */ });
+        }
+
+        input.addEventListener('input', function () {
+            // Typing again means the previous choice no longer applies
+            hidden.value = '';
+            var q = input.value.trim();
+            clearTimeout(timer);
+            if (q.length < MIN_CHARS) {
+                close();
+                return;
+            }
+            if (q === lastQuery) {
+                return;
+            }
+            timer = setTimeout(function () {
+                lastQuery = q;
+                search(q);
+            }, DEBOUNCE_MS);
+        });
+
+        input.addEventListener('keydown', function (e) {
+            var items = list.querySelectorAll('li[data-customer]');
+            if (!items.length) {
+                return;
+            }
+            if (e.key === 'ArrowDown') {
+                e.preventDefault();
+                highlight(Math.min(active + 1, items.length - 1));
+            } else if (e.key === 'ArrowUp') {
+                e.preventDefault();
+                highlight(Math.max(active - 1, 0));
+            } else if (e.key === 'Enter' && active >= 0) {
+                e.preventDefault();
+                choose(JSON.parse(items[active].dataset.customer));
+            } else if (e.key === 'Escape') {
+                close();
+            }
+        });
+
+        input.addEventListener('blur', close);
+    });
+})();
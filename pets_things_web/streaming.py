@@ -0,0 +1,134 @@
+import os
+
+from flask import Response, current_app, stream_with_context
+
+import db
+
+# Streamed rendering for long listings.
+# The view runs its small queries as usual, then hands the cursor of the big one to
+# a RowStream. The page is sent while rows are still being fetched in batches, so a
+# worker never holds the whole result set (or the whole HTML) in memory.
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", 200))
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", 8192))
+
+
+class RowStream:
+    """
+    One-shot iterable over a cursor's pending result, read with fetchmany().
+    Owns the cursor and the connection and closes both when iteration ends.
+    Truthiness peeks at the first row, so `{% if rows %}` works in templates.
+    """
+
+    def __init__(self, cur, conn, batch_size=STREAM_BATCH_SIZE, transform=None):
+        self.cur = cur
+        self.conn = conn
+        self.batch_size = batch_size
+        self.transform = transform
+        self.count = 0
+        self._buffer = []
+        self._exhausted = False
+        self._closed = False
+
+    def _fetch(self):
+        if self._exhausted:
+            return []
+        batch = self.cur.fetchmany(self.batch_size)
+        if len(batch) < self.batch_size:
+            self._exhausted = True
+        if self.transform:
+            batch = [self.transform(r) for r in batch]
+        return batch
+
+    def __bool__(self):
+        if not self._buffer:
+            self._buffer = self._fetch()
+        return bool(self._buffer)
+
+    def __iter__(self):
+        try:
+            while True:
+                batch, self._buffer = self._buffer or self._fetch(), []
+                if not batch:
+                    break
+                for row in batch:
+                    self.count += 1
+                    yield row
+        finally:
+            self.close()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if not self._exhausted:
+            # Unread rows left (client went away): drop the session, the server
+            # discards the rest of the result
+            db.discard_connection(self.conn)
+            return
+        try:
+            self.cur.close()
+        finally:
+            self.conn.close()
+
+
+def _buffered(chunks, size=STREAM_CHUNK_SIZE):
+    """
+    Join Jinja's many tiny output pieces into chunks of about `size` characters.
+    """
+    pending = []
+    length = 0
+    for chunk in chunks:
+        pending.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield "".join(pending)
+            pending = []
+            length = 0
+    if pending:
+        yield "".join(pending)
+
+
+def stream_page(template_name, stream, **context):
+    """
+    Like render_template, but sends the page while `stream` (a RowStream) is consumed.
+    """
+    app = current_app._get_current_object()
+    try:
+        template = app.jinja_env.get_or_select_template(template_name)
+        app.update_template_context(context)
+    except Exception:
+        stream.close()
+        raise
+
+    response = Response(stream_with_context(_buffered(template.generate(context))), mimetype="text/html")
+    # Closes the cursor/connection even if the client disconnects before the table
+    response.call_on_close(stream.close)
+    return response
+
+
+class GroupedRows:
+    """
+    Folds consecutive rows of a RowStream that share key(row) into one item with
+    fold(rows). The query must be ordered so that each group's rows are adjacent.
+    """
+
+    def __init__(self, rows, key, fold):
+        self.rows = rows
+        self.key = key
+        self.fold = fold
+
+    def __bool__(self):
+        return bool(self.rows)
+
+    def __iter__(self):
+        group = []
+        for row in self.rows:
+            if group and self.key(row) != self.key(group[0]):
+                yield self.fold(group)
+                group = []
+            group.append(row)
+        if group:
+            yield self.fold(group)
+
+    def close(self):
+        self.rows.close()
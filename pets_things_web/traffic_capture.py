@@ -0,0 +1,150 @@
+import atexit
+import gzip
+import hashlib
+import json
+import os
+import random
+import re
+import secrets
+import threading
+import time
+from datetime import datetime
+
+from flask import request, session
+
+# Request recorder for traffic_replay.py.
+# With TRAFFIC_CAPTURE_DIR set, every request (static files and login/logout aside)
+# is written as one JSON line to a gzip file per worker process: time, method, path,
+# endpoint, query args, form fields, role, a pseudonymous user key, status, redirect
+# target and duration. Passwords and tokens are dropped; personal fields (names,
+# emails, phones, notes, search terms) are replaced with a stable hash, so repeated
+# values stay repeated without being readable. A background thread does the writing.
+TRAFFIC_CAPTURE_DIR = os.getenv("TRAFFIC_CAPTURE_DIR", "")
+TRAFFIC_CAPTURE_SAMPLE = float(os.getenv("TRAFFIC_CAPTURE_SAMPLE", 1.0))
+FLUSH_INTERVAL = 1.0
+
+SKIP_ENDPOINTS = {"static", "dist_asset", "login", "logout", "signup", "metrics_endpoint", "health"}
+SECRET_FIELD = re.compile(r"pass|token|secret|card|cvv", re.IGNORECASE)
+PERSONAL_FIELD = re.compile(r"email|phone|name|address|note|contact|medical|^q$|^search$", re.IGNORECASE)
+
+# Per-process salt: user keys and hashed values cannot be matched across captures
+_salt = secrets.token_bytes(8)
+_pending = []
+_lock = threading.Lock()
+_writer = {"pid": None, "path": None}
+
+
+def enabled():
+    return bool(TRAFFIC_CAPTURE_DIR)
+
+
+def _mask(value):
+    return "~" + hashlib.blake2b(value.encode(), key=_salt, digest_size=5).hexdigest()
+
+
+def sanitize(fields):
+    """
+    MultiDict -> plain dict without secrets and with personal values masked.
+    Single values stay strings, repeated ones become lists.
+    """
+    clean = {}
+    for key in fields:
+        if SECRET_FIELD.search(key):
+            continue
+        values = fields.getlist(key)
+        if PERSONAL_FIELD.search(key):
+            values = [_mask(v) if v else v for v in values]
+        clean[key] = values[0] if len(values) == 1 else values
+    return clean
+
+
+def start_request():
+    if not enabled() or request.endpoint in SKIP_ENDPOINTS:
+        return
+    if TRAFFIC_CAPTURE_SAMPLE < 1 and random.random() >= TRAFFIC_CAPTURE_SAMPLE:
+        return
+    request.environ["traffic_capture.started"] = (time.time(), time.perf_counter())
+
+
+def finish_request(response):
+    """
+    after_request hook: build the record now, time it once the body has been sent.
+    """
+    started = request.environ.pop("traffic_capture.started", None)
+    if started is None:
+        return response
+
+    user_id = session.get("user_id")
+    entry = {
+        "t": round(started[0], 3),
+        "m": request.method,
+        "p": request.path,
+        "e": request.endpoint,
+        "r": session.get("role"),
+        "u": _mask(str(user_id))[1:] if user_id is not None else None,
+        "s": response.status_code,
+    }
+    if request.args:
+        entry["a"] = sanitize(request.args)
+    if request.method == "POST":
+        entry["f"] = sanitize(request.form)
+        if request.files:
+            entry["files"] = sorted(request.files)
+    if response.location:
+        # Redirect target: lets the replayer map new ids (carts, purchases) to its own
+        entry["l"] = response.location.split("?", 1)[0]
+
+    def record():
+        entry["ms"] = round((time.perf_counter() - started[1]) * 1000, 2)
+        with _lock:
+            _pending.append(entry)
+        _ensure_writer()
+
+    response.call_on_close(record)
+    return response
+
+
+def _ensure_writer():
+    if _writer["pid"] == os.getpid():
+        return
+    with _lock:
+        if _writer["pid"] == os.getpid():
+            return
+        os.makedirs(TRAFFIC_CAPTURE_DIR, exist_ok=True)
+        _writer["pid"] = os.getpid()
+        _writer["path"] = os.path.join(
+            TRAFFIC_CAPTURE_DIR, f"traffic-{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}.jsonl.gz"
+        )
+    threading.Thread(target=_write_loop, name="traffic-capture", daemon=True).start()
+
+
+def _flush():
+    with _lock:
+        batch = _pending[:]
+        del _pending[:]
+    if batch and _writer["path"]:
+        # Each flush appends a gzip member; readers see one continuous stream
+        with gzip.open(_writer["path"], "at", encoding="utf-8") as f:
+            for entry in batch:
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+
+
+def _write_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        _flush()
+
+
+atexit.register(_flush)
+
+
+def read(paths):
+    """
+    All records of the given capture files, oldest first.
+    """
+    entries = []
+    for path in paths:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            entries.extend(json.loads(line) for line in f if line.strip())
+    entries.sort(key=lambda e: e["t"])
+    return entries
@@ -0,0 +1,252 @@
+"""
+Replay captured production traffic against a local instance.
+
+Reads the files written with TRAFFIC_CAPTURE_DIR (see traffic_capture.py) and
+sends the same requests, in the same order per user and with the same spacing
+(or faster), from --concurrency threads. Every recorded user gets its own
+session, logged in with the account given for its role; requests of roles
+without an account are skipped. New ids in redirects (a new sale cart, a new
+purchase) are mapped so a user's follow-up requests hit the replayed objects.
+
+    python traffic_replay.py data/traffic/*.jsonl.gz \\
+        --target http://127.0.0.1:5000 --speed 4 --concurrency 8 \\
+        --login admin=admin@pets.com:secret --login employee=cashier@pets.com:secret
+
+Reports latency percentiles per endpoint next to the recorded ones, errors and
+status codes that differ from the recording. Only replay against a local copy of
+the database: POSTs really create sales, purchases and bookings.
+"""
+import argparse
+import http.cookiejar
+import json
+import re
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import zlib
+from collections import defaultdict
+
+import traffic_capture
+
+
+# Path segments that are object ids: numbers, or hex tokens such as cart ids
+ID_SEGMENT = re.compile(r"^(\d+|[0-9a-f]{8,})$")
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class ReplayUser:
+    """
+    One recorded user: a cookie session plus the id mapping learned from redirects.
+    """
+
+    def __init__(self, target, credentials=None):
+        self.target = target.rstrip("/")
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect()
+        )
+        self.credentials = credentials
+        self.logged_in = credentials is None
+        self.login_failed = False
+        self.ids = {}
+
+    def send(self, method, path, args=None, form=None):
+        """
+        Returns (status, redirect path or None).
+        """
+        url = self.target + path
+        if args:
+            url += "?" + urllib.parse.urlencode(args, doseq=True)
+        data = urllib.parse.urlencode(form or {}, doseq=True).encode() if method == "POST" else None
+        try:
+            with self.opener.open(urllib.request.Request(url, data=data, method=method), timeout=60) as r:
+                r.read()
+                return r.status, None
+        except urllib.error.HTTPError as e:
+            e.read()
+            location = e.headers.get("Location")
+            return e.code, urllib.parse.urlsplit(location).path if location else None
+
+    def login(self):
+        """
+        Log in once. Only a redirect away from the login page counts: a failed login
+        renders the form again with 200. Returns whether the session is logged in.
+        """
+        email, _, password = self.credentials.partition(":")
+        status, location = self.send("POST", "/login", form={"email": email, "password": password})
+        self.logged_in = status in (301, 302, 303) and location not in (None, "/login")
+        self.login_failed = not self.logged_in
+        return self.logged_in
+
+    def map_path(self, path):
+        return "/".join(self.ids.get(part, part) for part in path.split("/"))
+
+    def learn(self, recorded, actual):
+        # Same route, different ids: remember recorded id -> replayed id. A redirect to
+        # another route (e.g. /login after a lost session) must not map route words.
+        if not recorded or not actual:
+            return
+        old, new = recorded.split("/"), actual.split("/")
+        if len(old) != len(new):
+            return
+        changed = [(a, b) for a, b in zip(old, new) if a != b]
+        if all(ID_SEGMENT.match(a) and ID_SEGMENT.match(b) for a, b in changed):
+            self.ids.update(changed)
+
+
+class Replay:
+    def __init__(self, entries, target, logins, speed=1.0, concurrency=4):
+        self.entries = entries
+        self.target = target
+        self.logins = logins
+        self.speed = speed
+        self.concurrency = max(1, concurrency)
+        self.results = defaultdict(lambda: {"latency": [], "recorded": [], "errors": 0,
+                                            "status_mismatch": 0, "count": 0})
+        self.skipped = 0
+        self.login_failed = 0
+        self._lock = threading.Lock()
+
+    def _lanes(self):
+        # A user's requests always go to the same thread, so their order is kept
+        lanes = [[] for _ in range(self.concurrency)]
+        for entry in self.entries:
+            key = f"{entry.get('r')}:{entry.get('u')}"
+            lanes[zlib.crc32(key.encode()) % self.concurrency].append(entry)
+        return lanes
+
+    def _run_lane(self, lane, t0, started):
+        users = {}
+        for entry in lane:
+            role = entry.get("r")
+            if role and role not in self.logins:
+                with self._lock:
+                    self.skipped += 1
+                continue
+            if self.speed > 0:
+                delay = (entry["t"] - t0) / self.speed - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+
+            key = f"{role}:{entry.get('u')}"
+            user = users.get(key)
+            if user is None:
+                user = users[key] = ReplayUser(self.target, self.logins.get(role))
+            if not user.logged_in and (user.login_failed or not user.login()):
+                # Replaying as an anonymous session would only measure redirects to /login
+                with self._lock:
+                    self.login_failed += 1
+                continue
+
+            began = time.perf_counter()
+            try:
+                status, location = user.send(entry["m"], user.map_path(entry["p"]), entry.get("a"),
+                                             entry.get("f"))
+            except OSError:
+                status, location = None, None
+            elapsed = (time.perf_counter() - began) * 1000
+            user.learn(entry.get("l"), location)
+
+            with self._lock:
+                result = self.results[entry.get("e") or entry["p"]]
+                result["count"] += 1
+                result["latency"].append(elapsed)
+                if entry.get("ms") is not None:
+                    result["recorded"].append(entry["ms"])
+                if status is None or status >= 500:
+                    result["errors"] += 1
+                elif status != entry.get("s"):
+                    result["status_mismatch"] += 1
+
+    def run(self):
+        if not self.entries:
+            return 0.0
+        t0 = self.entries[0]["t"]
+        started = time.monotonic()
+        threads = [threading.Thread(target=self._run_lane, args=(lane, t0, started), daemon=True)
+                   for lane in self._lanes() if lane]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return time.monotonic() - started
+
+    def report(self):
+        rows = []
+        for endpoint, r in sorted(self.results.items(), key=lambda i: -i[1]["count"]):
+            rows.append({
+                "endpoint": endpoint,
+                "count": r["count"],
+                "errors": r["errors"],
+                "status_mismatch": r["status_mismatch"],
+                "p50_ms": round(percentile(r["latency"], 50), 1),
+                "p95_ms": round(percentile(r["latency"], 95), 1),
+                "p99_ms": round(percentile(r["latency"], 99), 1),
+                "max_ms": round(max(r["latency"], default=0), 1),
+                "recorded_p50_ms": round(percentile(r["recorded"], 50), 1),
+                "recorded_p95_ms": round(percentile(r["recorded"], 95), 1),
+            })
+        return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="+", help="capture files (*.jsonl.gz)")
+    parser.add_argument("--target", default="http://127.0.0.1:5000")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="time compression: 1 = original pace, 10 = ten times faster, 0 = no waiting")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--login", action="append", default=[], metavar="ROLE=EMAIL:PASSWORD")
+    parser.add_argument("--limit", type=int, default=0, help="replay only the first N requests")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    logins = dict(item.split("=", 1) for item in args.login)
+    entries = traffic_capture.read(args.files)
+    if args.limit:
+        entries = entries[:args.limit]
+    if not entries:
+        print("No requests in the capture files.")
+        return 1
+    span = entries[-1]["t"] - entries[0]["t"]
+    print(f"Replaying {len(entries)} request(s) recorded over {span:.0f}s "
+          f"at {f'{args.speed:g}x' if args.speed else 'full'} speed with {args.concurrency} thread(s) against {args.target}")
+
+    replay = Replay(entries, args.target, logins, args.speed, args.concurrency)
+    elapsed = replay.run()
+    rows = replay.report()
+
+    print(f"\n{'endpoint':<28}{'count':>7}{'err':>5}{'diff':>6}{'p50':>9}{'p95':>9}{'p99':>9}"
+          f"{'max':>9}{'rec p50':>9}{'rec p95':>9}")
+    for r in rows:
+        print(f"{r['endpoint'][:27]:<28}{r['count']:>7}{r['errors']:>5}{r['status_mismatch']:>6}"
+              f"{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}{r['max_ms']:>9}"
+              f"{r['recorded_p50_ms']:>9}{r['recorded_p95_ms']:>9}")
+    total = sum(r["count"] for r in rows)
+    errors = sum(r["errors"] for r in rows)
+    print(f"\n{total} request(s) in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.1f} req/s), "
+          f"{errors} error(s), {replay.skipped} skipped (no --login for their role), "
+          f"{replay.login_failed} skipped (login failed). Times in ms.")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"elapsed_s": elapsed, "skipped": replay.skipped, "login_failed": replay.login_failed,
+                       "endpoints": rows}, f, indent=1)
+    return 1 if errors or replay.login_failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
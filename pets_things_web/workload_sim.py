@@ -0,0 +1,405 @@
+"""
+Store-day workload simulator for lock contention.
+
+Runs the real request handlers (Flask test clients, no HTTP server) from many
+threads in one or more processes, all aimed at a few hot rows:
+
+  checkout  cashiers complete sales of the same products in the same branch
+            (sale_complete locks branch_stock rows)
+  transfer  staff move the same products from a warehouse to the branch
+            (transfer_stock locks warehouse_stock, then updates branch_stock)
+  booking   customers book the same rooms for overlapping dates
+            (booking_new locks room rows)
+  mixed     all three at once
+
+    python workload_sim.py --scenario checkout --threads 16 --duration 30
+    python workload_sim.py --scenario mixed --processes 4 --threads 8 --hot-products 3
+
+Reports throughput, latency percentiles, deadlocks and lock wait timeouts per
+operation, then checks that stock matches the movement ledger, that no stock went
+negative, that every sale and transfer has its movements, and that no room is
+double-booked. The hot rows are restocked before the run and the run really
+writes sales, transfers and bookings, so it refuses to run against anything but
+a local database (SQLite, or MySQL on localhost). Seed one first: seed_data.py.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+import db
+
+SCENARIOS = ("checkout", "transfer", "booking")
+ER_LOCK_WAIT_TIMEOUT = 1205
+ER_LOCK_DEADLOCK = 1213
+LOCAL_HOSTS = ("localhost", "127.0.0.1", "::1", "")
+
+
+def is_local():
+    if db.DB_BACKEND == "sqlite":
+        return True
+    hosts = [os.getenv("DB_HOST", "localhost")]
+    if db.DB_READ_ENABLED:
+        hosts.append(os.getenv("DB_READ_HOST", hosts[0]))
+    return all(h in LOCAL_HOSTS or h.startswith("/") for h in hosts)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+# ==================== Setup and consistency ====================
+
+def _rows(cur, sql, params=()):
+    cur.execute(sql, params)
+    return cur.fetchall()
+
+
+def prepare(hot_products, rooms, start_stock, customers):
+    """
+    Pick the hot rows, restock them, and snapshot what the consistency check needs.
+    """
+    conn = db.get_connection()
+    if not conn:
+        raise SystemExit("Cannot connect to the database (check .env)")
+    cur = conn.cursor()
+    try:
+        branch_id = _rows(cur, "SELECT MIN(branch_id) FROM branch")[0][0]
+        warehouse_id = _rows(cur, "SELECT MIN(warehouse_id) FROM warehouse")[0][0]
+        products = [r[0] for r in _rows(cur, """
+            SELECT bs.product_id
+            FROM branch_stock bs
+            JOIN warehouse_stock ws ON ws.product_id = bs.product_id AND ws.warehouse_id = %s
+            JOIN product p ON p.product_id = bs.product_id AND p.is_active = 1
+            WHERE bs.branch_id = %s
+            ORDER BY bs.product_id
+            LIMIT %s
+        """, (warehouse_id, branch_id, hot_products))]
+        room_ids = [r[0] for r in _rows(cur, "SELECT room_id FROM room WHERE is_active = 1 ORDER BY room_id LIMIT %s",
+                                        (rooms,))]
+        staff = [r[0] for r in _rows(cur, "SELECT user_id FROM users WHERE role IN ('admin', 'employee') AND is_active = 1")]
+        owners = _rows(cur, """
+            SELECT c.owner_id, MIN(c.cat_id)
+            FROM cat c
+            JOIN users u ON u.user_id = c.owner_id AND u.is_active = 1
+            WHERE c.is_active = 1
+            GROUP BY c.owner_id
+            ORDER BY c.owner_id
+            LIMIT %s
+        """, (customers,))
+        if not branch_id or not warehouse_id or not products or not staff:
+            raise SystemExit("Not enough data: run seed_data.py first")
+
+        placeholders = ", ".join(["%s"] * len(products))
+        cur.execute(f"UPDATE branch_stock SET on_hand_qty = %s WHERE branch_id = %s AND product_id IN ({placeholders})",
+                    [start_stock, branch_id] + products)
+        cur.execute(f"UPDATE warehouse_stock SET on_hand_qty = %s WHERE warehouse_id = %s AND product_id IN ({placeholders})",
+                    [start_stock, warehouse_id] + products)
+        conn.commit()
+
+        marks = {
+            "movement": _rows(cur, "SELECT COALESCE(MAX(movement_id), 0) FROM stock_movement")[0][0],
+            "sale": _rows(cur, "SELECT COALESCE(MAX(sale_id), 0) FROM sale")[0][0],
+            "transfer": _rows(cur, "SELECT COALESCE(MAX(transfer_id), 0) FROM stock_transfer")[0][0],
+            "booking": _rows(cur, "SELECT COALESCE(MAX(booking_id), 0) FROM booking")[0][0],
+        }
+    finally:
+        cur.close()
+        conn.close()
+
+    return {
+        "branch_id": branch_id, "warehouse_id": warehouse_id, "products": products,
+        "rooms": room_ids, "staff": staff, "customers": [tuple(o) for o in owners],
+        "start_stock": start_stock, "marks": marks,
+    }
+
+
+def check_consistency(plan):
+    """
+    List of problems found after the run (empty when everything adds up).
+    """
+    problems = []
+    marks = plan["marks"]
+    placeholders = ", ".join(["%s"] * len(plan["products"]))
+    conn = db.get_connection()
+    cur = conn.cursor()
+    try:
+        for table, column, location in (("branch_stock", "branch_id", plan["branch_id"]),
+                                        ("warehouse_stock", "warehouse_id", plan["warehouse_id"])):
+            actual = dict(_rows(cur, f"""
+                SELECT product_id, on_hand_qty FROM {table}
+                WHERE {column} = %s AND product_id IN ({placeholders})
+            """, [location] + plan["products"]))
+            moved = dict(_rows(cur, f"""
+                SELECT product_id, SUM(change_qty) FROM stock_movement
+                WHERE movement_id > %s AND {column} = %s AND product_id IN ({placeholders})
+                GROUP BY product_id
+            """, [marks["movement"], location] + plan["products"]))
+            for pid in plan["products"]:
+                expected = plan["start_stock"] + int(moved.get(pid) or 0)
+                if actual.get(pid) != expected:
+                    problems.append(f"{table} {column}={location} product {pid}: on hand {actual.get(pid)}, "
+                                    f"ledger says {expected}")
+                if (actual.get(pid) or 0) < 0:
+                    problems.append(f"{table} {column}={location} product {pid}: negative stock {actual.get(pid)}")
+
+        for sale_id, in _rows(cur, """
+            SELECT s.sale_id FROM sale s
+            WHERE s.sale_id > %s AND NOT EXISTS (SELECT 1 FROM sale_line sl WHERE sl.sale_id = s.sale_id)
+        """, (marks["sale"],)):
+            problems.append(f"sale {sale_id} has no lines")
+        for sale_id, sold, moved in _rows(cur, """
+            SELECT sl.sale_id, SUM(sl.quantity),
+                   (SELECT -COALESCE(SUM(sm.change_qty), 0) FROM stock_movement sm
+                    WHERE sm.reference_sale_id = sl.sale_id AND sm.movement_type = 'SALE')
+            FROM sale_line sl
+            WHERE sl.sale_id > %s
+            GROUP BY sl.sale_id
+        """, (marks["sale"],)):
+            if int(sold) != int(moved):
+                problems.append(f"sale {sale_id}: {sold} sold but {moved} moved out of stock")
+        for transfer_id, count in _rows(cur, """
+            SELECT t.transfer_id, COUNT(sm.movement_id)
+            FROM stock_transfer t
+            LEFT JOIN stock_movement sm ON sm.reference_transfer_id = t.transfer_id
+            WHERE t.transfer_id > %s
+            GROUP BY t.transfer_id
+        """, (marks["transfer"],)):
+            if count != 2:
+                problems.append(f"transfer {transfer_id} has {count} movement(s), expected 2")
+
+        if plan["rooms"]:
+            room_placeholders = ", ".join(["%s"] * len(plan["rooms"]))
+            for room_id, a, b in _rows(cur, f"""
+                SELECT br1.room_id, b1.booking_id, b2.booking_id
+                FROM booking_room br1
+                JOIN booking b1 ON b1.booking_id = br1.booking_id
+                JOIN booking_room br2 ON br2.room_id = br1.room_id AND br2.booking_id > br1.booking_id
+                JOIN booking b2 ON b2.booking_id = br2.booking_id
+                WHERE br1.room_id IN ({room_placeholders})
+                  AND b2.booking_id > %s
+                  AND b1.status IN ('PENDING', 'CONFIRMED') AND b2.status IN ('PENDING', 'CONFIRMED')
+                  AND b1.date_from < b2.date_to AND b2.date_from < b1.date_to
+            """, plan["rooms"] + [marks["booking"]]):
+                problems.append(f"room {room_id} double-booked by bookings {a} and {b}")
+    finally:
+        cur.close()
+        conn.close()
+    return problems
+
+
+# ==================== Workers ====================
+
+class Stats:
+    def __init__(self):
+        self.latency = defaultdict(list)
+        self.outcomes = defaultdict(lambda: defaultdict(int))
+        self.lock_errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, op, seconds, outcome):
+        with self._lock:
+            self.latency[op].append(seconds * 1000)
+            self.outcomes[op][outcome] += 1
+
+    def on_statement(self, sql, params, seconds, error):
+        errno = getattr(error, "errno", None)
+        if errno in (ER_LOCK_WAIT_TIMEOUT, ER_LOCK_DEADLOCK):
+            with self._lock:
+                self.lock_errors["deadlock" if errno == ER_LOCK_DEADLOCK else "lock_wait_timeout"] += 1
+
+    def as_dict(self):
+        return {"latency": dict(self.latency),
+                "outcomes": {op: dict(o) for op, o in self.outcomes.items()},
+                "lock_errors": dict(self.lock_errors)}
+
+
+def client_for(app, user_id, role):
+    """
+    Test client already logged in as user_id (session set directly, no password).
+    """
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["user_id"], s["role"], s["full_name"] = user_id, role, f"sim {user_id}"
+    return client
+
+
+def submit(client, stats, op, url, data):
+    """
+    POST and classify by the flashed message: ok / rejected (warning) / error.
+    """
+    started = time.perf_counter()
+    response = client.post(url, data=data)
+    elapsed = time.perf_counter() - started
+    location = response.location
+    response.close()
+    with client.session_transaction() as s:
+        categories = {category for category, _ in s.pop("_flashes", [])}
+    if response.status_code >= 500 or "danger" in categories:
+        outcome = "error"
+    elif "success" in categories:
+        outcome = "ok"
+    else:
+        outcome = "rejected"
+    stats.record(op, elapsed, outcome)
+    return outcome, location
+
+
+# One operation of each scenario; plan_check.py reuses them to record the write statements
+
+def checkout_step(client, plan, stats, rng):
+    response = client.post("/sales/new", data={"branch_id": plan["branch_id"]})
+    cart_url = response.location
+    response.close()
+    if not cart_url or "/sales/cart/" not in cart_url:
+        stats.record("sale_start", 0, "error")
+        return "error"
+    for pid in rng.sample(plan["products"], rng.randint(1, min(3, len(plan["products"])))):
+        client.post(cart_url + "/add-item", data={"product_id": pid, "quantity": rng.randint(1, 2)}).close()
+    return submit(client, stats, "sale_complete", cart_url + "/complete", {})[0]
+
+
+def transfer_step(client, plan, stats, rng):
+    return submit(client, stats, "transfer_stock", "/inventory/transfer", {
+        "warehouse_id": plan["warehouse_id"], "branch_id": plan["branch_id"],
+        "product_id": rng.choice(plan["products"]), "quantity": rng.randint(1, 3),
+    })[0]
+
+
+def booking_step(client, plan, stats, rng, cat_id):
+    # Far in the future, in a narrow window, so attempts keep colliding
+    start = date.today() + timedelta(days=3650 + rng.randrange(30))
+    data = {"date_from": start.isoformat(), "date_to": (start + timedelta(days=rng.randint(1, 3))).isoformat(),
+            "cat_ids": cat_id, "room_ids": rng.choice(plan["rooms"])}
+    return submit(client, stats, "booking_new", "/booking/new", data)[0]
+
+
+def _checkout(app, plan, stats, rng, deadline):
+    client = client_for(app, rng.choice(plan["staff"]), "employee")
+    while time.time() < deadline:
+        checkout_step(client, plan, stats, rng)
+
+
+def _transfer(app, plan, stats, rng, deadline):
+    client = client_for(app, rng.choice(plan["staff"]), "employee")
+    while time.time() < deadline:
+        transfer_step(client, plan, stats, rng)
+
+
+def _booking(app, plan, stats, rng, deadline):
+    if not plan["customers"] or not plan["rooms"]:
+        return
+    owner, cat_id = rng.choice(plan["customers"])
+    client = client_for(app, owner, "customer")
+    while time.time() < deadline:
+        booking_step(client, plan, stats, rng, cat_id)
+
+
+FLOWS = {"checkout": _checkout, "transfer": _transfer, "booking": _booking}
+
+
+def _process_main(plan, flows, threads, duration, seed, results):
+    """
+    One worker process: `threads` threads cycling through `flows` until the deadline.
+    """
+    import app as web
+    app = web.create_app({"TESTING": True})
+
+    stats = Stats()
+    db.add_statement_listener(stats.on_statement)
+    deadline = time.time() + duration
+    workers = []
+    for i in range(threads):
+        flow = FLOWS[flows[i % len(flows)]]
+        rng = random.Random(seed * 1000 + i)
+        workers.append(threading.Thread(target=flow, args=(app, plan, stats, rng, deadline), daemon=True))
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    results.put(stats.as_dict())
+
+
+# ==================== Driver ====================
+
+def run(scenario, processes, threads, duration, hot_products, rooms, start_stock, log=print):
+    plan = prepare(hot_products, rooms, start_stock, customers=processes * threads)
+    flows = list(SCENARIOS) if scenario == "mixed" else [scenario]
+    log(f"{scenario}: {processes} process(es) x {threads} thread(s) for {duration}s on "
+        f"{len(plan['products'])} hot product(s), {len(plan['rooms'])} room(s) ({db.DB_BACKEND})")
+
+    # Every worker thread gets a pooled connection
+    os.environ.setdefault("DB_POOL_SIZE", str(threads * 2))
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    started = time.time()
+    procs = [ctx.Process(target=_process_main, args=(plan, flows, threads, duration, p, results))
+             for p in range(processes)]
+    for p in procs:
+        p.start()
+    collected = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    elapsed = time.time() - started
+
+    latency, outcomes, lock_errors = defaultdict(list), defaultdict(lambda: defaultdict(int)), defaultdict(int)
+    for r in collected:
+        for op, values in r["latency"].items():
+            latency[op].extend(values)
+        for op, counts in r["outcomes"].items():
+            for outcome, n in counts.items():
+                outcomes[op][outcome] += n
+        for kind, n in r["lock_errors"].items():
+            lock_errors[kind] += n
+
+    log(f"\n{'operation':<16}{'count':>7}{'ok':>7}{'rej':>6}{'err':>6}{'ops/s':>8}"
+        f"{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for op in sorted(latency):
+        values, o = latency[op], outcomes[op]
+        log(f"{op:<16}{len(values):>7}{o['ok']:>7}{o['rejected']:>6}{o['error']:>6}{o['ok'] / elapsed:>8.1f}"
+            f"{percentile(values, 50):>9.1f}{percentile(values, 95):>9.1f}{percentile(values, 99):>9.1f}"
+            f"{max(values):>9.1f}")
+    log(f"\nDeadlocks: {lock_errors['deadlock']}, lock wait timeouts: {lock_errors['lock_wait_timeout']} "
+        f"(elapsed {elapsed:.1f}s, times in ms)")
+
+    problems = check_consistency(plan)
+    if problems:
+        log(f"\nConsistency: {len(problems)} problem(s)")
+        for problem in problems[:50]:
+            log(f"  - {problem}")
+    else:
+        log("\nConsistency: stock matches the movement ledger, no negative stock, "
+            "every sale/transfer has its movements, no double bookings.")
+    return {"outcomes": outcomes, "lock_errors": dict(lock_errors), "problems": problems}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", choices=SCENARIOS + ("mixed",), default="mixed")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=8, help="threads per process")
+    parser.add_argument("--duration", type=float, default=20, help="seconds")
+    parser.add_argument("--hot-products", type=int, default=3, help="products everyone sells / transfers")
+    parser.add_argument("--rooms", type=int, default=2, help="rooms everyone books")
+    parser.add_argument("--start-stock", type=int, default=100000, help="hot rows are restocked to this")
+    args = parser.parse_args(argv)
+
+    if not is_local():
+        print("Refusing to run: the simulator writes to the database and only runs against "
+              "SQLite or MySQL on localhost.")
+        return 2
+    result = run(args.scenario, args.processes, args.threads, args.duration,
+                 args.hot_products, args.rooms, args.start_stock)
+    return 1 if result["problems"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
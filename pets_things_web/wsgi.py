@@ -0,0 +1,6 @@
+# Production entry point: gunicorn -c gunicorn.conf.py
+# The app is imported once in the gunicorn master (preload_app) and shared by the
+# forked workers; each worker then builds its own DB pool and threads in post_fork.
+from app import create_app
+
+app = create_app(start_workers=False)